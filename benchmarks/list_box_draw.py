@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Time ListBox.draw for lists from 10 up to 10M rows.
+
+    The cost of a redraw should only depend on the height of the list box,
+    not on the number of rows it holds. Run from a terminal:
+
+        python benchmarks/list_box_draw.py
+'''
+
+import os
+import sys
+import time
+import curses
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twistedcurses.list_box import ListBox
+
+SIZES = (10, 1000, 100000, 1000000, 10000000)
+DRAWS = 200
+
+
+def measure(stdscr, n):
+    list_box = ListBox((0, 0), (30, -1), None)
+
+    # same string repeated, so 10M rows only costs the list itself
+    list_box.add_rows(['a list box row'] * n)
+
+    start = time.time()
+    for i in range(DRAWS):
+        list_box.command(curses.KEY_DOWN)
+        list_box.draw()
+    return (time.time() - start) / DRAWS
+
+
+def main(stdscr):
+    curses.start_color()
+    return [(n, measure(stdscr, n)) for n in SIZES]
+
+
+if __name__ == "__main__":
+
+    results = curses.wrapper(main)
+
+    print("%10s %14s" % ("rows", "ms per draw"))
+    for n, seconds in results:
+        print("%10d %14.3f" % (n, seconds * 1000))
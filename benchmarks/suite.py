@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Rendering benchmarks for App, ListBox and Table.
+
+    Everything runs headless on a VirtualScreen with a fake clock for the
+    reactor, so the numbers don't depend on a terminal. Each workload runs
+    in its own process so the memory numbers are its own.
+
+        python benchmarks/suite.py                     # all workloads
+        python benchmarks/suite.py scroll table_stream # some of them
+        python benchmarks/suite.py --output new.json --compare old.json
+
+    For every workload we report frame latency percentiles (input or update
+    to the end of the frame), cells written into windows and cells changed
+    on the terminal per frame, and the peak RSS of the process. The startup
+    workload's frames are whole startups, from making the App to the end of
+    its first frame (time to first frame).
+'''
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import resource
+import argparse
+import platform
+import subprocess
+
+import curses
+from curses import ascii
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twisted.internet.task import Clock
+from twisted.test.proto_helpers import StringTransport
+
+from twistedcurses.app import App
+from twistedcurses.feed import TableFeedFactory
+from twistedcurses.layout import HBox, Item
+from twistedcurses.list_box import ListBox
+from twistedcurses.log_tail import LogTail, RingSource
+from twistedcurses.table import Table
+from twistedcurses.table_store import Column
+from twistedcurses.screen import VirtualScreen
+
+ROWS, COLS = 50, 160
+
+# the startup workload's app, tabs of list boxes, only the first shown
+STARTUP_TABS = 10
+STARTUP_WIDGETS = 30
+
+
+class Recorder:
+    '''collects per frame samples'''
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.latency = []
+        self.cells_written = []
+        self.cells_flushed = []
+        self.flushes = 0
+
+    def frame(self, work, clock, advance=0):
+        '''time `work` plus the frame it causes'''
+
+        self.screen.reset_counters()
+
+        start = time.time()
+        work()
+        clock.advance(advance)
+        self.latency.append(time.time() - start)
+
+        self.cells_written.append(self.screen.cells_written)
+        self.cells_flushed.append(self.screen.cells_flushed)
+        self.flushes += self.screen.flushes
+
+    def result(self, **extra):
+        result = {'frames': len(self.latency),
+                  'flushes': self.flushes,
+                  'latency_ms': percentiles(self.latency, 1000.0),
+                  'cells_written': percentiles(self.cells_written),
+                  'cells_flushed': percentiles(self.cells_flushed)}
+        result.update(extra)
+        return result
+
+
+def percentiles(samples, scale=1):
+    if not samples:
+        return {}
+
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    return dict((name, at(fraction) * scale) for name, fraction in
+                (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)))
+
+
+def make_app(clock, screen):
+    return App(clock, 'Benchmark', [('&quit', None)], screen=screen)
+
+
+def workload_bulk_add_rows(options):
+    '''add_rows with millions of rows, then the first frame'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    list_box = ListBox((0, 0), (40, -1), None)
+    app.add_widget('list', list_box)
+    clock.advance(0)
+
+    rows = ['row %d' % i for i in range(options.rows)]
+
+    recorder = Recorder(screen)
+    start = time.time()
+
+    def add():
+        list_box.add_rows(rows)
+        list_box.draw()
+
+    recorder.frame(add, clock)
+    return recorder.result(rows=options.rows,
+                           total_ms=(time.time() - start) * 1000)
+
+
+def workload_scroll(options):
+    '''hold the down arrow on a long ListBox, one key per frame'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    list_box = ListBox((0, 0), (40, -1), None)
+    list_box.add_rows(['row %d' % i for i in range(options.rows)])
+    app.add_widget('list', list_box)
+    clock.advance(0)
+
+    recorder = Recorder(screen)
+    for i in range(options.frames):
+        recorder.frame(lambda: app.process_character(curses.KEY_DOWN), clock)
+    return recorder.result(rows=options.rows)
+
+
+def workload_styled_scroll(options):
+    '''scroll, with every tenth row coloured as an alert and an alert
+       raised on a row in view every frame'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    list_box = ListBox((0, 0), (40, -1), None)
+    list_box.add_rows(['row %d' % i for i in range(options.rows)])
+    source = list_box.source()
+    alert = screen.styles.attr('alert')
+    for i in range(0, options.rows, 10):
+        source.set_style(i, alert)
+    app.add_widget('list', list_box)
+    clock.advance(0)
+
+    def step():
+        app.process_character(curses.KEY_DOWN)
+        row = min(list_box.selected + 5, options.rows - 1)
+        source.set_style(row, alert ^ curses.A_BOLD)
+
+    recorder = Recorder(screen)
+    for i in range(options.frames):
+        recorder.frame(step, clock)
+    return recorder.result(rows=options.rows)
+
+
+def workload_log_tail(options):
+    '''a log streaming into a full ring, a few lines per frame, followed
+       at the bottom'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    ring = RingSource(10000)
+    ring.extend('old line %d' % i for i in range(10000))
+    app.add_widget('tail', LogTail((0, 0), (-1, -1), ring))
+    clock.advance(0)
+
+    count = [0]
+
+    def log():
+        ring.extend('%08d GET /index.html 200 in %d ms' % (count[0] + i, i)
+                    for i in range(5))
+        count[0] += 5
+
+    recorder = Recorder(screen)
+    for i in range(options.frames):
+        recorder.frame(log, clock)
+    return recorder.result(lines_per_frame=5)
+
+
+def workload_table_stream(options):
+    '''a feed updating random cells of a Table, a batch per frame'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    dim = (10, 10)
+    table = Table((0, 0), (COLS - 2, ROWS - 4), None, dim)
+    app.add_widget('table', table)
+    clock.advance(0)
+
+    updates = options.updates
+    rand = random.Random(1)
+
+    def update():
+        table.set_cells([(rand.randrange(dim[1]), rand.randrange(dim[0]),
+                          rand.randrange(100000)) for i in range(updates)])
+        table.draw()
+
+    recorder = Recorder(screen)
+    for i in range(options.frames):
+        recorder.frame(update, clock)
+    return recorder.result(updates_per_frame=updates)
+
+
+def workload_table_dashboard(options):
+    '''a 1000 x 50 grid of typed float columns, a batch of updates per
+       frame'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    dim = (1000, 50)
+    columns = [Column('d', lambda value: '%.1f' % value)
+               for c in range(dim[1])]
+    table = Table((0, 0), (COLS - 2, ROWS - 4), None, dim, columns=columns)
+    app.add_widget('table', table)
+    clock.advance(0)
+
+    updates = options.updates
+    rand = random.Random(1)
+
+    def update():
+        table.set_cells([(rand.randrange(dim[1]), rand.randrange(dim[0]),
+                          rand.random() * 1000) for i in range(updates)])
+        table.draw()
+
+    recorder = Recorder(screen)
+    for i in range(options.frames):
+        recorder.frame(update, clock)
+    return recorder.result(updates_per_frame=updates)
+
+
+def workload_table_sorted_stream(options):
+    '''updates to the sort column of a 100k row Table sorted by it, each
+       one moves a row'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    dim = (100000, 3)
+    columns = [Column('l'), Column('d'), Column()]
+    table = Table((0, 0), (COLS - 2, ROWS - 4), None, dim, columns=columns)
+
+    rand = random.Random(1)
+    table.set_cells([(0, r, r) for r in range(dim[0])])
+    table.set_cells([(1, r, rand.random()) for r in range(dim[0])])
+    table.sort_by(1)
+    app.add_widget('table', table)
+    clock.advance(0)
+
+    updates = options.updates
+
+    def update():
+        table.set_cells([(1, rand.randrange(dim[0]), rand.random())
+                         for i in range(updates)])
+        table.draw()
+
+    recorder = Recorder(screen)
+    for i in range(options.frames):
+        recorder.frame(update, clock)
+    return recorder.result(updates_per_frame=updates)
+
+
+def workload_feed_burst(options):
+    '''a CSV feed dumping `rows` updates at once into a 1000 x 50 table,
+       one frame per reactor turn until it is all applied'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    dim = (1000, 50)
+    table = Table((0, 0), (COLS - 2, ROWS - 4), None, dim)
+    app.add_widget('table', table)
+    clock.advance(0)
+
+    feed = TableFeedFactory(table).buildProtocol(None)
+    transport = StringTransport()
+    feed.makeConnection(transport)
+
+    rand = random.Random(1)
+    data = ''.join('%d,%d,%d\n' % (rand.randrange(dim[0]),
+                                    rand.randrange(dim[1]), i)
+                   for i in range(options.rows)).encode('ascii')
+
+    # like a socket, 64k at a time, and nothing while the feed is paused
+    chunks = [data[i:i + 65536] for i in range(0, len(data), 65536)]
+
+    def turn():
+        if chunks and transport.producerState == 'producing':
+            feed.dataReceived(chunks.pop(0))
+
+    recorder = Recorder(screen)
+    while chunks or clock.getDelayedCalls():
+        recorder.frame(turn, clock)
+    return recorder.result(lines=options.rows, errors=feed.errors)
+
+
+def workload_focus_cycle(options):
+    '''TAB between a ListBox and a Table'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    list_box = ListBox((0, 0), (40, -1), None)
+    list_box.add_rows(['row %d' % i for i in range(1000)])
+    app.add_widget('list', list_box)
+    app.add_widget('table', Table((45, 0), (100, 30), None, (10, 10)))
+    clock.advance(0)
+
+    recorder = Recorder(screen)
+    for i in range(options.frames):
+        recorder.frame(lambda: app.process_character(ascii.TAB), clock)
+    return recorder.result()
+
+
+def workload_startup(options):
+    '''make an app with STARTUP_TABS tabs of STARTUP_WIDGETS list boxes,
+       time to its first frame'''
+
+    rows = ['row %d' % i for i in range(100)]
+
+    def start(clock, screen):
+        app = make_app(clock, screen)
+        for tab in range(STARTUP_TABS):
+            widgets = []
+            for i in range(STARTUP_WIDGETS):
+                list_box = ListBox(((i % 6) * 26, (i // 6) * 9), (26, 9),
+                                   None)
+                list_box.add_rows(rows)
+                widgets.append(('%d.%d' % (tab, i), list_box))
+            app.add_widgets(widgets, visible=(tab == 0))
+
+    recorder = Recorder(None)
+    for i in range(max(options.frames // 50, 1)):
+        clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+        recorder.screen = screen
+        recorder.frame(lambda: start(clock, screen), clock)
+    return recorder.result(widgets=STARTUP_TABS * STARTUP_WIDGETS)
+
+
+def workload_resize_storm(options):
+    '''bursts of 20 resizes, each burst should give a single relayout'''
+
+    clock, screen = Clock(), VirtualScreen(ROWS, COLS)
+    app = make_app(clock, screen)
+    list_box = ListBox((0, 0), (40, -1), None)
+    list_box.add_rows(['row %d' % i for i in range(1000)])
+    table = Table((45, 0), (100, 30), None, (10, 10))
+    app.add_widget('list', list_box)
+    app.add_widget('table', table)
+    app.set_layout(HBox([Item(list_box, size=40), table]))
+    clock.advance(0)
+
+    def storm():
+        for i in range(20):
+            screen.resize(ROWS + i % 5, COLS - i % 7)
+            app.resized()
+            clock.advance(0.01)
+
+    recorder = Recorder(screen)
+    for i in range(max(options.frames // 20, 1)):
+        # advance past the debounce delay so the relayout happens
+        recorder.frame(storm, clock, advance=1)
+    return recorder.result(resizes_per_burst=20)
+
+
+WORKLOADS = dict((name[len('workload_'):], value)
+                 for name, value in globals().items()
+                 if name.startswith('workload_'))
+
+
+def run_one(name, options):
+    gc.collect()
+    result = WORKLOADS[name](options)
+    # kilobytes on linux
+    result['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def run_all(names, options):
+    '''run each workload in a fresh interpreter'''
+
+    results = {}
+    for name in names:
+        args = [sys.executable, __file__, '--child', name,
+                '--rows', str(options.rows),
+                '--frames', str(options.frames),
+                '--updates', str(options.updates)]
+        results[name] = json.loads(subprocess.check_output(args).decode())
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''names of workloads whose p90 frame latency got worse than
+       threshold times the baseline'''
+
+    regressions = []
+    for name, result in sorted(results.items()):
+        old = baseline.get('workloads', {}).get(name)
+        if not old:
+            continue
+        new_p90 = result['latency_ms']['p90']
+        old_p90 = old['latency_ms']['p90']
+        ratio = new_p90 / old_p90 if old_p90 else 1.0
+        print("%-20s p90 %8.3f ms -> %8.3f ms (x%.2f)" % (
+            name, old_p90, new_p90, ratio))
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def report(results):
+    print("%-20s %8s %9s %9s %9s %10s %10s %10s" % (
+        'workload', 'frames', 'p50 ms', 'p90 ms', 'p99 ms',
+        'written', 'flushed', 'rss kb'))
+    for name, result in sorted(results.items()):
+        latency = result['latency_ms']
+        print("%-20s %8d %9.3f %9.3f %9.3f %10d %10d %10d" % (
+            name, result['frames'],
+            latency['p50'], latency['p90'], latency['p99'],
+            result['cells_written']['p50'], result['cells_flushed']['p50'],
+            result['max_rss_kb']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='twistedcurses benchmarks')
+    parser.add_argument('workloads', nargs='*',
+                        help='any of: ' + ', '.join(sorted(WORKLOADS)))
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='rows in the ListBox workloads')
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--updates', type=int, default=50,
+                        help='cell updates per frame in table_stream')
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--compare', help='JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='p90 ratio that counts as a regression')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        sys.stdout.write(json.dumps(run_one(options.child, options)))
+        return 0
+
+    names = options.workloads or sorted(WORKLOADS)
+    for name in names:
+        if name not in WORKLOADS:
+            parser.error('unknown workload %s' % name)
+
+    results = run_all(names, options)
+    report(results)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'time': time.time(),
+                       'options': {'rows': options.rows,
+                                   'frames': options.frames,
+                                   'updates': options.updates},
+                       'workloads': results}, f, indent=2, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(results, json.load(f), options.threshold)
+        if regressions:
+            print("regressions: " + ", ".join(regressions))
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,7 +18,7 @@
 from twistedcurses.app import App
 from twistedcurses.list_box import ListBox
 from twistedcurses.table import Table
-from twisted.python import log
+from twistedcurses.logger import logger
 
 from twisted.internet.task import LoopingCall
 
@@ -39,17 +39,17 @@ class myApp(App):
         self.__lc.start(1.0)
 
     def clock(self):
-        log.msg("clock", self.__i__)
+        logger.debug("clock %s", self.__i__)
         self.widget('table').set_cells([(0, 0, self.__i__)])
         self.widget('table').draw()
         self.__i__ += 1
 
     def start(self, key):
-        log.msg("menu: start", key)
+        logger.info("menu: start %s", key)
 
     def stop(self, key):
         self.__lc.stop()
-        log.msg("menu: stop", key)
+        logger.info("menu: stop %s", key)
 
     def list_box_active_item_changed(self, arg):
         '''test callback,
@@ -0,0 +1,68 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' ListSource, its rows, styles and what listeners hear.
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twistedcurses.data_source import ListSource
+
+
+class Listener:
+
+    def __init__(self):
+        self.changes = []
+
+    def rows_inserted(self, index, count):
+        self.changes.append(('inserted', index, count))
+
+    def rows_removed(self, index, count):
+        self.changes.append(('removed', index, count))
+
+    def rows_updated(self, index, count):
+        self.changes.append(('updated', index, count))
+
+
+class ListSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.source = ListSource(['a', 'b', 'c'])
+        self.source.set_style(0, 7)
+        self.listener = Listener()
+        self.source.subscribe(self.listener)
+
+    def test_update(self):
+        self.source.update(1, ['B', 'C'])
+        self.assertEqual(self.source.fetch(0, 3), ['a', 'B', 'C'])
+        self.assertEqual(self.listener.changes, [('updated', 1, 2)])
+
+    def test_update_past_the_end(self):
+        '''doesn't grow the rows behind the listeners' and styles' backs'''
+
+        for index, rows in ((3, ['d']), (2, ['c', 'd']), (-1, ['c'])):
+            self.assertRaises(IndexError, self.source.update, index, rows)
+        self.assertEqual(self.source.fetch(0, 5), ['a', 'b', 'c'])
+        self.assertEqual(list(self.source.fetch_styles(0, 5)), [7, 0, 0])
+        self.assertEqual(self.listener.changes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Bad values from a feed don't hide the good ones.
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twisted.internet.task import Clock
+
+from twistedcurses.feed import TableFeed
+from twistedcurses.table_model import TableModel
+from twistedcurses.table_store import Column
+
+
+class Listener:
+
+    def __init__(self):
+        self.changed = set()
+
+    def cells_changed(self, model, changes):
+        self.changed.update((r, c) for r, c, old in changes)
+
+
+class FeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = TableModel((3, 2), [Column('d'), Column()])
+        self.listener = Listener()
+        self.model.subscribe(self.listener)
+
+    def test_set_cells_tells_what_it_set(self):
+        '''the cells set before a bad value are news'''
+
+        self.assertRaises(TypeError, self.model.set_cells,
+                          [(0, 0, 1.5), (1, 0, 'x'), (0, 1, 'abc')])
+        self.assertEqual(self.listener.changed, set([(0, 0), (0, 1)]))
+
+    def test_feed(self):
+        clock = Clock()
+        feed = TableFeed(self.model, reactor=clock)
+        for line in ['0,0,1.5', '1,0,abc', '2,0,7', '0,1,x', '1,1,y']:
+            feed.lineReceived(line)
+        clock.advance(0)
+
+        self.assertEqual(feed.errors, 1)
+        self.assertEqual(self.listener.changed,
+                         set([(0, 0), (2, 0), (0, 1), (1, 1)]))
+        self.assertEqual(self.model.get(2, 0), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Which keys go to bindings and which to the focused widget.
+'''
+
+import gc
+import os
+import sys
+import unittest
+import weakref
+
+import curses
+from curses import ascii
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twisted.internet.task import Clock
+
+from twistedcurses.app import App
+from twistedcurses.list_box import ListBox
+from twistedcurses.screen import VirtualScreen
+
+
+class KeysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        menu = [('&start', lambda key: self.calls.append('start')),
+                ('&quit', lambda key: self.calls.append('quit'))]
+        self.clock = Clock()
+        self.app = App(self.clock, 'Keys', menu, screen=VirtualScreen(20, 60))
+        self.list_box = ListBox((0, 0), (20, -1), None)
+        self.list_box.add_rows(['alpha', 'quux', 'stone', 'quiet'])
+        self.app.add_widget('list', self.list_box)
+        self.clock.advance(0)
+
+    def tearDown(self):
+        self.app.close()
+
+    def keys(self, *keys):
+        for key in keys:
+            self.app.process_character(key)
+
+    def test_type_ahead_before_hot_keys(self):
+        self.keys(ord('q'))
+        self.assertEqual(self.list_box.selected, 1)
+        self.assertEqual(self.calls, [])
+
+    def test_hot_keys_with_meta(self):
+        self.keys(ascii.ESC, ord('q'))
+        self.assertEqual(self.calls, ['quit'])
+        self.assertEqual(self.list_box.selected, 0)
+
+    def test_own_bindings_first(self):
+        self.app.bind('g g', lambda key: self.calls.append('top'),
+                      widget='list')
+        self.keys(ord('g'), ord('g'))
+        self.assertEqual(self.calls, ['top'])
+
+    def test_repeats_after_sequence(self):
+        '''keys read in one go, the repeats after the one that ends a
+           sequence still go to the widget'''
+        self.app.bind('C-x q', lambda key: self.calls.append('x'))
+        self.app.process_characters([ascii.CAN, ord('q'), ord('q')])
+        self.assertEqual(self.calls, ['x'])
+        self.assertEqual(self.list_box.selected, 1)
+
+    def test_hot_keys_while_filtered(self):
+        '''a shown filter doesn't type, the letters are hot keys again'''
+        self.list_box.set_filter('qu')
+        self.keys(ord('s'))
+        self.assertEqual(self.calls, ['start'])
+
+    def test_replaced_widget_forgotten(self):
+        '''the dispatcher lets go of a widget that was replaced'''
+        self.keys(curses.KEY_DOWN)
+        old = weakref.ref(self.list_box)
+        del self.list_box
+
+        self.app.add_widget('list', ListBox((0, 0), (20, -1), None))
+        self.clock.advance(0)
+        self.keys(curses.KEY_DOWN)
+        gc.collect()
+        self.assertIsNone(old())
+
+
+if __name__ == '__main__':
+    unittest.main()
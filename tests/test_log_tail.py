@@ -0,0 +1,76 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' A followed file growing, truncated and rotated.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twisted.internet.task import Clock
+
+from twistedcurses.log_tail import FileSource
+
+
+class FileSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'app.log')
+        self.write(b'one\ntwo\n')
+        self.clock = Clock()
+        self.source = FileSource(self.path, follow=1, reactor=self.clock)
+
+    def tearDown(self):
+        self.source.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, data, mode='wb'):
+        with open(self.path, mode) as log:
+            log.write(data)
+
+    def lines(self):
+        self.clock.advance(1)
+        return self.source.fetch(0, len(self.source))
+
+    def test_grown(self):
+        self.write(b'three\n', 'ab')
+        self.assertEqual(self.lines(), ['one', 'two', 'three'])
+
+    def test_truncated(self):
+        self.write(b'new\n')
+        self.assertEqual(self.lines(), ['new'])
+
+    def test_rotated(self):
+        '''moved away, and a new file as big as the old one made'''
+
+        os.rename(self.path, self.path + '.1')
+        self.assertEqual(self.lines(), ['one', 'two'])
+
+        self.write(b'uno\ndos\n')
+        self.assertEqual(self.lines(), ['uno', 'dos'])
+
+        self.write(b'tres\n', 'ab')
+        self.assertEqual(self.lines(), ['uno', 'dos', 'tres'])
+
+
+if __name__ == '__main__':
+    unittest.main()
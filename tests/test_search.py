@@ -0,0 +1,117 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' The search index against a plain look at every row, as rows change.
+'''
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twistedcurses import search, sorted_view
+from twistedcurses.data_source import ListSource
+from twistedcurses.search import SearchIndex, FilteredSource
+from twistedcurses.sorted_view import SortedSource
+
+WORDS = ['alpha', 'beta', 'Gamma', 'delta', 'alps', 'Bet', 'ga', 'al']
+QUERIES = ['a', 'al', 'alp', 'alpha b', 'g', 'bet', 'zz', 'delta']
+
+
+def first(rows, query, start):
+    query = query.lower()
+    for row_no in list(range(start, len(rows))) + list(range(start)):
+        if rows[row_no].lower().startswith(query):
+            return row_no
+    return None
+
+
+def matches(rows, query, start=0):
+    return [row_no for row_no in range(start, len(rows))
+            if query.lower() in rows[row_no].lower()]
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(1)
+        self.spacing, self.shifts = sorted_view.SPACING, search.SHIFTS
+
+    def tearDown(self):
+        sorted_view.SPACING = search.SPACING = self.spacing
+        search.SHIFTS = self.shifts
+
+    def row(self):
+        return ' '.join(self.random.choice(WORDS)
+                        for i in range(self.random.randint(1, 3)))
+
+    def change(self, source):
+        '''one random change to source'''
+
+        rand, count = self.random, len(source)
+        choice = rand.random()
+        if choice < 0.3 or not count:
+            source.extend([self.row() for i in range(rand.randint(1, 5))])
+        elif choice < 0.5:
+            source.insert(rand.randrange(count + 1), [self.row()])
+        elif choice < 0.75:
+            index = rand.randrange(count)
+            source.remove(index, min(rand.randint(1, 3), count - index))
+        else:
+            source.update(rand.randrange(count), [self.row()])
+
+    def check(self, view, index, filtered):
+        rows = view.fetch(0, len(view))
+        for query in QUERIES:
+            for start in (0, 1, len(rows) // 2, len(rows)):
+                self.assertEqual(index.first(query, start, prefix=True),
+                                 first(rows, query, start))
+            self.assertEqual(list(index.matches(query)),
+                             matches(rows, query))
+            self.assertEqual(list(index.matches(query, 3)),
+                             matches(rows, query, 3))
+        self.assertEqual(filtered.fetch(0, len(filtered)),
+                         [row for row in rows if 'al' in row.lower()])
+
+    def run_changes(self, sort):
+        source = ListSource([self.row() for i in range(30)])
+        view = SortedSource(source, lambda row: row.lower()) if sort \
+            else source
+        index = SearchIndex(view)
+        filtered = FilteredSource(view, index, 'al')
+        for i in range(100):
+            self.change(source)
+            self.check(view, index, filtered)
+
+    def test_changes(self):
+        self.run_changes(sort=False)
+
+    def test_moves(self):
+        '''a sorted view moves rows as they change'''
+        self.run_changes(sort=True)
+
+    def test_crowded(self):
+        '''labels run out of room and postings fall behind'''
+        sorted_view.SPACING = search.SPACING = 4
+        search.SHIFTS = 3
+        self.run_changes(sort=False)
+        self.run_changes(sort=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Keys from a telnet session, however the packets split them.
+'''
+
+import os
+import sys
+import unittest
+
+import curses
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twisted.internet.error import ConnectionDone
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+from twisted.test.proto_helpers import StringTransport
+
+from twistedcurses.app import App
+from twistedcurses.list_box import ListBox
+from twistedcurses.server import (ESC_DELAY, KeyDecoder, TelnetServerFactory,
+                                  decode_keys)
+
+
+class KeyDecoderTest(unittest.TestCase):
+
+    def test_split_sequence(self):
+        keys = KeyDecoder()
+        self.assertEqual(keys.decode(b'a\x1b'), [ord('a')])
+        self.assertEqual(keys.decode(b'['), [])
+        self.assertEqual(keys.decode(b'Ab'), [curses.KEY_UP, ord('b')])
+        self.assertEqual(keys.decode(b'\x1b[1'), [])
+        self.assertEqual(keys.decode(b'5~'), [curses.KEY_F0 + 5])
+        self.assertFalse(keys.pending())
+
+    def test_lone_escape(self):
+        keys = KeyDecoder()
+        self.assertEqual(keys.decode(b'\x1b'), [])
+        self.assertTrue(keys.pending())
+        self.assertEqual(keys.flush(), [27])
+        self.assertEqual(keys.decode(b'\x1bx'), [27, ord('x')])
+
+    def test_split_enter(self):
+        keys = KeyDecoder()
+        self.assertEqual(keys.decode(b'x\r'), [ord('x'), 10])
+        self.assertEqual(keys.decode(b'\ny'), [ord('y')])
+
+    def test_whole(self):
+        self.assertEqual(decode_keys(b'\x1b[A\r\n\x1b['),
+                         [curses.KEY_UP, 10, 27, ord('[')])
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.list_boxes = []
+
+        def make_app(reactor, screen):
+            app = App(reactor, 'Session', [('&quit', None)], screen=screen)
+            list_box = ListBox((0, 0), (10, 20), None)
+            list_box.add_rows(['row %d' % i for i in range(10)])
+            app.add_widget('list', list_box)
+            self.list_boxes.append(list_box)
+            return app
+
+        factory = TelnetServerFactory(make_app, self.clock)
+        self.protocol = factory.buildProtocol(None)
+        self.protocol.makeConnection(StringTransport())
+        self.clock.advance(0)
+
+    def tearDown(self):
+        self.protocol.connectionLost(Failure(ConnectionDone()))
+
+    def test_split_arrow(self):
+        self.protocol.dataReceived(b'\x1b[')
+        self.protocol.dataReceived(b'B')
+        self.clock.advance(ESC_DELAY)
+        self.assertEqual(self.list_boxes[0].selected, 1)
+
+    def test_escape_alone(self):
+        '''ESC after '/' ends the filter once nothing follows it'''
+
+        list_box = self.list_boxes[0]
+        self.protocol.dataReceived(b'/row 1')
+        self.assertTrue(list_box.wants_key(27))
+        self.protocol.dataReceived(b'\x1b')
+        self.clock.advance(ESC_DELAY)
+        self.assertFalse(list_box.wants_key(27))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' What the terminal shows, frame by frame, on a VirtualScreen.
+
+        python -m unittest discover tests
+'''
+
+import os
+import sys
+import unittest
+
+import curses
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twisted.internet.task import Clock
+
+from twistedcurses.app import App
+from twistedcurses.data_source import ListSource
+from twistedcurses.list_box import ListBox
+from twistedcurses.table import Table
+from twistedcurses.screen import VirtualScreen
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock, self.screen = Clock(), VirtualScreen(10, 40)
+        self.app = App(self.clock, 'Snap', [('&Quit', None), ('&Sort', None)],
+                       screen=self.screen)
+
+    def tearDown(self):
+        self.app.close()
+
+    def frame(self):
+        '''run the reactor until the frame is on the terminal'''
+        self.clock.advance(0)
+        return self.screen.snapshot()
+
+    def attrs(self):
+        '''the attribute of every cell on the terminal'''
+        return [[self.screen.attr(y, x) for x in range(self.screen.cols)]
+                for y in range(self.screen.rows)]
+
+    def test_first_frame(self):
+        '''the app's frame is there from the start, stdscr starts out
+           touched and is painted under it, not over it'''
+
+        list_box = ListBox((0, 0), (12, -1), None)
+        list_box.add_rows(['row %d' % i for i in range(20)])
+        self.app.add_widget('list', list_box)
+
+        self.assertEqual(self.frame(), [
+            '+--------------------------------------+',
+            '| Quit  Sort === Snap ===              |',
+            '+----------+---------------------------|',
+            '| row 0    |                           |',
+            '| row 1    |                           |',
+            '| row 2    |                           |',
+            '| row 3    |                           |',
+            '| row 4    |                           |',
+            '| row 5    |                           |',
+            '+----------+---------------------------+'])
+
+    def test_list_box_scroll(self):
+        list_box = ListBox((0, 0), (12, -1), None)
+        list_box.add_rows(['row %d' % i for i in range(20)])
+        self.app.add_widget('list', list_box)
+        self.frame()
+
+        for i in range(8):
+            self.app.process_character(curses.KEY_DOWN)
+
+        self.assertEqual(self.frame(), [
+            '+--------------------------------------+',
+            '| Quit  Sort === Snap ===              |',
+            '+----------+---------------------------|',
+            '| row 4    |                           |',
+            '| row 5    |                           |',
+            '| row 6    |                           |',
+            '| row 7    |                           |',
+            '| row 8    |                           |',
+            '| row 9    |                           |',
+            '+----------+---------------------------+'])
+        # row 8 is selected
+        self.assertTrue(self.screen.attr(7, 2) & curses.A_STANDOUT)
+        self.assertFalse(self.screen.attr(6, 2) & curses.A_STANDOUT)
+
+    def test_remove_last_selected(self):
+        '''the selection moves up when its row goes, and shows the same as
+           after a full repaint'''
+
+        list_box = ListBox((0, 0), (12, -1), None)
+        list_box.add_rows(['row %d' % i for i in range(5)])
+        self.app.add_widget('list', list_box)
+        self.frame()
+
+        for i in range(4):
+            self.app.process_character(curses.KEY_DOWN)
+        self.frame()
+        list_box.remove_row(4)
+        shown, attrs = self.frame(), self.attrs()
+        self.assertEqual(list_box.selected, 3)
+
+        list_box.draw(True)
+        self.assertEqual(self.frame(), shown)
+        self.assertEqual(self.attrs(), attrs)
+        self.assertTrue(self.screen.attr(6, 2) & curses.A_STANDOUT)
+
+    def test_replace_widget(self):
+        '''a widget replaced by another of the same name lets go of its
+           source'''
+
+        heard = []
+
+        class Heard(ListBox):
+            def rows_inserted(self, index, count):
+                heard.append((index, count))
+                ListBox.rows_inserted(self, index, count)
+
+        source = ListSource(['row %d' % i for i in range(3)])
+        self.app.add_widget('list', Heard((0, 0), (12, -1), None,
+                                          source=source))
+        self.frame()
+
+        self.app.add_widget('list', ListBox((0, 0), (12, -1), None,
+                                            source=source))
+        source.extend(['row 3'])
+        self.assertEqual(heard, [])
+        self.assertEqual(self.frame()[3:7], [
+            '| row 0    |                           |',
+            '| row 1    |                           |',
+            '| row 2    |                           |',
+            '| row 3    |                           |'])
+
+    def test_table_update(self):
+        table = Table((0, 0), (34, 6), None, (2, 3))
+        self.app.add_widget('table', table)
+        self.frame()
+
+        table.set_cells([(1, 0, 42), (2, 1, 'x')])
+        table.draw()
+
+        self.assertEqual(self.frame(), [
+            '+--------------------------------------+',
+            '| Quit  Sort === Snap ===              |',
+            '+----------+----------+----------+-----|',
+            '|          |       42 |          |     |',
+            '+----------+----------+----------+     |',
+            '|          |          |        x |     |',
+            '|          |          |          |     |',
+            '+----------+----------+----------+     |',
+            '|                                      |',
+            '+--------------------------------------+'])
+
+    def test_table_last_column(self):
+        '''no grid line after the last column, the space left over goes
+           to it instead of to an empty column'''
+
+        table = Table((0, 0), (36, 6), None, (2, 3))
+        table.set_cells([(2, 1, 7)])
+        self.app.add_widget('table', table)
+
+        self.assertEqual(self.frame()[2:8], [
+            '+----------+----------+------------+---|',
+            '|          |          |            |   |',
+            '+----------+----------+------------+   |',
+            '|          |          |        7   |   |',
+            '|          |          |            |   |',
+            '+----------+----------+------------+   |'])
+
+
+if __name__ == '__main__':
+    unittest.main()
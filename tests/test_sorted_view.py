@@ -0,0 +1,134 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' A sorted view against sorting the rows again, and what its listeners
+    are told as rows come and go.
+'''
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from twisted.internet.task import Clock
+
+from twistedcurses import sorted_view
+from twistedcurses.app import App
+from twistedcurses.data_source import ListSource
+from twistedcurses.list_box import ListBox
+from twistedcurses.screen import VirtualScreen
+from twistedcurses.sorted_view import SortedSource
+
+
+class Mirror:
+    '''a copy of the view's rows made only from what it notifies'''
+
+    def __init__(self, view):
+        self.view = view
+        self.rows = view.fetch(0, len(view))
+        view.subscribe(self)
+
+    def rows_inserted(self, index, count):
+        self.rows[index:index] = self.view.fetch(index, index + count)
+
+    def rows_removed(self, index, count):
+        del self.rows[index:index + count]
+
+    def rows_updated(self, index, count):
+        self.rows[index:index + count] = self.view.fetch(index, index + count)
+
+    def rows_moved(self, index, to):
+        self.rows.insert(to, self.rows.pop(index))
+
+
+class SortedSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(1)
+        self.spacing = sorted_view.SPACING
+
+    def tearDown(self):
+        sorted_view.SPACING = self.spacing
+
+    def run_changes(self, reverse):
+        rand = self.random
+        source = ListSource([rand.randrange(20) for i in range(30)])
+        view = SortedSource(source, reverse=reverse)
+        mirror = Mirror(view)
+
+        for i in range(300):
+            count, choice = len(source), rand.random()
+            if choice < 0.2 or not count:
+                source.extend([rand.randrange(20) for i in range(3)])
+            elif choice < 0.45:
+                source.insert(rand.randrange(count + 1),
+                              [rand.randrange(20)
+                               for i in range(rand.randint(1, 3))])
+            elif choice < 0.75:
+                index = rand.randrange(count)
+                source.remove(index, min(rand.randint(1, 3), count - index))
+            else:
+                source.update(rand.randrange(count), [rand.randrange(20)])
+
+            rows = source.fetch(0, len(source))
+            order = sorted(range(len(rows)), key=lambda row_no: rows[row_no])
+            if reverse:
+                order.reverse()
+            self.assertEqual(view.fetch(0, len(view)),
+                             [rows[row_no] for row_no in order])
+            self.assertEqual(mirror.rows, view.fetch(0, len(view)))
+            self.assertEqual([view.source_row(i) for i in range(len(view))],
+                             order)
+            for shown, row_no in enumerate(order):
+                self.assertEqual(view.row_of(row_no), shown)
+
+    def test_changes(self):
+        self.run_changes(reverse=False)
+        self.run_changes(reverse=True)
+
+    def test_crowded(self):
+        '''labels run out of room between rows'''
+        sorted_view.SPACING = 4
+        self.run_changes(reverse=False)
+        self.run_changes(reverse=True)
+
+    def test_selection_stays(self):
+        '''other rows coming and going don't move the selection'''
+
+        clock = Clock()
+        app = App(clock, 'Sorted', [('&quit', None)],
+                  screen=VirtualScreen(20, 60))
+        source = ListSource(['r%03d' % i for i in range(20)])
+        list_box = ListBox((0, 0), (20, -1), None, source=source)
+        app.add_widget('list', list_box)
+        list_box.set_sort(lambda row: row)
+        clock.advance(0)
+
+        list_box.selected = list_box.active = 10
+        source.remove(0)
+        self.assertEqual(list_box.selected, 9)
+        self.assertEqual(list_box.active, 9)
+
+        source.insert(0, ['r000', 'r999'])
+        self.assertEqual(list_box.selected, 10)
+        self.assertEqual(list_box.active, 10)
+        app.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,14 +14,13 @@
 
 '''
 
-import curses
-from curses import ascii
-
+from itertools import groupby
 from signal import signal, SIGWINCH
 
-from twisted.python import log
-
-from util import get_real_termial_size
+from keymap import Keymap, Dispatcher
+from logger import logger, INFO
+from screen import CursesScreen, set_default_screen
+from util import TerminalGeometry
 
 
 class CursesStdIO:
@@ -41,76 +40,244 @@ class CursesStdIO:
 
 class App(CursesStdIO):
 
-    def __init__(self, reactor, title='My App', menu={}):
+    def __init__(self, reactor, title='My App', menu={}, max_fps=None,
+                 resize_delay=0.1, log_sink=None, log_level=INFO,
+                 screen=None, profiler=None, theme=None):
         '''menu -> { 'file':callback, 'view':callback}
+
+           max_fps -> None paints at most once per reactor iteration,
+                      otherwise frames are spaced at least 1/max_fps apart
+
+           resize_delay -> seconds the terminal size has to stay put before
+                           we relayout, dragging a window sends lots of
+                           SIGWINCHs
+
+           log_sink -> where to log to, see logger.py, None leaves logging
+                       off (or as already configured)
+
+           screen -> backend to draw on, see screen.py, defaults to the
+                     real terminal. Widgets made after the app use it too.
+
+           profiler -> a profiler.Profiler to time the frames with, F12
+                       shows what it found
+
+           theme -> a theme.Theme, the colours and attributes to draw with
         '''
 
-        log.startLogging(open('log.log', 'w'))
+        if log_sink is not None:
+            logger.configure(log_sink, log_level)
         self.__reactor = reactor
 
-        signal(SIGWINCH, self.onResize)
+        self.screen = screen if screen is not None else CursesScreen()
+        set_default_screen(self.screen)
+
+        # colour pairs and attribute words, see theme.py
+        self.styles = self.screen.styles
+        if theme is not None:
+            self.styles.set_theme(theme)
+
+        # the app owns the terminal size, widgets read it from here
+        self.geometry = TerminalGeometry(self.screen.size)
+
+        self.__resize_delay = resize_delay
+        self.__resize_call = None
+
+        if self.screen.interactive:
+            signal(SIGWINCH, self.onResize)
 
         #curses.setupterm()
         self.__first_time_through = True
 
-        self.__stdscr = curses.initscr()
-        self.__stdscr.keypad(True)
-        self.__stdscr.nodelay(True)
+        self.screen.start()
 
-        y, x = get_real_termial_size()
-        self._menu = curses.newwin(y, x, 0, 0)
+        y, x = self.geometry.size()
+        self._menu = self.screen.newwin(y, x, 0, 0)
+        # a panel under the widgets', so update_panels paints it in order
+        # instead of over it (e.g. with a touched stdscr)
+        self.__menu_panel = self.screen.new_panel(self._menu)
+        self.__menu_panel.bottom()
 
         self.__last_size = (y, x)
 
         self.__focus__items = []
         self.__in_focus = 0
 
-        curses.start_color()
-
-        # normal colour
-        curses.init_pair(1, curses.COLOR_WHITE, curses.COLOR_BLACK)
-        # focused colour
-        curses.init_pair(2, curses.COLOR_YELLOW, curses.COLOR_BLACK)
-        # lighter
-        curses.init_pair(3, curses.COLOR_YELLOW, curses.COLOR_BLACK)
-        curses.init_pair(4, curses.COLOR_YELLOW, curses.COLOR_BLACK)
-
-        #self.__stdscr.bkgd(' ', curses.color_pair(1))
-
-        curses.noecho()
-        curses.cbreak()
-        curses.curs_set(False)
-
         self.title = title
         self.__menu__ = menu
-        self.__key_handler__ = {'menu': {}}
 
-        # list of widgets
+        # global key bindings, they go before the focused widget's
+        self.keymap = Keymap()
+        self.keymap.bind('TAB', self.__focus_next)
+        self.keymap.bind('RESIZE', lambda key: self.resized())
+        for item, callback in menu:
+            key = item.split('&')[1][0]
+            self.keymap.bind(key, callback)
+            # for when the focused widget types the letter, see types_key
+            self.keymap.bind('M-' + key, callback)
+        self.__dispatcher = Dispatcher(self.keymap)
+
+        # widgets by name, and their names in the order they were added,
+        # which is the order they are painted in
         self._widgets = {}
+        self.__order = []
+
+        # see layout.py, None leaves the widgets where they put themselves
+        self.__layout = None
+
+        # frame scheduling, draws only mark things dirty, a single
+        # delayed call then paints them and flushes the terminal once
+        self.__max_fps = max_fps
+        self.__frame_call = None
+        self.__last_frame = 0
+        self.__dirty_app = None  # None, or whether a full redraw is forced
+        self.__dirty_widgets = {}  # widget -> force
+        self.__before_frame = []  # called at the start of the next frame
+
+        # see profiler.py, the overlay is a panel over everything
+        self.profiler = profiler
+        self.__overlay = None
+        if profiler is not None:
+            self.keymap.bind('F12', self.toggle_profile_overlay)
 
         # refresh
         self.draw(True)
 
         # so we can read stdio
-        self.__reactor.addReader(self)
+        if self.screen.interactive:
+            self.__reactor.addReader(self)
 
     def onResize(self, sig, stack):
-        h, w = get_real_termial_size()
-        curses.resizeterm(h, w)
-        self.process_character(curses.KEY_RESIZE)
+        '''SIGWINCH handler, don't touch curses in here, just hand the
+           event over to the reactor'''
+        self.__reactor.callFromThread(self.resized)
 
-    def add_widget(self, name, widget):
-        # TODO: change to meta programming, since we will have more the list
-        # boxes
-        self._widgets[name] = widget
+    def resized(self):
+        '''the terminal changed size,
 
-        if name not in self.__focus__items:
-            if len(self.__focus__items) == 0:
-                widget.set_focus(True)
-            self.__focus__items.append(name)
+           (re)start the countdown, so a burst of resizes only relayouts
+           once after the size settles'''
 
+        if self.__resize_call is not None and self.__resize_call.active():
+            self.__resize_call.reset(self.__resize_delay)
+        else:
+            self.__resize_call = self.__reactor.callLater(self.__resize_delay,
+                                                          self.__relayout)
+
+    def __relayout(self):
+        self.__resize_call = None
+
+        self.geometry.invalidate()
+        h, w = self.geometry.size()
+        self.screen.resize(h, w)
+
+        self.__place_widgets()
         self.draw(True)
 
+    def set_layout(self, layout):
+        '''lay the widgets out with a tree of boxes, see layout.py'''
+        self.__layout = layout
+        self.update_layout()
+
+    def update_layout(self):
+        '''lay the widgets out again, after changing the layout tree'''
+        self.__place_widgets()
+        self.draw(True)
+
+    def content_rect(self):
+        '''(y, x, h, w) below the menu, where the layout goes'''
+        h, w = self.geometry.size()
+
+        # the widgets' top border sits on the line under the menu
+        return (2, 0, h - 2, w)
+
+    def __place_widgets(self):
+        '''the one layout pass, after a resize or a change to the layout,
+           widgets keep their rectangle until the next one'''
+
+        if self.__layout is None:
+            return
+
+        for widget, (y, x, h, w) in self.__layout.layout(self.content_rect()):
+            widget.place(y, x, h, w)
+
+    def add_widget(self, name, widget, visible=True):
+        '''add (or replace) a widget, it is painted in the next frame, the
+           ones already there aren't repainted for it. A replaced widget is
+           closed
+
+           visible -> False to add it hidden, e.g. on another tab, it isn't
+                      painted (or even given a window) until set_visible'''
+
+        self.add_widgets([(name, widget)], visible)
+
+    def add_widgets(self, widgets, visible=True):
+        '''add_widget for a list of (name, widget), however many there are
+           they are all painted in one frame'''
+
+        replaced = False
+        for name, widget in widgets:
+            # TODO: change to meta programming, since we will have more the
+            # list boxes
+            old = self._widgets.get(name)
+            if old is None:
+                self.__order.append(name)
+            elif old is not widget:
+                self.__order.remove(name)
+                self.__order.append(name)
+                old.set_visible(False)
+                old.close()
+                self.__dispatcher.forget(old)
+                replaced = True
+            self._widgets[name] = widget
+            widget.set_visible(visible)
+            widget.attach(self)
+
+            if name not in self.__focus__items:
+                if len(self.__focus__items) == 0:
+                    widget.set_focus(True)
+                self.__focus__items.append(name)
+
+            self.schedule_draw(widget, True)
+
+        if replaced:
+            # what the old one covered
+            self.draw(True)
+        self.__schedule_frame()
+
+    def set_visible(self, name, visible):
+        '''show or hide a widget, switching tabs say. A hidden widget keeps
+           its data but isn't painted, and loses the focus'''
+
+        widget = self._widgets[name]
+        if widget.visible == visible:
+            return
+
+        widget.set_visible(visible)
+        if self.__focus__items:
+            focus = self.__focus__items[self.__in_focus]
+            if not visible and focus == name:
+                self.__focus_next()
+            elif (visible and name in self.__focus__items and
+                  not self._widgets[focus].visible):
+                # everything that could have it was hidden
+                self.__in_focus = self.__focus__items.index(name) - 1
+                self.__focus_next()
+
+        # what it covered, or what covers it
+        self.draw(True)
+
+    def set_theme(self, theme):
+        '''draw with another theme.Theme from the next frame on, only the
+           widgets (and the app's frame) that look different repaint'''
+
+        changed = self.styles.set_theme(theme)
+        if 'app' in changed:
+            self.draw(True)
+        for widget in self._widgets.values():
+            if widget.style_kind in changed:
+                self.schedule_draw(widget, True)
+        self.__schedule_frame()
+
     def set_editable(self, name, editable):
         '''allow widgets to be selectable (and thus editable) or now'''
 
@@ -139,65 +306,190 @@ class App(CursesStdIO):
             return self._widgets[name]
         return None
 
+    def bind(self, keys, callback, widget=None):
+        '''bind keys (see keymap.py) for the whole app, or only while the
+           widget of that name has focus'''
+
+        if widget is None:
+            self.keymap.bind(keys, callback)
+        else:
+            self._widgets[widget].keymap.bind(keys, callback)
+
     def __draw_menu(self):
+        normal = self.styles.attr('menu', 'app')
+        hot = self.styles.attr('menu_key', 'app')
+
         position = 2
-        self.__key_handler__['menu'] = {}
         for menu, callback in self.__menu__:
             text = menu.split('&')
             hot_key = text[1][0]
-            self._menu.addstr(1, position, text[0], curses.A_NORMAL)
+            self._menu.addstr(1, position, text[0], normal)
             position += len(text[0])
 
             self._menu.addstr(1,
                               position,
                               hot_key,
-                              curses.A_UNDERLINE | curses.A_BOLD)
+                              hot)
             position += 1
-            self._menu.addstr(1, position, text[1][1:], curses.A_NORMAL)
+            self._menu.addstr(1, position, text[1][1:], normal)
             position += len(text[1][1:]) + 2
 
-            self.__key_handler__['menu'][ord(hot_key)] = callback
-
         # draw app title
-        y, x = get_real_termial_size()
+        y, x = self.geometry.size()
         middle = (x - position) / 2
 
         self._menu.addstr(1, middle, '=== ' +\
-            self.title + " ===", curses.A_NORMAL)
+            self.title + " ===", normal)
+
+    def __drawwidgets(self, force, widgets):
+        # in the order they were added
+        for name in self.__order:
+            widget = self._widgets[name]
+            if widget.visible:
+                self.__paint(name, widget,
+                             force or widgets.get(widget, False))
+
+    def __paint(self, name, widget, force):
+        if self.profiler is None:
+            widget.render(force)
+        else:
+            self.profiler.time_render(name, widget, force, self.screen)
+
+    def toggle_profile_overlay(self, key=None):
+        '''show or hide the profiler's numbers'''
 
-    def __drawwidgets(self, force):
-        # TODO meta programming
-        # should be a list of child widgets
-        for name, widget in self._widgets.items():
-            widget.draw(force)
+        if self.profiler is None:
+            return
+
+        if self.__overlay is None:
+            self.__overlay = self.screen.new_panel(
+                self.screen.newwin(3, 3, 0, 0))
+        elif self.__overlay.hidden():
+            self.__overlay.show()
+        else:
+            self.__overlay.hide()
+        self.draw(True)
+
+    def __render_overlay(self):
+        '''the profiler's summary, top right, as of the last frame'''
+
+        lines = self.profiler.summary()
+        th, tw = self.geometry.size()
+        h = min(len(lines) + 2, th)
+        w = min(max(len(line) for line in lines) + 4, tw)
+
+        win = self.screen.newwin(h, w, min(3, th - h), max(tw - w - 1, 0))
+        win.attrset(self.styles.attr('overlay', 'app'))
+        win.box()
+        for y, line in enumerate(lines[:h - 2], 1):
+            win.addstr(y, 2, line[:w - 4])
+        self.__overlay.replace(win)
+        self.__overlay.top()
 
     def draw(self, force=False):
-        '''draw everything, and all widgets'''
+        '''draw everything, and all widgets, on the next frame'''
+
+        self.__dirty_app = force or bool(self.__dirty_app)
+        self.__schedule_frame()
+
+    def schedule_draw(self, widget, force=False):
+        '''repaint a single widget on the next frame'''
+
+        # set_visible repaints it when it is shown again
+        if not widget.visible:
+            return
+
+        self.__dirty_widgets[widget] = force or\
+            self.__dirty_widgets.get(widget, False)
+        self.__schedule_frame()
+
+    def before_frame(self, callback):
+        '''call callback() at the start of the next frame, before anything
+           is painted, e.g. to apply the updates that came in since the
+           last one'''
 
-        (h, w) = get_real_termial_size()
+        self.__before_frame.append(callback)
+        self.__schedule_frame()
+
+    def __schedule_frame(self):
+
+        if self.__frame_call is not None:
+            return
+
+        delay = 0
+        if self.__max_fps:
+            delay = max(0, self.__last_frame + 1.0 / self.__max_fps -
+                        self.__reactor.seconds())
+
+        self.__frame_call = self.__reactor.callLater(delay, self.__frame)
+
+    def __frame(self):
+        '''paint everything that was marked dirty, then flush the terminal
+           with one doupdate'''
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_frame(self.screen)
+
+        # still marked as scheduled, so draws made by the callbacks go into
+        # this frame instead of asking for another one
+        callbacks, self.__before_frame = self.__before_frame, []
+        for callback in callbacks:
+            callback()
+
+        self.__frame_call = None
+        self.__last_frame = self.__reactor.seconds()
+
+        app, widgets = self.__dirty_app, self.__dirty_widgets
+        self.__dirty_app = None
+        self.__dirty_widgets = {}
+
+        if app is not None:
+            self.__render(app, widgets)
+        else:
+            for name in self.__order:
+                widget = self._widgets[name]
+                if widget in widgets and widget.visible:
+                    self.__paint(name, widget, widgets[widget])
+
+        if profiler is None:
+            self.screen.update_panels()
+            self.screen.doupdate()
+        else:
+            if self.__overlay is not None and not self.__overlay.hidden():
+                self.__render_overlay()
+            profiler.time_flush(self.screen)
+            profiler.end_frame(self.screen)
+
+        # asked for while the callbacks ran
+        if self.__before_frame:
+            self.__schedule_frame()
+
+    def __render(self, force, widgets):
+
+        (h, w) = self.geometry.size()
 
         if force or self.__last_size != (h, w):
 
-            log.msg("App Draw called ", (h, w), self.__last_size)
+            logger.debug("App Draw called %s %s", (h, w), self.__last_size)
 
-            attr = curses.color_pair(1)
+            attr = self.styles.attr('box', 'app')
 
             self._menu.clear()
-            self._menu.refresh()
+            self._menu.noutrefresh()
 
-            self._menu = curses.newwin(h, w, 0, 0)
+            self._menu = self.screen.newwin(h, w, 0, 0)
+            self.__menu_panel.replace(self._menu)
             self._menu.attrset(attr)
             self._menu.box()
 
             self._menu.hline(2, 1,
-                             curses.ACS_HLINE,
+                             self.screen.ACS_HLINE,
                              w - 2)
             self.__draw_menu()
 
-            self._menu.refresh()
-
         # draw children last
-        self.__drawwidgets(force)
+        self.__drawwidgets(force, widgets)
 
         self.__last_size = (h, w)
 
@@ -209,67 +501,103 @@ class App(CursesStdIO):
 
     def close(self):
         """ clean up """
-        curses.nocbreak()
-        self.__stdscr.keypad(0)
-        curses.echo()
-        curses.endwin()
+        for call in (self.__frame_call, self.__resize_call):
+            if call is not None and call.active():
+                call.cancel()
+        self.__frame_call = None
+        self.__resize_call = None
+        self.__before_frame = []
+
+        for widget in self._widgets.values():
+            widget.close()
+
+        self.screen.stop()
 
     def quit(self, key=None):
         self.close()
-        self.__reactor.stop()
+        # a server session only ends its own connection
+        if self.screen.owns_reactor:
+            self.__reactor.stop()
 
     def doRead(self):
-        '''Called when a character is waiting'''
+        '''Called when characters are waiting'''
+
+        # the screen is in nodelay mode, so drain everything that is
+        # pending, getch returns -1 once we've caught up
+        keys = []
+        while True:
+            key = self.screen.getch()
+            if key == -1:
+                break
+            keys.append(key)
+
+        if keys:
+            if self.profiler is not None:
+                self.profiler.key_pressed()
 
-        # this clears the screen ?
-        key = self.__stdscr.getch()
+            self.process_characters(keys)
 
-        self.process_character(key)
+            # nothing to paint, so no latency to measure either
+            if self.profiler is not None and self.__frame_call is None:
+                self.profiler.input_handled()
 
     def process_character(self, c):
+        self.process_characters((c,))
+
+    def process_characters(self, keys):
+        '''handle a batch of keys, runs of the same key (a held arrow key)
+           are handed over as one command with a repeat count'''
+
+        for c, run in groupby(keys):
+            self.__process(c, len(list(run)))
 
-        log.msg("KEY PRESS", c)
+    def __focus_next(self, key=None):
+        '''TAB, change focus'''
 
-        #TAB, change focus
-        if c in (ascii.TAB,):
-            log.msg("KEY TAB")
+        if not self.__focus__items:
+            return
+
+        # the next one we show
+        for i in range(len(self.__focus__items)):
             self.__in_focus += 1
             self.__in_focus %= (len(self.__focus__items))
             focus = self.__focus__items[self.__in_focus]
+            if self._widgets[focus].visible:
+                break
 
-            for widget_name, widget in self._widgets.items():
-                widget.set_focus(focus == widget_name)
+        for widget_name, widget in self._widgets.items():
+            widget.set_focus(focus == widget_name)
 
-            self.draw(True)
+        self.draw(True)
 
-        else:
-            focus = None
-            if len(self.__focus__items):
-                focus = self.__focus__items[self.__in_focus]
+    def __process(self, c, count):
 
-            # TODO there a whole lot more special key events, need to check
-            # those too, e.g.  SUSPEND
-            if c in (curses.KEY_RESIZE,):
-                self.draw(True)
+        logger.debug("KEY PRESS %s x%d", c, count)
 
-            # menu handlers
-            elif c in self.__key_handler__['menu']:
-                if self.__key_handler__['menu'][c]:
-                    self.__key_handler__['menu'][c](c)
-
-            # custom handlers
-            elif (focus in self.__key_handler__ and
-                  c in self.__key_handler__[focus]):
-                if self.__key_handler__[focus][c]:
-                    self.__key_handler__[focus][c](c)
-
-            # generic, say arrow keys to select items
-            elif focus in self._widgets:
-                if self._widgets[focus].command(c):
-                    if self.__first_time_through:
-                        self.draw(True)
-                        self.__first_time_through = False
-                    else:
-                        self._widgets[focus].draw(False)
+        widget = None
+        if len(self.__focus__items):
+            widget = self._widgets.get(self.__focus__items[self.__in_focus])
+
+        # the focused widget might be in the middle of something, like
+        # typing a filter, then it gets the keys before any bindings
+        captured = widget is not None and widget.wants_key(c)
+
+        # letters it types with (type-ahead) only skip the app's bindings
+        typing = widget is not None and widget.types_key(c)
+
+        # bindings, the app's over the focused widget's, repeats past the
+        # end of a sequence are the widget's
+        if not captured:
+            count -= self.__dispatcher.dispatch(widget, c, count, own=typing)
+            if not count:
+                return
+
+        # generic, say arrow keys to select items
+        if widget is not None and widget.command(c, count):
+            if self.__first_time_through:
+                self.draw(True)
+                self.__first_time_through = False
+            else:
+                widget.draw(False)
 
 #
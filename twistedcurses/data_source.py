@@ -0,0 +1,209 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Where a ListBox gets its rows from.
+
+    A data source only has to say how many rows it has, and hand out a
+    slice of them, the list box only ever fetches the rows it shows:
+
+        len(source)
+        source.fetch(start, stop) -> list of row strings
+
+    searching also fetches scattered rows, override if that can be done
+    better than a fetch per row:
+
+        source.fetch_rows(row_numbers) -> list of row strings
+
+    and tell its listeners when rows change, each gets called with
+    (index, count):
+
+        listener.rows_inserted(index, count)
+        listener.rows_removed(index, count)
+        listener.rows_updated(index, count)
+
+    a source that reorders rows (see sorted_view.py) also tells them when a
+    row moved, listeners without rows_moved see it removed and inserted:
+
+        listener.rows_moved(index, to)
+
+    Rows can have a style, a curses attribute word (colour pair, bold, ...)
+    the list box draws them with, 0 for none. A ListSource keeps them in an
+    array parallel to the rows, 4 bytes a row, once the first is set:
+
+        source.set_style(index, app.styles.attr('alert'))   # see theme.py
+        source.fetch_styles(start, stop) -> list of attribute words
+        source.fetch_styles_rows(row_numbers)
+
+    a style change is a rows_updated like any other.
+
+    Subclass DataSource for a database cursor, a file, ...
+'''
+
+from array import array
+
+
+class DataSource:
+
+    def __init__(self):
+        self.__listeners = []
+
+    def subscribe(self, listener):
+        if listener not in self.__listeners:
+            self.__listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def _notify(self, change, index, count):
+        '''change -> 'inserted', 'removed' or 'updated' '''
+        if count:
+            for listener in self.__listeners[:]:
+                getattr(listener, 'rows_' + change)(index, count)
+
+    def _notify_moved(self, index, to):
+        '''a single row moved from index to `to` (its place afterwards)'''
+        for listener in self.__listeners[:]:
+            if hasattr(listener, 'rows_moved'):
+                listener.rows_moved(index, to)
+            else:
+                listener.rows_removed(index, 1)
+                listener.rows_inserted(to, 1)
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def fetch(self, start, stop):
+        raise NotImplementedError
+
+    def fetch_rows(self, row_numbers):
+        return [self.fetch(i, i + 1)[0] for i in row_numbers]
+
+    def fetch_styles(self, start, stop):
+        '''no styles unless a subclass keeps them'''
+        return [0] * max(min(stop, len(self)) - start, 0)
+
+    def fetch_styles_rows(self, row_numbers):
+        return [0] * len(row_numbers)
+
+
+class ListSource(DataSource):
+    '''rows held in a python list, what ListBox uses by default'''
+
+    def __init__(self, rows=()):
+        DataSource.__init__(self)
+        self.__rows = list(rows)
+
+        # attribute word per row, parallel to the rows, None until a row
+        # gets a style
+        self.__styles = None
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def fetch(self, start, stop):
+        return self.__rows[start:stop]
+
+    def fetch_rows(self, row_numbers):
+        rows = self.__rows
+        return [rows[i] for i in row_numbers]
+
+    def fetch_styles(self, start, stop):
+        if self.__styles is None:
+            return DataSource.fetch_styles(self, start, stop)
+        return self.__styles[start:stop]
+
+    def fetch_styles_rows(self, row_numbers):
+        styles = self.__styles
+        if styles is None:
+            return [0] * len(row_numbers)
+        return [styles[i] for i in row_numbers]
+
+    def style(self, index):
+        return self.__styles[index] if self.__styles is not None else 0
+
+    def set_style(self, index, attr, count=1):
+        '''give rows [index, index + count) the attribute word attr, 0
+           draws them plain again'''
+
+        count = len(self.__rows[index:index + count])
+        if self.__styles is None:
+            if not attr:
+                return
+            self.__styles = array('I', [0]) * len(self.__rows)
+
+        styles = array('I', [attr]) * count
+        if self.__styles[index:index + count] != styles:
+            self.__styles[index:index + count] = styles
+            self._notify('updated', index, count)
+
+    def extend(self, rows):
+        index = len(self.__rows)
+        self.__rows.extend(rows)
+        if self.__styles is not None:
+            self.__styles.extend([0] * (len(self.__rows) - index))
+        self._notify('inserted', index, len(self.__rows) - index)
+
+    def insert(self, index, rows):
+        rows = list(rows)
+        self.__rows[index:index] = rows
+        if self.__styles is not None:
+            self.__styles[index:index] = array('I', [0]) * len(rows)
+        self._notify('inserted', index, len(rows))
+
+    def remove(self, index, count=1):
+        count = len(self.__rows[index:index + count])
+        del self.__rows[index:index + count]
+        if self.__styles is not None:
+            del self.__styles[index:index + count]
+        self._notify('removed', index, count)
+
+    def update(self, index, rows):
+        '''replace rows from index on, IndexError if they don't all exist
+           yet, add rows with insert or extend'''
+
+        rows = list(rows)
+        if index < 0 or index + len(rows) > len(self.__rows):
+            raise IndexError(index)
+        self.__rows[index:index + len(rows)] = rows
+        self._notify('updated', index, len(rows))
+
+
+class GeneratedSource(DataSource):
+    '''rows made on demand by function(index), nothing is stored'''
+
+    def __init__(self, length, function):
+        DataSource.__init__(self)
+        self.__length = length
+        self.__function = function
+
+    def __len__(self):
+        return self.__length
+
+    def fetch(self, start, stop):
+        stop = min(stop, self.__length)
+        return [self.__function(i) for i in range(start, stop)]
+
+    def set_length(self, length):
+        old, self.__length = self.__length, length
+        if length > old:
+            self._notify('inserted', old, length - old)
+        else:
+            self._notify('removed', length, old - length)
+
+    def changed(self, index, count=1):
+        '''the function now gives something else for these rows'''
+        self._notify('updated', index, count)
@@ -0,0 +1,190 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Feeding a Table from a stream of updates.
+
+    One update per line, either CSV
+
+        row,col,value
+
+    or JSON
+
+        {"row": 3, "col": 1, "value": 12.5}
+        [3, 1, 12.5]
+
+    Updates are collected and applied with a single set_cells at the start
+    of the next frame, later updates to a cell replace earlier ones. If
+    more than max_pending lines arrive before the app gets to paint, we
+    stop reading from the connection until it has, so a burst can't starve
+    the reactor (or the keyboard).
+
+        reactor.listenTCP(9000, TableFeedFactory(table))
+        reactor.connectUNIX('/tmp/prices', TableFeedFactory(table, 'json'))
+
+    A feed can update a TableModel instead (see table_model.py), every
+    table showing it follows, in every session. A model has no frame of
+    its own, the updates are collected until the reactor gets round to us.
+'''
+
+import csv
+import json
+
+from twisted.internet.protocol import ClientFactory
+from twisted.protocols.basic import LineReceiver
+
+from logger import logger
+from table_model import TableModel
+
+
+def _value(text):
+    '''numbers as numbers, anything else as text'''
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_csv(line):
+    '''"row,col,value" -> (row, col, value), the value may be quoted'''
+    row, col, value = next(csv.reader([line]))
+    return int(row), int(col), _value(value)
+
+
+def parse_json(line):
+    '''{"row": r, "col": c, "value": v} or [r, c, v] -> (row, col, value)'''
+    update = json.loads(line)
+    if isinstance(update, dict):
+        return int(update['row']), int(update['col']), update['value']
+    row, col, value = update
+    return int(row), int(col), value
+
+
+PARSERS = {'csv': parse_csv, 'json': parse_json}
+
+
+class TableFeed(LineReceiver):
+    '''updates for a Table, one per line, applied once per frame'''
+
+    delimiter = b'\n'
+
+    def __init__(self, table, parse=parse_csv, max_pending=10000,
+                 reactor=None):
+        '''table -> a Table, or a TableModel
+
+           reactor -> to schedule the updates of a model, the global one by
+                      default'''
+        self.table = table
+        self.reactor = reactor
+        self.parse = parse
+        self.max_pending = max_pending
+
+        # lines we couldn't use
+        self.errors = 0
+
+        self.__pending = {}  # (row, col) -> value
+        self.__received = 0  # lines since the last frame
+        self.__scheduled = False
+
+    def lineReceived(self, line):
+
+        if not isinstance(line, str):
+            line = line.decode('utf-8')
+        line = line.rstrip('\r')
+        if not line.strip():
+            return
+
+        try:
+            row, col, value = self.parse(line)
+            if not (0 <= row < self.table.dim[0] and
+                    0 <= col < self.table.dim[1]):
+                raise ValueError('no cell %d,%d' % (row, col))
+        except (ValueError, TypeError, KeyError, csv.Error) as e:
+            self.errors += 1
+            logger.warning("feed: bad line %r, %s", line, e)
+            return
+
+        self.__pending[(row, col)] = value
+        self.__received += 1
+
+        if not self.__scheduled:
+            self.__scheduled = True
+            app = getattr(self.table, '_app', None)
+            if app is not None:
+                app.before_frame(self.__flush)
+            elif isinstance(self.table, TableModel):
+                self.__reactor().callLater(0, self.__flush)
+            else:
+                self.__flush()
+
+        # the screen is falling behind, let it catch up
+        if self.__received >= self.max_pending and not self.paused:
+            logger.debug("feed: pausing after %d lines", self.__received)
+            self.pauseProducing()
+
+    def __reactor(self):
+        if self.reactor is None:
+            from twisted.internet import reactor
+            self.reactor = reactor
+        return self.reactor
+
+    def __flush(self):
+        '''apply what came in since the last frame'''
+
+        pending, self.__pending = self.__pending, {}
+        self.__received = 0
+        self.__scheduled = False
+
+        cells = [(col, row, value) for (row, col), value in pending.items()]
+        try:
+            self.table.set_cells(cells)
+        except (ValueError, TypeError, OverflowError):
+            # a value the column can't hold, e.g. text in a float column,
+            # the cells before it are in (and shown), apply the rest one
+            # by one
+            for cell in cells:
+                try:
+                    self.table.set_cells([cell])
+                except (ValueError, TypeError, OverflowError) as e:
+                    self.errors += 1
+                    logger.warning("feed: bad value %r, %s", cell, e)
+
+        # tables showing a model repaint themselves
+        if not isinstance(self.table, TableModel):
+            self.table.draw()
+
+        if self.paused and self.transport is not None:
+            self.resumeProducing()
+
+
+class TableFeedFactory(ClientFactory):
+    '''for listenTCP/listenUNIX, or connectTCP/connectUNIX, every
+       connection feeds the same table (or model)
+
+       format -> 'csv' or 'json', or a function(line) -> (row, col, value)'''
+
+    def __init__(self, table, format='csv', max_pending=10000, reactor=None):
+        self.table = table
+        self.parse = PARSERS.get(format, format)
+        self.max_pending = max_pending
+        self.reactor = reactor
+
+    def buildProtocol(self, addr):
+        feed = TableFeed(self.table, self.parse, self.max_pending,
+                         self.reactor)
+        feed.factory = self
+        return feed
@@ -0,0 +1,248 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Key bindings.
+
+    A Keymap is a trie of key codes, a binding can be a single key or a
+    sequence of them, written as a string of space separated keys:
+
+        keymap.bind('q', quit)
+        keymap.bind('g g', top)
+        keymap.bind('C-x C-s', save)     # or 'Ctrl-X Ctrl-S'
+        keymap.bind('M-x', command)      # ESC then x
+        keymap.bind('F5', refresh)
+        keymap.bind(curses.KEY_F5, refresh)
+
+    The app has a global keymap and every widget its own, the global one
+    wins, except for keys the focused widget types with (a list box's
+    type-ahead letters), those only look at its own. For each widget the
+    two are merged into one trie up front (again only when a binding
+    changes), so a key press is one dictionary lookup whatever the number
+    of bindings.
+
+    Callbacks get the (last) key, like the menu callbacks.
+'''
+
+import curses
+from curses import ascii
+
+NAMES = {
+    'TAB': ascii.TAB,
+    'ENTER': 10,
+    'RET': 10,
+    'ESC': ascii.ESC,
+    'SPC': ord(' '),
+    'SPACE': ord(' '),
+    'BACKSPACE': curses.KEY_BACKSPACE,
+    'DEL': curses.KEY_DC,
+    'UP': curses.KEY_UP,
+    'DOWN': curses.KEY_DOWN,
+    'LEFT': curses.KEY_LEFT,
+    'RIGHT': curses.KEY_RIGHT,
+    'PGUP': curses.KEY_PPAGE,
+    'PGDN': curses.KEY_NPAGE,
+    'HOME': curses.KEY_HOME,
+    'END': curses.KEY_END,
+    'RESIZE': curses.KEY_RESIZE,
+}
+
+for _n in range(1, 13):
+    NAMES['F%d' % _n] = curses.KEY_F0 + _n
+
+
+def parse_key(name):
+    '''one key, e.g. 'a', 'C-x', 'M-x', 'F5', 'PGDN' -> list of key codes
+       (M- is two of them)'''
+
+    for prefix in ('M-', 'Meta-', 'Alt-'):
+        if name.startswith(prefix) and len(name) > len(prefix):
+            return [ascii.ESC] + parse_key(name[len(prefix):])
+
+    for prefix in ('C-', 'Ctrl-', 'ctrl-', '^'):
+        if name.startswith(prefix) and len(name) == len(prefix) + 1:
+            return [ord(name[-1].lower()) & 0x1f]
+
+    if len(name) == 1:
+        return [ord(name)]
+
+    if name.upper() in NAMES:
+        return [NAMES[name.upper()]]
+
+    raise ValueError('unknown key %r' % name)
+
+
+def parse_keys(keys):
+    '''a binding -> tuple of key codes
+
+       keys -> a key code, a string of space separated keys, or a sequence
+               of either'''
+
+    if isinstance(keys, int):
+        return (keys,)
+
+    if isinstance(keys, str):
+        # a lone space is the space bar, not a separator
+        if keys == ' ':
+            return (ord(' '),)
+        keys = keys.split()
+
+    codes = []
+    for key in keys:
+        if isinstance(key, int):
+            codes.append(key)
+        else:
+            codes.extend(parse_key(key))
+    if not codes:
+        raise ValueError('no keys')
+    return tuple(codes)
+
+
+class _Bound:
+    '''a leaf of the trie, callback may be None to swallow the keys'''
+
+    def __init__(self, callback):
+        self.callback = callback
+
+
+class Keymap:
+
+    def __init__(self):
+        self.__root = {}
+
+        # bumped on every change, so merged tries know to rebuild
+        self.version = 0
+
+    def bind(self, keys, callback):
+        '''keys -> see parse_keys, a longer sequence starting with the
+                   same keys replaces the shorter binding and vice versa'''
+
+        codes = parse_keys(keys)
+        node = self.__root
+        for code in codes[:-1]:
+            child = node.get(code)
+            if not isinstance(child, dict):
+                child = node[code] = {}
+            node = child
+        node[codes[-1]] = _Bound(callback)
+        self.version += 1
+
+    def unbind(self, keys):
+        codes = parse_keys(keys)
+
+        path = [self.__root]
+        for code in codes[:-1]:
+            child = path[-1].get(code)
+            if not isinstance(child, dict):
+                return
+            path.append(child)
+
+        path[-1].pop(codes[-1], None)
+
+        # drop the prefixes nothing is bound under any more
+        for node, code in reversed(list(zip(path[:-1], codes[:-1]))):
+            if node[code]:
+                break
+            del node[code]
+        self.version += 1
+
+    def trie(self):
+        return self.__root
+
+
+def merge(under, over):
+    '''a trie with the bindings of both, over wins'''
+
+    merged = dict(under)
+    for code, node in over.items():
+        if isinstance(node, dict) and isinstance(merged.get(code), dict):
+            merged[code] = merge(merged[code], node)
+        else:
+            merged[code] = node
+    return merged
+
+
+class Dispatcher:
+    '''walks the merged trie of the global keymap and a widget's keymap as
+       keys come in'''
+
+    def __init__(self, keymap):
+        # the global keymap
+        self.keymap = keymap
+
+        self.__tries = {}  # widget -> (versions, merged trie)
+        self.__node = None  # part way into a sequence
+        self.__widget = None
+
+    def __trie(self, widget, own=False):
+        widget_map = getattr(widget, 'keymap', None)
+        if own:
+            return widget_map.trie() if widget_map is not None else {}
+        versions = (self.keymap.version,
+                    widget_map.version if widget_map is not None else None)
+
+        cached = self.__tries.get(widget)
+        if cached is None or cached[0] != versions:
+            trie = self.keymap.trie()
+            if widget_map is not None:
+                trie = merge(widget_map.trie(), trie)
+            cached = self.__tries[widget] = (versions, trie)
+        return cached[1]
+
+    def pending(self):
+        '''True part way into a key sequence'''
+        return self.__node is not None
+
+    def reset(self):
+        self.__node = None
+
+    def forget(self, widget):
+        '''drop what we keep for a widget that is gone'''
+        self.__tries.pop(widget, None)
+        if widget is self.__widget:
+            self.__widget = self.__node = None
+
+    def dispatch(self, widget, key, count=1, own=False):
+        '''run what key is bound to, count times. Returns how many of the
+           repeats were bound (or continued a sequence), the rest are for
+           the widget
+
+           own -> only look at the widget's own bindings (and a sequence
+                  already started), for keys the widget types with'''
+
+        if widget is not self.__widget:
+            self.__widget = widget
+            self.__node = None
+
+        for i in range(count):
+            node = self.__node
+            bound = node.get(key) if node is not None else None
+
+            # a key that doesn't continue the sequence starts over
+            if bound is None:
+                self.__node = None
+                bound = self.__trie(widget, own).get(key)
+
+            if bound is None:
+                return i
+
+            if isinstance(bound, dict):
+                self.__node = bound
+            else:
+                self.__node = None
+                if bound.callback is not None:
+                    bound.callback(key)
+
+        return count
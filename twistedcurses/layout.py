@@ -0,0 +1,174 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Laying widgets out in boxes.
+
+    A layout is a tree of boxes, HBox puts its children side by side, VBox
+    on top of each other. A child is a widget, another box, a Spring (empty
+    space) or an Item, which gives a widget (or box) a fixed size, a
+    minimum, a maximum or a weight along the box:
+
+        app.set_layout(HBox([Item(list_box, size=20),
+                             VBox([table, Spring(max=5)]),
+                             Split(left, right, ratio=0.3)]))
+
+    What is left after the fixed sizes is shared out by weight, within
+    every child's min and max. The app lays the tree out when the layout is
+    set and after a resize, and places every widget in its rectangle, a
+    draw never computes any geometry.
+
+    Rectangles are (y, x, h, w), in screen coordinates.
+'''
+
+
+class Item:
+    '''a widget, or box, with constraints along the box it is in
+
+       size   -> fixed size, or None to share in what is left
+       min    -> never smaller than this
+       max    -> never bigger than this, None for no limit
+       weight -> share of what is left, relative to the other children'''
+
+    def __init__(self, child, size=None, min=0, max=None, weight=1):
+        self.child = child
+        self.size = size
+        self.min = min
+        self.max = max
+        self.weight = weight
+
+    def arrange(self, rect, placed):
+        if self.child is not None:
+            _arrange(self.child, rect, placed)
+
+
+class Spring(Item):
+    '''empty space that takes up what is left (by weight)'''
+
+    def __init__(self, size=None, min=0, max=None, weight=1):
+        Item.__init__(self, None, size, min, max, weight)
+
+
+def _item(child):
+    return child if isinstance(child, Item) else Item(child)
+
+
+def _arrange(child, rect, placed):
+    '''boxes lay out their children, widgets are placed'''
+    if isinstance(child, Box):
+        child.arrange(rect, placed)
+    else:
+        placed.append((child, rect))
+
+
+def _share(items, length):
+    '''sizes of the items along a box length long'''
+
+    sizes = [None] * len(items)
+
+    def clamp(item, size):
+        size = max(size, item.min)
+        if item.max is not None:
+            size = min(size, item.max)
+        return size
+
+    for i, item in enumerate(items):
+        if item.size is not None:
+            sizes[i] = clamp(item, item.size)
+
+    # share what is left by weight, an item pushed against its min or max
+    # keeps that size and the rest is shared out again
+    while True:
+        flexible = [i for i, size in enumerate(sizes) if size is None]
+        if not flexible:
+            break
+
+        left = length - sum(size for size in sizes if size is not None)
+        weights = sum(items[i].weight for i in flexible) or len(flexible)
+
+        clamped = False
+        for i in flexible:
+            share = max(left, 0) * (items[i].weight or 1) // weights
+            if clamp(items[i], share) != share:
+                sizes[i] = clamp(items[i], share)
+                clamped = True
+
+        if not clamped:
+            # the rounding left overs go to the first ones
+            shares = [max(left, 0) * (items[i].weight or 1) // weights
+                      for i in flexible]
+            for n in range(max(left, 0) - sum(shares)):
+                shares[n % len(shares)] += 1
+            for i, share in zip(flexible, shares):
+                sizes[i] = clamp(items[i], share)
+            break
+
+    return sizes
+
+
+class Box:
+    '''children in a row (HBox) or column (VBox)'''
+
+    vertical = False
+
+    def __init__(self, children, spacing=0):
+        self.children = [_item(child) for child in children]
+        self.spacing = spacing
+
+    def arrange(self, rect, placed):
+        y, x, h, w = rect
+        length = h if self.vertical else w
+        gaps = self.spacing * max(len(self.children) - 1, 0)
+        sizes = _share(self.children, length - gaps)
+
+        position = 0
+        for item, size in zip(self.children, sizes):
+
+            # whatever doesn't fit is cut off
+            size = max(min(size, length - position), 0)
+            if self.vertical:
+                item.arrange((y + position, x, size, w), placed)
+            else:
+                item.arrange((y, x + position, h, size), placed)
+            position += size + self.spacing
+
+    def layout(self, rect):
+        '''[(widget, rect)] for every widget in the tree'''
+        placed = []
+        self.arrange(rect, placed)
+        return placed
+
+
+class HBox(Box):
+    vertical = False
+
+
+class VBox(Box):
+    vertical = True
+
+
+class Split(Box):
+    '''two children sharing the space, first gets ratio of it'''
+
+    def __init__(self, first, second, ratio=0.5, vertical=False):
+        Box.__init__(self, [first, second])
+        self.vertical = vertical
+        self.set_ratio(ratio)
+
+    def set_ratio(self, ratio):
+        '''takes effect on the next layout, App.update_layout()'''
+        self.ratio = ratio
+        self.children[0].weight = int(ratio * 1000)
+        self.children[1].weight = 1000 - int(ratio * 1000)
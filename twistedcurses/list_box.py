@@ -14,16 +14,55 @@
 
 '''
 
-from twisted.python import log
-
+import time
 import curses
-from curses import panel
+from curses import ascii
+
+from data_source import ListSource
+from logger import logger, DEBUG
+from pages import PageLoader
+from search import SearchIndex, FilteredSource
+from sorted_view import SortedSource, moved
+from theme import SELECTED, ACTIVE, FOCUSED
+from widget import Widget, styled
+
+# seconds between key presses before type-ahead starts a new word
+TYPE_AHEAD_TIMEOUT = 1.0
+
+BACKSPACE = (curses.KEY_BACKSPACE, ascii.DEL, ascii.BS)
+
+
+def _printable(key):
+    return 32 <= key < 127
+
+
+def _moved(position, index, count):
+    '''where row `position` ends up after `count` rows were inserted at
+       index, or -count rows removed from there'''
+
+    if position is None or position < index:
+        return position
+    if count < 0 and position < index - count:
+        return index
+    return position + count
 
-from util import get_real_termial_size
 
-class ListBox():
+class ListBox(Widget):
 
-    def __init__(self, position, size, callback):
+    style_kind = 'list_box'
+
+    def __init__(self, position, size, callback, screen=None, source=None,
+                 searchable=False, threaded=False):
+        '''source -> where the rows come from, see data_source.py, by
+                     default a ListSource that add_rows appends to
+
+           searchable -> build the search index up front, otherwise it is
+                         built the first time type-ahead or '/' is used
+
+           threaded -> fetch the rows we show on a thread pool, for slow
+                       sources, see pages.py'''
+
+        Widget.__init__(self, screen)
 
         self.__editable = True
 
@@ -33,132 +72,526 @@ class ListBox():
 
         self.__has_focus = False
 
-        self.__last_size = None
-        h, w = self.__size__()
+        # damage since the last draw, the box (chrome), ranges of rows
+        # whose text changed, and the selection
+        self.__dirty_chrome = True
+        self.__dirty_rows = []
+        self.__dirty_selection = False
 
-        win = curses.newwin(h,
-                            w,
-                            self.y,
-                            self.x)
+        # what the last draw put on screen
+        self.__drawn_selected = None
+        self.__drawn_active = None
+        self.__drawn_offset = None
 
-        win.bkgd(' ', curses.color_pair(4))
-        self.__panel__ = panel.new_panel(win)
-
-        self.__rows__ = []
-        self.__changed = True
+        self.__last_size = None
+        # our window is made when we are first painted, see Widget._panel
+        self.__size__()
 
         # which row is selected
         self.selected = 0
         self.active = 0
 
+        # type-ahead and filtering, see search.py
+        self.__searchable = searchable
+        self.__index = None
+        self.__filter = None  # FilteredSource while a filter is shown
+        self.__query = None  # the filter being typed after a '/'
+        self.__typed = ''
+        self.__typed_at = 0
+
+        # sorting, (key, reverse) or None, see sorted_view.py
+        self.__sort = None
+        self.__sorted = None  # SortedSource while sorted
+
+        # the source we were given, its rows in the order we show them
+        # (maybe sorted), and the source we show (maybe filtered too)
+        self.__base = None
+        self.__ordered = None
+        self.__source = None
+        self.__threaded = threaded
+        self.__pages = None  # PageLoader of the source we show, if threaded
+        self.set_source(source if source is not None else ListSource())
+
         self.callback = callback
 
     def __size__(self):
+
+        if not self._layout_stale():
+            return self.__layout
+
         # look for springs (-1 means fix to screen dim)
 
         # use -1 , fill width,
         # -2, half of the width ??
-        y, x = get_real_termial_size()
+        y, x = self._terminal_size()
         w = x - self.x if self.w < 0 else self.w
         h = y - self.y if self.h < 0 else self.h
 
-        if (w, h) != self.__last_size:
-            self.__changed = True
-            self.__last_size = (w, h)
+        if (w, h, self.x, self.y) != self.__last_size:
+            self.__dirty_chrome = True
+            self.__last_size = (w, h, self.x, self.y)
 
         self.__max_number_of_displayed_rows__ = h - 2
+        self.__layout = (h, w)
         return h, w
 
     def set_editable(self, editable):
         if self.__editable != editable:
             self.__editable = editable
+            self.__dirty_chrome = True
             if not editable and self.__has_focus:
-                self.__changed = True
                 self.__has_focus = False
 
     def set_focus(self, state):
 
         if state != self.__has_focus:
-            self.__changed = True
+            self.__dirty_chrome = True
             self.__has_focus = state
 
+    def source(self):
+        return self.__base
+
+    def close(self):
+        for view in (self.__filter, self.__index, self.__sorted, self.__pages):
+            if view is not None:
+                view.close()
+        self.__source.unsubscribe(self)
+
+    def __page_ready(self, start, stop):
+        '''rows fetched on the thread pool came in'''
+        self.__damage(start, stop)
+        self.__redraw()
+
+    def __invalidate_pages(self):
+        if self.__pages is not None:
+            self.__pages.invalidate()
+
+    def __fetch(self, start, stop):
+        if self.__pages is not None:
+            return self.__pages.rows(start, stop)
+        return self.__source.fetch(start, stop)
+
+    def set_source(self, source):
+        '''show the rows of another data source'''
+
+        self.__query = None
+        self.__base = source
+        self.__order()
+
+    def __order(self):
+        '''(re)build the sorted view, and what depends on it'''
+
+        if self.__filter is not None:
+            self.__filter.close()
+            self.__filter = None
+
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
+
+        if self.__sorted is not None:
+            self.__sorted.close()
+            self.__sorted = None
+
+        if self.__sort is not None:
+            key, reverse = self.__sort
+            self.__sorted = SortedSource(self.__base, key, reverse)
+        self.__ordered = self.__sorted or self.__base
+
+        if self.__searchable:
+            self.__search_index()
+
+        self.__show(self.__ordered)
+
+    def set_sort(self, key, reverse=False):
+        '''show the rows in order of key(row), e.g. lambda row: row.lower(),
+           and keep them in order as they change. None shows them in the
+           order of the source again. The same rows stay selected.'''
+
+        selected = self.__base_row(self.selected)
+        active = self.__base_row(self.active)
+        query = self.__filter.query() if self.__filter is not None else None
+
+        self.__sort = (key, reverse) if key is not None else None
+        self.__order()
+        if query:
+            self.set_filter(query)
+
+        self.selected = self.__shown_row(selected)
+        self.active = self.__shown_row(active)
+        self.__dirty_selection = True
+        self.__redraw()
+
+    def __show(self, source):
+
+        if self.__source is not None:
+            self.__source.unsubscribe(self)
+        if self.__pages is not None:
+            self.__pages.close()
+            self.__pages = None
+
+        self.__source = source
+        source.subscribe(self)
+        if self.__threaded:
+            self.__pages = PageLoader(source, self.__page_ready)
+
+        self.selected = 0
+        self.active = 0
+        self.__dirty_chrome = True
+        self.__redraw()
+
+    def row(self, index):
+        return self.__source.fetch(index, index + 1)[0]
+
     def add_rows(self, rows):
-        self.__rows__ += rows
-        self.__changed = True
+        self.__base.extend(rows)
 
     def remove_row(self, index):
-        '''TODO'''
-        self.__changed = True
+        '''index is a row of the source, not of the filtered or sorted
+           view'''
+        self.__base.remove(index)
+
+    def set_row_style(self, index, attr, count=1):
+        '''colour rows of the source, e.g. an alert, see data_source.py.
+           Every list box showing the source follows'''
+        self.__base.set_style(index, attr, count)
+
+    def __search_index(self):
+        if self.__index is None:
+            self.__index = SearchIndex(self.__ordered)
+        return self.__index
+
+    def __source_row(self, index):
+        '''row of the (unfiltered) ordered rows shown at index'''
+        if self.__filter is None:
+            return index
+        if not len(self.__filter):
+            return 0
+        return self.__filter.source_row(index)
+
+    def __base_row(self, index):
+        '''row of the source we were given shown at index'''
+        row = self.__source_row(index)
+        if self.__sorted is None or not len(self.__sorted):
+            return row
+        return self.__sorted.source_row(row)
+
+    def __shown_row(self, base_row):
+        '''where a row of the source we were given is shown'''
+        if not len(self.__base):
+            return 0
+        row = base_row
+        if self.__sorted is not None:
+            row = self.__sorted.row_of(base_row)
+        if self.__filter is not None:
+            row = self.__filter.row_of(row)
+        return row
+
+    def set_filter(self, query):
+        '''only show the rows that contain query (ignoring case), None or
+           '' shows all of them again'''
+
+        selected = self.__source_row(self.selected)
+        active = self.__source_row(self.active)
+
+        if query and self.__filter is not None:
+            self.__filter.set_query(query)
+            self.__dirty_chrome = True
+
+        elif query:
+            self.__filter = FilteredSource(self.__ordered,
+                                           self.__search_index(),
+                                           query)
+            self.__show(self.__filter)
+
+        elif self.__filter is not None:
+            self.__filter.close()
+            self.__filter = None
+
+        if query:
+            self.selected = self.__filter.row_of(selected)
+            self.active = self.__filter.row_of(active)
+            self.__redraw()
+        else:
+            self.__show(self.__ordered)
+            self.selected = selected
+            self.active = active
+
+    def __type_ahead(self, text):
+        '''select the next row starting with what was typed'''
+
+        now = time.time()
+        if now - self.__typed_at > TYPE_AHEAD_TIMEOUT:
+            self.__typed = ''
+        self.__typed_at = now
+
+        # a new word looks from the next row on, more letters refine the
+        # current match
+        start = self.selected + (0 if self.__typed else 1)
+        self.__typed += text
+
+        row = self.__search_index().first(self.__typed, start, prefix=True)
+        if row is not None and row != self.selected:
+            self.selected = row
+            self.__dirty_selection = True
+
+    def wants_key(self, key):
+        '''while a filter is typed we need the letters before any menu
+           hot keys'''
+        return self.__query is not None and\
+            (_printable(key) or key in BACKSPACE or key == ascii.ESC)
+
+    def types_key(self, key):
+        '''letters are type-ahead ('/' starts a filter), they go before
+           the menu's hot keys, which still work with M-'''
+        return _printable(key) and self.__filter is None
+
+    # data source listener
+
+    def rows_inserted(self, index, count):
+        self.__invalidate_pages()
+
+        # keep the same rows selected, unless there were none before
+        if len(self.__source) > count:
+            self.selected = _moved(self.selected, index, count)
+            self.active = _moved(self.active, index, count)
+
+        self.__rows_moved(index, count)
+
+    def rows_removed(self, index, count):
+        self.__invalidate_pages()
+
+        last = max(len(self.__source) - 1, 0)
+        selected = _moved(self.selected, index, -count)
+        active = _moved(self.active, index, -count)
+
+        # the last row went, the one before takes over, which isn't below
+        # index so nothing repaints it otherwise
+        if selected > last or active > last:
+            self.__dirty_selection = True
+        self.selected = min(selected, last)
+        self.active = min(active, last)
+
+        self.__rows_moved(index, -count)
+
+    def rows_updated(self, index, count):
+        self.__invalidate_pages()
+        self.__damage(index, index + count)
+        self.__redraw()
+
+    def rows_moved(self, index, to):
+        '''a row was sorted into another place, the rows in between shift
+           by one, the selection stays on the same rows'''
+
+        self.__invalidate_pages()
+
+        self.selected = moved(self.selected, index, to)
+        self.active = moved(self.active, index, to)
+
+        # the drawn selection rows (or what is there now) are in the span
+        self.__damage(min(index, to), max(index, to) + 1)
+        self.__redraw()
+
+    def __rows_moved(self, index, count):
+        '''rows from index on moved by count, when that happened above
+           what we show the same rows are still on screen, just with other
+           numbers, otherwise repaint from index down'''
+
+        self.__dirty_rows = [(_moved(start, index, count),
+                              _moved(stop, index, count))
+                             for start, stop in self.__dirty_rows]
+        self.__drawn_selected = _moved(self.__drawn_selected, index, count)
+        self.__drawn_active = _moved(self.__drawn_active, index, count)
+
+        if (self.__drawn_offset is not None and
+            index - min(count, 0) <= self.__drawn_offset):
+            self.__drawn_offset += count
+        else:
+            self.__damage(index, None)
+
+        self.__redraw()
+
+    def __damage(self, start, stop):
+        '''remember rows [start, stop) changed, as far as they are on
+           screen, stop None means to the end'''
+
+        # nothing on screen (yet), the next draw paints everything anyway
+        offset = self.__drawn_offset
+        if offset is None or not self.visible:
+            return
+
+        end = offset + self.__max_number_of_displayed_rows__
+        if start >= end or (stop is not None and stop <= offset):
+            return
+
+        self.__dirty_rows.append((start, stop))
+
+    def __redraw(self):
+        # only once attached, otherwise nobody would flush it
+        if self._app is not None and self.__changed():
+            self.draw()
+
+    def __damaged_rows(self, offset):
+        '''the rows on screen whose text changed'''
+
+        visible = range(offset, offset + self.__max_number_of_displayed_rows__)
+
+        rows = set()
+        for start, stop in self.__dirty_rows:
+            rows.update(visible[max(start - offset, 0):
+                                None if stop is None else
+                                max(stop - offset, 0)])
+        return rows
+
+    def __changed(self):
+        offset = self.__offset()
+        return (self.__dirty_chrome or
+                self.__dirty_selection or
+                offset != self.__drawn_offset or
+                bool(self.__damaged_rows(offset)))
+
+    def __offset(self):
+        '''first row of the display window, moved along so that the
+           selected row is always visible'''
 
-    def command(self, key):
-        '''process commands'''
+        visible = self.__max_number_of_displayed_rows__
+        if len(self.__source) <= visible:
+            return 0
+
+        return min(len(self.__source) - visible,
+                   max(self.selected - visible + 2, 0))
+
+    def command(self, key, count=1):
+        '''process commands, count is how many times the key was repeated'''
 
         if key == curses.KEY_UP and self.selected:
-            self.selected -= 1
-            self.__changed = True
+            self.selected = max(self.selected - count, 0)
+            self.__dirty_selection = True
 
-        elif key == curses.KEY_DOWN and self.selected + 1 < len(self.__rows__):
-            self.selected += 1
-            self.__changed = True
+        elif key == curses.KEY_DOWN and self.selected + 1 < len(self.__source):
+            self.selected = min(self.selected + count, len(self.__source) - 1)
+            self.__dirty_selection = True
 
         elif key in (curses.KEY_ENTER, 10):  # ENTER doesn't work, but 10 does
             if self.active != self.selected:
                 self.active = self.selected
-                self.__changed = True
+                self.__dirty_selection = True
+
+            if (self.__changed() and self.callback is not None and
+                len(self.__source)):
+                self.callback({'active': self.row(self.active)})
+
+        # filtering, '/' starts it, ESC stops it
+        elif self.__query is not None and key == ascii.ESC:
+            self.__query = None
+            self.set_filter(None)
+
+        elif self.__query is not None and key in BACKSPACE:
+            self.__query = self.__query[:-count]
+            self.set_filter(self.__query)
+
+        elif self.__query is not None and _printable(key):
+            self.__query += chr(key) * count
+            self.set_filter(self.__query)
+
+        elif key == ord('/'):
+            self.__query = ''
+            self.__dirty_chrome = True
+
+        elif _printable(key) and self.__filter is None:
+            self.__type_ahead(chr(key) * count)
+
+        return self.__changed()
 
-            if self.__changed and self.callback is not None:
-                self.callback({'active': self.__rows__[self.active]})
+    def __draw_rows(self, win, rows, offset, blank):
+        '''draw the given row numbers, fetching only the ones we show'''
 
-        return self.__changed
+        visible = self.__max_number_of_displayed_rows__
+        rows = [r for r in rows if offset <= r < offset + visible]
+        if not rows:
+            return
 
-    def draw(self, force=False):
+        first = min(rows)
+        fetched = self.__fetch(first, max(rows) + 1)
+        styles = self.__source.fetch_styles(first, first + len(fetched))
+        width = self.__layout[1] - 2
+
+        # attribute words by state, see theme.py
+        cells = self._cell_styles()
+        focus = FOCUSED if self.__has_focus else 0
+        selected, active = self.selected, self.active
+        if not self.__editable:
+            selected = active = None
+
+        for line_no in rows:
+
+            if blank:
+                win.hline(line_no + 1 - offset, 1, ' ', width)
+
+            i = line_no - first
+            if i >= len(fetched):
+                continue
+
+            attr = cells[focus |
+                         (SELECTED if line_no == selected else 0) |
+                         (ACTIVE if line_no == active else 0)]
+            if styles[i]:
+                attr = styled(attr, styles[i])
+
+            win.addstr(line_no + 1 - offset, 2, fetched[i], attr)
+
+    def render(self, force=False):
+        '''repaint what changed since the last draw, only a resize, a focus
+           change, scrolling or force redraws the box'''
 
         new_size = self.__size__()
 
-        log.msg("ListBox Draw called, new_size", new_size)
+        logger.debug("ListBox Draw called, new_size %s", new_size)
+
+        if not (force or self.__changed()):
+            return
 
-        win = self.__panel__.window()
+        win = self._panel(*new_size).window()
 
-        if self.__changed or force:
+        # sometimes there are more items than will fit in the in the
+        # visiable list, so only walk the rows that are actually shown
+        offset = self.__offset()
+        visible = range(offset, offset + self.__max_number_of_displayed_rows__)
 
-            self.__changed = False
+        # scrolling moves every row, so start from a clean window
+        if force or self.__dirty_chrome or offset != self.__drawn_offset:
 
-            attr = curses.color_pair(2) if self.__has_focus\
-                    else curses.color_pair(3)
+            attr = self._style('box+focused' if self.__has_focus else 'box')
 
-            log.msg("old size", win.getmaxyx())
-            win.clear()
-            win.resize(*new_size)
-            win.bkgd(' ', curses.color_pair(4))
+            if logger.enabled(DEBUG):
+                logger.debug("old size %s", win.getmaxyx())
+            win.erase()
+            self._fit(win, *new_size)
+            win.bkgd(' ', self._style('background'))
             win.attrset(attr)
             win.box()
 
-            # sometimes there are more items than will fit in the in the
-            # visiable list, so move a display window along as needed
-            offset = 0
-            if len(self.__rows__) > self.__max_number_of_displayed_rows__:
-                a = len(self.__rows__) - self.__max_number_of_displayed_rows__
-                b = max(self.selected -
-                        self.__max_number_of_displayed_rows__ + 2, 0)
-                offset = min(a, b)
+            if self.__query is not None:
+                h, w = new_size
+                win.addstr(h - 1, 2, ('/' + self.__query)[:max(w - 4, 0)])
 
-            for line_no, row in enumerate(self.__rows__):
+            self.__draw_rows(win, visible, offset, False)
 
-                if self.__editable:
-                    attr = curses.color_pair(2) if self.active == line_no\
-                        else curses.color_pair(1)
+        else:
+            rows = self.__damaged_rows(offset)
 
-                    if line_no == self.selected:
-                        attr |= curses.A_STANDOUT
+            if self.__dirty_selection:
+                rows.update(r for r in (self.__drawn_selected,
+                                        self.__drawn_active,
+                                        self.selected, self.active)
+                            if r is not None)
 
-                    if line_no == self.active:
-                        attr |= curses.A_UNDERLINE
-                else:
-                    attr = curses.color_pair(1)
+            self.__draw_rows(win, sorted(rows), offset, True)
 
-                # don't draw below the bottom
-                if(line_no >= offset  and
-                   line_no - offset < self.__max_number_of_displayed_rows__):
-                    win.addstr(line_no + 1 - offset, 2, row, attr)
+        self.__dirty_chrome = False
+        self.__dirty_rows = []
+        self.__dirty_selection = False
 
-            win.refresh()
+        self.__drawn_selected = self.selected
+        self.__drawn_active = self.active
+        self.__drawn_offset = offset
@@ -0,0 +1,555 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Watching logs, like tail -f.
+
+    LogTail shows the lines of a data source and, while following, stays
+    at the bottom as lines come in. New lines scroll the window (curses
+    moves what is already there) and only they are drawn, however fast
+    they arrive.
+
+    Where the lines come from:
+
+        RingSource(size)   - the last size lines of a stream, older ones
+                             are dropped, feed it with append/extend or
+                             a TailProtocol
+        FileSource(path)   - a file, mapped with mmap and indexed as it
+                             grows, so a file of many GB opens at once and
+                             any line of it is a bisect and a few finds away
+
+        tail = LogTail((0, 0), (-1, -1), FileSource('/var/log/syslog'))
+        reactor.listenTCP(5140, TailFactory(ring))
+
+    Up, down, PgUp, PgDn and Home scroll back (and stop following), End
+    follows again.
+'''
+
+import curses
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from twisted.internet.protocol import Factory
+from twisted.internet.task import LoopingCall
+from twisted.protocols.basic import LineReceiver
+
+from data_source import DataSource
+from logger import logger
+from widget import Widget
+
+PAGE_UP = (curses.KEY_PPAGE,)
+PAGE_DOWN = (curses.KEY_NPAGE,)
+HOME = (curses.KEY_HOME,)
+END = (curses.KEY_END, curses.KEY_LL)
+
+# bytes per block of the line index, lines are counted a block at a time
+INDEX_BLOCK = 1 << 16
+
+# bytes indexed per reactor turn while a file is being opened
+INDEX_STEP = 1 << 24
+
+# longest line we show, the rest is cut off
+MAX_LINE = 4096
+
+
+def _text(line):
+    '''bytes -> a str to show'''
+    if not isinstance(line, str):
+        line = line.decode('utf-8', 'replace')
+    return line.rstrip('\r').expandtabs()
+
+
+class RingSource(DataSource):
+    '''the last size lines, appending to a full ring drops the oldest'''
+
+    def __init__(self, size=10000):
+        DataSource.__init__(self)
+        self.size = size
+        self.__lines = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.__lines)
+
+    def fetch(self, start, stop):
+        lines = self.__lines
+        stop = min(stop, len(lines))
+        return [lines[i] for i in range(max(start, 0), stop)]
+
+    def append(self, line):
+        self.extend([line])
+
+    def extend(self, lines):
+        lines = [_text(line) for line in lines][-self.size:]
+        dropped = max(len(self.__lines) + len(lines) - self.size, 0)
+        self.__lines.extend(lines)
+        self._notify('removed', 0, dropped)
+        self._notify('inserted', len(self.__lines) - len(lines), len(lines))
+
+
+class TailProtocol(LineReceiver):
+    '''appends the lines it receives to a RingSource'''
+
+    delimiter = b'\n'
+    MAX_LENGTH = 1 << 20
+
+    def __init__(self, source):
+        self.source = source
+
+    def lineReceived(self, line):
+        self.source.append(line)
+
+
+class TailFactory(Factory):
+    '''for listenTCP/listenUNIX, every connection appends to the same ring'''
+
+    def __init__(self, source):
+        self.source = source
+
+    def buildProtocol(self, addr):
+        protocol = TailProtocol(self.source)
+        protocol.factory = self
+        return protocol
+
+
+class FileSource(DataSource):
+    '''the lines of a file, through mmap. The index is a count of newlines
+       per INDEX_BLOCK bytes, built INDEX_STEP bytes per reactor turn, so
+       the rows come in (as inserted) while a big file is being opened.
+
+       follow -> seconds between checks for a grown, truncated or rotated
+                 (the path is another file now) file, None to read it
+                 once'''
+
+    def __init__(self, path, follow=1.0, reactor=None):
+        DataSource.__init__(self)
+        if reactor is None:
+            from twisted.internet import reactor
+        self.__reactor = reactor
+        self.path = path
+
+        self.__file = open(path, 'rb')
+        self.__map = None
+        self.__size = 0
+
+        # newlines in blocks [0, b] at b, and how far we got
+        self.__counts = array('l')
+        self.__indexed = 0
+        self.__len = 0
+        self.__indexing = None
+
+        self.__remap()
+        self.__index_more()
+
+        self.__poll = None
+        if follow:
+            self.__poll = LoopingCall(self.__check)
+            self.__poll.clock = reactor
+            self.__poll.start(follow, now=False)
+
+    def close(self):
+        if self.__poll is not None and self.__poll.running:
+            self.__poll.stop()
+        if self.__indexing is not None and self.__indexing.active():
+            self.__indexing.cancel()
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        self.__file.close()
+
+    def __remap(self):
+        size = os.fstat(self.__file.fileno()).st_size
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        # an empty file can't be mapped
+        if size:
+            self.__map = mmap.mmap(self.__file.fileno(), size,
+                                   access=mmap.ACCESS_READ)
+        self.__size = size
+
+    def __forget(self):
+        '''drop the lines we have, to read the file from the top'''
+        old = self.__len
+        self.__counts = array('l')
+        self.__indexed = 0
+        self.__len = 0
+        self._notify('removed', 0, old)
+
+    def __rotated(self):
+        '''the file at path now if it isn't ours (ours was moved away and
+           a new one made, e.g. by logrotate), otherwise None'''
+
+        try:
+            now = os.stat(self.path)
+        except OSError:
+            # moved away and no new one yet, ours may still grow
+            return None
+
+        ours = os.fstat(self.__file.fileno())
+        if (now.st_ino, now.st_dev) == (ours.st_ino, ours.st_dev):
+            return None
+
+        try:
+            return open(self.path, 'rb')
+        except (IOError, OSError):
+            return None
+
+    def __check(self):
+        new = self.__rotated()
+        if new is not None:
+            logger.info("tail: %s was rotated, reading the new one", self.path)
+            old, self.__file = self.__file, new
+            self.__forget()
+            self.__remap()
+            old.close()
+            if self.__indexing is None:
+                self.__index_more()
+            return
+
+        size = os.fstat(self.__file.fileno()).st_size
+        if size == self.__size:
+            return
+
+        if size < self.__size:
+            logger.info("tail: %s was truncated, reading it again", self.path)
+            self.__forget()
+
+        self.__remap()
+        if self.__indexing is None:
+            self.__index_more()
+
+    def __index_more(self):
+        '''count the newlines of the next INDEX_STEP bytes'''
+
+        self.__indexing = None
+        data, counts = self.__map, self.__counts
+
+        # the last block may have been partial, count it again
+        if self.__indexed % INDEX_BLOCK:
+            self.__indexed -= self.__indexed % INDEX_BLOCK
+            counts.pop()
+
+        stop = min(self.__indexed + INDEX_STEP, self.__size)
+        total = counts[-1] if counts else 0
+        for start in range(self.__indexed, stop, INDEX_BLOCK):
+            total += data[start:min(start + INDEX_BLOCK, stop)].count(b'\n')
+            counts.append(total)
+        self.__indexed = stop
+
+        if stop < self.__size:
+            self.__indexing = self.__reactor.callLater(0, self.__index_more)
+        self.__lines_changed()
+
+    def __lines_changed(self):
+        '''tell the listeners, a last line without its newline yet is shown
+           (and updated when the rest of it comes)'''
+
+        old = self.__len
+        newlines = self.__counts[-1] if self.__counts else 0
+        partial = (self.__indexing is None and self.__size and
+                   self.__map[self.__size - 1:self.__size] != b'\n')
+        self.__len = newlines + (1 if partial else 0)
+
+        # the line that was partial has grown
+        if old and old <= self.__len:
+            self._notify('updated', old - 1, 1)
+        self._notify('inserted', old, self.__len - old)
+
+    def __len__(self):
+        return self.__len
+
+    def __line_start(self, line_no):
+        '''the offset line_no starts at, after the line_no-th newline'''
+
+        if line_no == 0:
+            return 0
+        counts = self.__counts
+        block_no = bisect_left(counts, line_no)
+        before = counts[block_no - 1] if block_no else 0
+
+        data = self.__map
+        position = block_no * INDEX_BLOCK
+        for i in range(line_no - before):
+            position = data.find(b'\n', position) + 1
+        return position
+
+    def fetch(self, start, stop):
+        stop = min(stop, self.__len)
+        if start >= stop:
+            return []
+
+        data, size = self.__map, self.__size
+        position = self.__line_start(start)
+        lines = []
+        for line_no in range(start, stop):
+            end = data.find(b'\n', position, size)
+            if end == -1:
+                end = size
+            lines.append(_text(data[position:min(end, position + MAX_LINE)]))
+            position = end + 1
+        return lines
+
+
+class LogTail(Widget):
+    '''a scrollback of lines that follows the end of its source'''
+
+    style_kind = 'log_tail'
+
+    def __init__(self, position, size, source=None, screen=None,
+                 follow=True):
+        '''source -> a data source, a RingSource of 10000 lines by default
+
+           follow -> stay at the bottom as lines come in'''
+
+        Widget.__init__(self, screen)
+
+        self.__editable = True
+        self.__has_focus = False
+
+        self.w, self.h = size
+        self.x, self.y = position
+        self.y += 2
+
+        self.__last_size = None
+        # our window is made when we are first painted, see Widget._panel
+        self.__size__()
+
+        self.follow = follow
+        self.__top = 0  # first line shown
+
+        # damage since the last draw, lines (in source numbers)
+        self.__dirty_chrome = True
+        self.__dirty_lines = set()
+        self.__drawn_top = None
+        self.__drawn_status = None
+
+        self.__source = source if source is not None else RingSource()
+        self.__source.subscribe(self)
+
+    def source(self):
+        return self.__source
+
+    def close(self):
+        self.__source.unsubscribe(self)
+
+    def __size__(self):
+
+        if not self._layout_stale():
+            return self.__layout
+
+        # -1 means fill to the edge of the screen
+        y, x = self._terminal_size()
+        w = x - self.x if self.w < 0 else self.w
+        h = y - self.y if self.h < 0 else self.h
+
+        if (w, h, self.x, self.y) != self.__last_size:
+            self.__dirty_chrome = True
+            self.__last_size = (w, h, self.x, self.y)
+
+        self.__visible = max(h - 2, 1)
+        self.__layout = (h, w)
+        return h, w
+
+    def set_editable(self, editable):
+        if self.__editable != editable:
+            self.__editable = editable
+            self.__dirty_chrome = True
+            if not editable and self.__has_focus:
+                self.__has_focus = False
+
+    def set_focus(self, state):
+        if state != self.__has_focus:
+            self.__dirty_chrome = True
+            self.__has_focus = state
+
+    def set_follow(self, follow):
+        self.follow = follow
+        self.__redraw()
+
+    def __redraw(self):
+        # only once attached, otherwise nobody would flush it
+        if self._app is not None and self.__changed():
+            self.draw()
+
+    def __top_line(self):
+        '''first line to show, the last page while following'''
+
+        last_page = max(len(self.__source) - self.__visible, 0)
+        if self.follow:
+            self.__top = last_page
+        self.__top = max(min(self.__top, last_page), 0)
+        return self.__top
+
+    def __status(self):
+        if self.follow:
+            return ' follow '
+        return ' %d/%d ' % (self.__top + 1, len(self.__source))
+
+    def __changed(self):
+        return (self.__dirty_chrome or
+                self.__top_line() != self.__drawn_top or
+                self.__status() != self.__drawn_status or
+                bool(self.__dirty_lines))
+
+    def scroll_to(self, line_no):
+        '''show line_no at the top, stops following'''
+        self.follow = False
+        self.__top = line_no
+        self.__redraw()
+
+    def command(self, key, count=1):
+        '''process commands, count is how many times the key was repeated'''
+
+        top = self.__top_line()
+        page = self.__visible
+
+        if key == curses.KEY_UP:
+            self.scroll_to(top - count)
+        elif key == curses.KEY_DOWN:
+            self.scroll_to(top + count)
+        elif key in PAGE_UP:
+            self.scroll_to(top - page * count)
+        elif key in PAGE_DOWN:
+            self.scroll_to(top + page * count)
+        elif key in HOME:
+            self.scroll_to(0)
+        elif key in END:
+            self.follow = True
+
+        return self.__changed()
+
+    # data source listener
+
+    def rows_inserted(self, index, count):
+        if index < self.__top and not self.follow:
+            self.__top += count
+        self.__damage(index, index + count)
+        self.__redraw()
+
+    def rows_removed(self, index, count):
+        '''lines dropped from the front of a ring, the rest of them are
+           still shown where they were, just with other numbers'''
+
+        def shift(line_no):
+            if line_no is None or line_no < index:
+                return line_no
+            return max(line_no - count, index)
+
+        # some of the lines we show are gone, what is left moves up
+        drawn = self.__drawn_top
+        lost = (drawn is not None and drawn < index + count and
+                index < drawn + self.__visible)
+
+        self.__top = shift(self.__top)
+        self.__drawn_top = shift(drawn)
+        self.__dirty_lines = set(shift(line_no) for line_no in
+                                 self.__dirty_lines)
+        if lost:
+            self.__damage(0, len(self.__source))
+        self.__redraw()
+
+    def rows_updated(self, index, count):
+        self.__damage(index, index + count)
+        self.__redraw()
+
+    def __damage(self, start, stop):
+        '''lines [start, stop) changed, as far as they are on screen'''
+
+        if self.__drawn_top is None or self.__dirty_chrome:
+            return
+        top = self.__top_line()
+        start = max(start, top)
+        stop = min(stop, top + self.__visible)
+        self.__dirty_lines.update(range(start, stop))
+
+    def __draw_lines(self, win, lines, top, width):
+
+        if not lines:
+            return
+
+        first = min(lines)
+        fetched = self.__source.fetch(first, max(lines) + 1)
+        attr = self._cell_styles()[0]
+
+        for line_no in lines:
+            y = line_no - top + 1
+            win.hline(y, 1, ' ', width - 2)
+            if line_no - first < len(fetched):
+                win.addstr(y, 1, fetched[line_no - first][:width - 2], attr)
+
+    def render(self, force=False):
+        '''repaint what changed, new lines at the bottom scroll the window
+           up and only they are drawn'''
+
+        new_size = self.__size__()
+
+        if not (force or self.__changed()):
+            return
+
+        h, w = new_size
+        win = self._panel(h, w).window()
+        top = self.__top_line()
+        visible = range(top, top + self.__visible)
+
+        box = self._style('box+focused' if self.__has_focus else 'box')
+
+        if force or self.__dirty_chrome or self.__drawn_top is None:
+            win.erase()
+            self._fit(win, h, w)
+            win.bkgd(' ', self._style('background'))
+            win.attrset(box)
+            win.box()
+            self.__draw_lines(win, list(visible), top, w)
+            self.__drawn_status = None
+
+        else:
+            lines = set(line_no for line_no in self.__dirty_lines
+                        if top <= line_no < top + self.__visible)
+
+            moved = top - self.__drawn_top
+            if moved and abs(moved) < self.__visible:
+                # let the terminal move what it shows already
+                win.setscrreg(1, h - 2)
+                win.scrollok(True)
+                win.scroll(moved)
+                win.scrollok(False)
+                if moved > 0:
+                    lines.update(visible[-moved:])
+                else:
+                    lines.update(visible[:-moved])
+            elif moved:
+                lines.update(visible)
+
+            # the blank lines scrolled in have no box either
+            win.attrset(box)
+            for line_no in lines:
+                y = line_no - top + 1
+                win.addch(y, 0, self._screen.ACS_VLINE)
+                win.addch(y, w - 1, self._screen.ACS_VLINE)
+            self.__draw_lines(win, sorted(lines), top, w)
+
+        status = self.__status()
+        if status != self.__drawn_status:
+            win.attrset(box)
+            win.hline(h - 1, 1, self._screen.ACS_HLINE, w - 2)
+            win.addstr(h - 1, max(w - len(status) - 2, 1), status[:w - 2])
+            self.__drawn_status = status
+
+        self.__dirty_chrome = False
+        self.__dirty_lines = set()
+        self.__drawn_top = top
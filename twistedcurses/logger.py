@@ -0,0 +1,128 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Opt-in logging for the draw and input paths.
+
+    Logging is off until a sink is configured. A disabled call is a single
+    comparison, the message is only formatted (message % args) once we know
+    it will be written, e.g.
+
+        logger.configure(FileSink('log.log'), DEBUG)
+        logger.debug("draw %s", size)
+'''
+
+import time
+from collections import deque
+
+from twisted.python import log
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING',
+               ERROR: 'ERROR'}
+
+
+class FileSink:
+    '''append lines to a file, the file is opened when the sink is made'''
+
+    def __init__(self, path):
+        self.__file = open(path, 'a')
+
+    def write(self, when, level, message):
+        self.__file.write('%s %-7s %s\n' % (
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when)),
+            LEVEL_NAMES.get(level, level),
+            message))
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+
+class RingBufferSink:
+    '''keep the last `size` records in memory, e.g. to show in the app or
+       dump after a crash'''
+
+    def __init__(self, size=1000):
+        self.records = deque(maxlen=size)
+
+    def write(self, when, level, message):
+        self.records.append((when, level, message))
+
+    def close(self):
+        pass
+
+
+class TwistedSink:
+    '''hand records to twisted.python.log, for apps that already use it'''
+
+    def write(self, when, level, message):
+        log.msg(message)
+
+    def close(self):
+        pass
+
+
+class Logger:
+
+    def __init__(self):
+        self.sink = None
+        self.level = OFF
+
+    def configure(self, sink=None, level=INFO):
+        '''sink None turns logging off'''
+
+        if self.sink is not None and self.sink is not sink:
+            self.sink.close()
+
+        self.sink = sink
+        self.level = level if sink is not None else OFF
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        if level >= self.level:
+            self.__write(level, message, args)
+
+    def debug(self, message, *args):
+        if DEBUG >= self.level:
+            self.__write(DEBUG, message, args)
+
+    def info(self, message, *args):
+        if INFO >= self.level:
+            self.__write(INFO, message, args)
+
+    def warning(self, message, *args):
+        if WARNING >= self.level:
+            self.__write(WARNING, message, args)
+
+    def error(self, message, *args):
+        if ERROR >= self.level:
+            self.__write(ERROR, message, args)
+
+    def __write(self, level, message, args):
+        if args:
+            message = message % args
+        self.sink.write(time.time(), level, message)
+
+
+# shared by the app and all widgets
+logger = Logger()
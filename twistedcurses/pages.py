@@ -0,0 +1,192 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Fetching rows off the reactor thread.
+
+    A data source that formats its rows or looks them up somewhere slow
+    would hold up the reactor (and the keyboard) every time a list box
+    draws. A PageLoader fetches the rows a page (PAGE_SIZE rows) at a time
+    on a small pool of threads instead:
+
+        ListBox((0, 0), (40, -1), callback, source=slow, threaded=True)
+
+    A draw takes whatever pages are ready and shows PLACEHOLDER for the
+    rows that aren't, the page is asked for and the rows are repainted
+    when it comes in. The pages after the one shown (or before it, when
+    scrolling up) are fetched ahead of time.
+
+    When the source changes the pages we have are kept but marked stale,
+    they are shown until the fresh ones arrive, so a busy source doesn't
+    flicker. The source's fetch has to be safe to call from another thread
+    while the reactor thread changes it (a ListSource is, a fetch is a
+    list slice).
+'''
+
+from collections import OrderedDict
+
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from logger import logger
+
+# rows fetched at a time
+PAGE_SIZE = 64
+
+# pages fetched ahead, in the direction we are scrolling
+PREFETCH = 2
+
+# pages kept
+CACHE_PAGES = 64
+
+# threads fetching pages, shared by all loaders
+THREADS = 4
+
+# shown for rows that are still on their way
+PLACEHOLDER = '...'
+
+_pool = None
+
+
+def _shared_pool(reactor):
+    global _pool
+    if _pool is None:
+        _pool = ThreadPool(0, THREADS, 'twistedcurses-pages')
+        _pool.start()
+        reactor.addSystemEventTrigger('during', 'shutdown', _pool.stop)
+    return _pool
+
+
+class PageLoader:
+
+    def __init__(self, source, on_ready, reactor=None, pool=None,
+                 page_size=PAGE_SIZE, prefetch=PREFETCH):
+        '''on_ready -> function(start, stop), rows [start, stop) came in,
+                       called on the reactor thread
+
+           pool -> a started ThreadPool, the shared one by default'''
+
+        if reactor is None:
+            from twisted.internet import reactor
+        self.__reactor = reactor
+        self.__pool = pool
+        self.__source = source
+        self.__on_ready = on_ready
+        self.page_size = page_size
+        self.prefetch = prefetch
+
+        # bumped when the source changes, pages of an older generation are
+        # stale
+        self.__generation = 0
+        self.__pages = OrderedDict()  # page number -> (generation, rows)
+        self.__loading = {}  # page number -> generation asked for
+        self.__last_page = None
+        self.__closed = False
+
+    def close(self):
+        '''pages still on their way are dropped'''
+        self.__closed = True
+        self.__pages.clear()
+
+    def invalidate(self):
+        '''the source changed, fetch the pages again as they are shown'''
+        self.__generation += 1
+
+    def rows(self, start, stop):
+        '''rows [start, stop), PLACEHOLDER for the ones not fetched yet'''
+
+        stop = min(stop, len(self.__source))
+        if start >= stop:
+            return []
+
+        size = self.page_size
+        first, last = start // size, (stop - 1) // size
+
+        rows = []
+        for page_no in range(first, last + 1):
+            page = self.__page(page_no)
+            page_start = page_no * size
+            lo = max(start - page_start, 0)
+            hi = min(stop - page_start, size)
+            if page is None:
+                rows.extend([PLACEHOLDER] * (hi - lo))
+            else:
+                got = page[lo:hi]
+                rows.extend(got + [PLACEHOLDER] * (hi - lo - len(got)))
+
+        # and what comes next, going the way we are scrolling
+        if self.__last_page is not None and first < self.__last_page:
+            ahead = range(first - 1, first - 1 - self.prefetch, -1)
+        else:
+            ahead = range(last + 1, last + 1 + self.prefetch)
+        pages = (len(self.__source) + size - 1) // size
+        for page_no in ahead:
+            if 0 <= page_no < pages:
+                self.__page(page_no, ahead=True)
+        self.__last_page = first
+
+        return rows
+
+    def __page(self, page_no, ahead=False):
+        '''the rows of a page if we have them (maybe stale), asks for it
+           unless it is fresh or on its way. Pages fetched ahead wait when
+           the pool is busy, scrolling fast shouldn't queue up pages nobody
+           looks at any more'''
+
+        generation, rows = self.__pages.get(page_no, (None, None))
+        if rows is not None:
+            # most recently used last
+            self.__pages[page_no] = self.__pages.pop(page_no)
+
+        if (generation != self.__generation and
+                self.__loading.get(page_no) != self.__generation and
+                not (ahead and len(self.__loading) >= 2 * THREADS)):
+            self.__load(page_no)
+        return rows
+
+    def __load(self, page_no):
+        generation = self.__loading[page_no] = self.__generation
+        start = page_no * self.page_size
+
+        pool = self.__pool or _shared_pool(self.__reactor)
+        d = deferToThreadPool(self.__reactor, pool, self.__source.fetch,
+                              start, start + self.page_size)
+        d.addCallbacks(self.__loaded, self.__failed,
+                       (page_no, generation), None, (page_no, generation))
+
+    def __done(self, page_no, generation):
+        if self.__loading.get(page_no) == generation:
+            del self.__loading[page_no]
+
+    def __loaded(self, rows, page_no, generation):
+        self.__done(page_no, generation)
+        if self.__closed:
+            return
+
+        # a stale page is still better than placeholders
+        current = self.__pages.get(page_no)
+        if current is not None and current[0] > generation:
+            return
+        self.__pages[page_no] = (generation, list(rows))
+        while len(self.__pages) > CACHE_PAGES:
+            self.__pages.popitem(last=False)
+
+        start = page_no * self.page_size
+        self.__on_ready(start, start + len(rows))
+
+    def __failed(self, failure, page_no, generation):
+        self.__done(page_no, generation)
+        logger.warning("pages: fetching page %d failed, %s", page_no,
+                       failure.getErrorMessage())
@@ -0,0 +1,274 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Where the frame time goes.
+
+    Give the app a Profiler and it times every frame: each widget's render,
+    the flush to the terminal, and how long after a key press the frame
+    that shows it went out (input to paint). Screens that count cells (see
+    screen.py) add the cells written per widget and per frame. Curses
+    doesn't say what it sends to the terminal, cells_flushed is None on
+    the real one.
+
+        profiler = Profiler(budget=1 / 30.0)
+        app = App(reactor, 'My App', menu, profiler=profiler)
+
+    F12 (or app.toggle_profile_overlay) shows the numbers on top of the
+    app. For production, dump them as JSON now and then, or serve them:
+
+        profiler.dump_every(reactor, 10, '/tmp/myapp-frames.json')
+        reactor.listenTCP(9100, StatsFactory(profiler))   # nc host 9100
+
+    Times are in milliseconds, percentiles are over the last SAMPLES
+    frames.
+'''
+
+import json
+import os
+from collections import deque
+from timeit import default_timer
+
+from twisted.internet.protocol import Factory, Protocol
+from twisted.internet.task import LoopingCall
+
+from logger import logger
+
+# frames (and key presses) the percentiles are taken over
+SAMPLES = 1000
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def _ms(seconds):
+    return round(seconds * 1000.0, 3)
+
+
+class _WidgetStats:
+
+    def __init__(self):
+        self.renders = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.cells = 0
+        self.over_budget = 0  # renders that took the whole budget alone
+
+    def as_dict(self):
+        return {'renders': self.renders,
+                'total_ms': _ms(self.total),
+                'mean_ms': _ms(self.total / self.renders) if self.renders
+                else 0.0,
+                'max_ms': _ms(self.max),
+                'last_ms': _ms(self.last),
+                'cells': self.cells,
+                'over_budget': self.over_budget}
+
+
+class Profiler:
+
+    def __init__(self, budget=1 / 60.0, clock=default_timer):
+        '''budget -> seconds a frame may take, frames over it are counted
+
+           clock -> function() -> seconds, for timing'''
+
+        self.budget = budget
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.over_budget = 0
+        self.cells_written = 0
+        self.cells_flushed = 0
+        self.refreshes = 0
+
+        self.__frame_times = deque(maxlen=SAMPLES)
+        self.__flush_times = deque(maxlen=SAMPLES)
+        self.__latencies = deque(maxlen=SAMPLES)
+        self.__widgets = {}  # name -> _WidgetStats
+        self.__last_frame = {}  # name -> seconds, of the last frame
+
+        self.__frame_start = None
+        self.__written_at_start = 0
+        self.__input_at = None  # first key press not painted yet
+
+    # called by the app
+
+    def key_pressed(self):
+        if self.__input_at is None:
+            self.__input_at = self.clock()
+
+    def input_handled(self):
+        '''the keys didn't change anything, no frame is coming for them'''
+        self.__input_at = None
+
+    def begin_frame(self, screen):
+        self.__frame_start = self.clock()
+        self.__written_at_start = getattr(screen, 'cells_written', 0)
+        self.__last_frame = {}
+
+    def time_render(self, name, widget, force, screen):
+        '''widget.render(force), timed'''
+
+        written = getattr(screen, 'cells_written', 0)
+        start = self.clock()
+        widget.render(force)
+        elapsed = self.clock() - start
+
+        stats = self.__widgets.get(name)
+        if stats is None:
+            stats = self.__widgets[name] = _WidgetStats()
+        stats.renders += 1
+        stats.total += elapsed
+        stats.last = elapsed
+        stats.max = max(stats.max, elapsed)
+        stats.cells += getattr(screen, 'cells_written', 0) - written
+        if elapsed > self.budget:
+            stats.over_budget += 1
+        self.__last_frame[name] = elapsed
+
+    def time_flush(self, screen):
+        '''update_panels and doupdate, timed'''
+
+        flushed = getattr(screen, 'cells_flushed', 0)
+        refreshes = getattr(screen, 'refreshes', 0)
+        start = self.clock()
+        screen.update_panels()
+        screen.doupdate()
+        self.__flush_times.append(self.clock() - start)
+        if hasattr(screen, 'cells_flushed'):
+            self.cells_flushed += screen.cells_flushed - flushed
+        else:
+            self.cells_flushed = None
+        self.refreshes += getattr(screen, 'refreshes', 0) - refreshes
+
+    def end_frame(self, screen):
+        if self.__frame_start is None:
+            return
+
+        now = self.clock()
+        elapsed = now - self.__frame_start
+        self.__frame_start = None
+
+        self.frames += 1
+        self.__frame_times.append(elapsed)
+        if elapsed > self.budget:
+            self.over_budget += 1
+            if self.__last_frame:
+                slowest = max(self.__last_frame,
+                              key=self.__last_frame.get)
+                logger.debug("frame over budget, %.1f ms, slowest %s %.1f ms",
+                             elapsed * 1000, slowest,
+                             self.__last_frame[slowest] * 1000)
+
+        self.cells_written += (getattr(screen, 'cells_written', 0) -
+                               self.__written_at_start)
+
+        if self.__input_at is not None:
+            self.__latencies.append(now - self.__input_at)
+            self.__input_at = None
+
+    # reading the numbers
+
+    def stats(self):
+        '''everything as a dict, what dump and StatsFactory send'''
+
+        frames = self.__frame_times
+        return {
+            'frames': self.frames,
+            'budget_ms': _ms(self.budget),
+            'over_budget': self.over_budget,
+            'frame_ms': {'p50': _ms(_percentile(frames, 0.5)),
+                         'p90': _ms(_percentile(frames, 0.9)),
+                         'p99': _ms(_percentile(frames, 0.99)),
+                         'max': _ms(max(frames) if frames else 0.0)},
+            'flush_ms': {'p50': _ms(_percentile(self.__flush_times, 0.5)),
+                         'p99': _ms(_percentile(self.__flush_times, 0.99))},
+            'input_to_paint_ms': {
+                'p50': _ms(_percentile(self.__latencies, 0.5)),
+                'p99': _ms(_percentile(self.__latencies, 0.99)),
+                'samples': len(self.__latencies)},
+            'cells_written': self.cells_written,
+            'cells_flushed': self.cells_flushed,
+            'refreshes': self.refreshes,
+            'widgets': dict((name, stats.as_dict()) for name, stats in
+                            self.__widgets.items()),
+        }
+
+    def summary(self):
+        '''a few lines of text, for the overlay'''
+
+        stats = self.stats()
+        frame = stats['frame_ms']
+        latency = stats['input_to_paint_ms']
+        lines = ['frames %d, %d over %.1f ms' % (stats['frames'],
+                                                 stats['over_budget'],
+                                                 stats['budget_ms']),
+                 'frame p50 %.2f p99 %.2f max %.2f' % (frame['p50'],
+                                                       frame['p99'],
+                                                       frame['max']),
+                 'flush p50 %.2f  key->paint p50 %.2f' % (
+                     stats['flush_ms']['p50'], latency['p50'])]
+
+        # slowest widgets first
+        lines.append('%-10s %6s %6s ms %5s' % ('widget', 'last', 'max', 'n'))
+        widgets = sorted(stats['widgets'].items(),
+                         key=lambda item: -item[1]['max_ms'])
+        for name, widget in widgets:
+            lines.append('%-10s %6.2f %6.2f ms %5d' % (name[:10],
+                                                       widget['last_ms'],
+                                                       widget['max_ms'],
+                                                       widget['renders']))
+        return lines
+
+    def dump(self, path):
+        '''write stats() to path as JSON, replacing it in one go'''
+
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.stats(), f, indent=2, sort_keys=True)
+        os.rename(tmp, path)
+
+    def dump_every(self, reactor, seconds, path):
+        '''dump to path every so many seconds, returns the LoopingCall'''
+
+        call = LoopingCall(self.dump, path)
+        call.clock = reactor
+        call.start(seconds, now=False)
+        return call
+
+
+class _SendStats(Protocol):
+
+    def connectionMade(self):
+        data = json.dumps(self.factory.profiler.stats(), sort_keys=True)
+        self.transport.write(data.encode('utf-8') + b'\n')
+        self.transport.loseConnection()
+
+
+class StatsFactory(Factory):
+    '''for listenTCP/listenUNIX, sends the stats as one line of JSON to
+       whoever connects'''
+
+    protocol = _SendStats
+
+    def __init__(self, profiler):
+        self.profiler = profiler
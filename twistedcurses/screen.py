@@ -0,0 +1,612 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Screen backends.
+
+    The app and the widgets never talk to the curses module for anything
+    that needs a terminal, they go through a screen:
+
+        CursesScreen   - the real terminal (the default), counts the cells
+                         written and the windows refreshed like the
+                         VirtualScreen does
+        VirtualScreen  - an in memory grid of cells, for running without a
+                         tty, e.g. in CI or benchmarks. It counts the cells
+                         written and the flushes, and can snapshot what
+                         would be on the terminal.
+        TerminalScreen - a VirtualScreen that sends what changed to a remote
+                         terminal as escape sequences, see server.py
+
+    Key codes (curses.KEY_*) and attributes (curses.A_*) are plain constants
+    and are still used straight from curses. Colour pairs are given out by
+    the screen's StyleRegistry (screen.styles), see theme.py.
+'''
+
+import curses
+from collections import deque
+from curses import panel
+
+from theme import StyleRegistry
+from util import get_real_termial_size
+
+
+class CursesScreen:
+    '''the real terminal, a thin layer over curses'''
+
+    # register with the reactor and listen for SIGWINCH
+    interactive = True
+
+    # App.quit stops the reactor
+    owns_reactor = True
+
+    def __init__(self):
+        self.__stdscr = None
+        self.styles = StyleRegistry(self)
+        self.reset_counters()
+
+    def reset_counters(self):
+        '''like VirtualScreen's, but curses doesn't tell what it sends to
+           the terminal, so there are no cells_flushed'''
+        self.cells_written = 0  # cells drawn into windows
+        self.refreshes = 0  # touched windows update_panels copied
+        self.flushes = 0  # doupdate calls
+
+    def __getattr__(self, name):
+        # the ACS_* line drawing characters only exist after initscr
+        if name.startswith('ACS_'):
+            return getattr(curses, name)
+        raise AttributeError(name)
+
+    def start(self):
+        self.__stdscr = curses.initscr()
+        # stdscr starts out touched, update_panels would paint it blank
+        # under the panels and send every cell twice in the first frame
+        self.__stdscr.noutrefresh()
+        self.__stdscr.keypad(True)
+        self.__stdscr.nodelay(True)
+
+        curses.start_color()
+        curses.noecho()
+        curses.cbreak()
+        curses.curs_set(False)
+
+    def stop(self):
+        curses.nocbreak()
+        self.__stdscr.keypad(0)
+        curses.echo()
+        curses.endwin()
+
+    def size(self):
+        '''(rows, cols), asks the tty'''
+        return get_real_termial_size()
+
+    def resize(self, rows, cols):
+        curses.resizeterm(rows, cols)
+
+    def getch(self):
+        return self.__stdscr.getch()
+
+    def newwin(self, h, w, y, x):
+        return _CountedWindow(self, curses.newwin(h, w, y, x))
+
+    def new_panel(self, win):
+        return _CountedPanel(win)
+
+    def update_panels(self):
+        # the panel library copies the touched windows (and what they
+        # cover, which we don't see), hidden panels aren't in the deck
+        if self.__stdscr.is_wintouched():
+            self.refreshes += 1
+        p = panel.top_panel()
+        while p is not None:
+            if p.window().is_wintouched():
+                self.refreshes += 1
+            p = p.below()
+        panel.update_panels()
+
+    def doupdate(self):
+        self.flushes += 1
+        curses.doupdate()
+
+    def init_pair(self, number, fg, bg):
+        curses.init_pair(number, fg, bg)
+
+    def color_pair(self, number):
+        return curses.color_pair(number)
+
+    def max_pairs(self):
+        '''colour pairs the terminal has, known once started'''
+        return getattr(curses, 'COLOR_PAIRS', 64)
+
+    def beep(self):
+        curses.beep()
+
+
+class _CountedWindow:
+    '''a curses window that counts the cells drawn into it on its screen,
+       everything else goes straight to the window'''
+
+    def __init__(self, screen, win):
+        self.__screen = screen
+        self.win = win  # the curses window, for the panel library
+
+    def __getattr__(self, name):
+        return getattr(self.win, name)
+
+    def addstr(self, *args):
+        '''addstr([y, x,] text[, attr])'''
+        self.__screen.cells_written += len(args[2] if len(args) > 2
+                                           else args[0])
+        return self.win.addstr(*args)
+
+    def addch(self, *args):
+        self.__screen.cells_written += 1
+        return self.win.addch(*args)
+
+    def hline(self, *args):
+        '''hline([y, x,] ch, n)'''
+        self.__screen.cells_written += args[-1]
+        return self.win.hline(*args)
+
+    def vline(self, *args):
+        self.__screen.cells_written += args[-1]
+        return self.win.vline(*args)
+
+    def box(self, *args):
+        h, w = self.win.getmaxyx()
+        self.__screen.cells_written += 2 * (h + w) - 4
+        return self.win.box(*args)
+
+
+class _CountedPanel:
+    '''a curses panel of a _CountedWindow'''
+
+    def __init__(self, win):
+        self.__window = win
+        self.panel = panel.new_panel(win.win)
+
+    def __getattr__(self, name):
+        return getattr(self.panel, name)
+
+    def window(self):
+        return self.__window
+
+    def replace(self, win):
+        self.__window = win
+        self.panel.replace(win.win)
+
+
+class VirtualWindow:
+    '''the subset of a curses window the widgets use, drawing into a grid
+       of (character, attribute) cells
+
+       like curses a window remembers if it was touched since its last
+       noutrefresh, and only a touched window is copied into the frame'''
+
+    def __init__(self, screen, h, w, y, x):
+        self.__screen = screen
+        self.__y, self.__x = y, x
+        self.__background = (' ', 0)
+        self.__attr = 0
+        self.__clear = False
+        self.__scroll = False
+        self.__region = None  # (top, bottom) lines that scroll, or all
+        self.__cells = self.__blank(h, w)
+        self.__touched = True  # a new window is all touched
+
+    def __blank(self, h, w):
+        return [[self.__background] * w for row in range(h)]
+
+    def __char(self, ch):
+        return ch if not isinstance(ch, int) else chr(ch & 0xff)
+
+    def __put(self, y, x, ch, attr):
+        h, w = self.getmaxyx()
+        if not (0 <= y < h and 0 <= x < w):
+            raise curses.error('write outside of window')
+        self.__cells[y][x] = (ch, attr)
+        self.__touched = True
+        self.__screen.cells_written += 1
+
+    def getmaxyx(self):
+        return len(self.__cells), len(self.__cells[0]) if self.__cells else 0
+
+    def getbegyx(self):
+        return self.__y, self.__x
+
+    def resize(self, h, w):
+        old = self.__cells
+        self.__cells = self.__blank(h, w)
+        for y, row in enumerate(old[:h]):
+            self.__cells[y][:len(row[:w])] = row[:w]
+        self.__touched = True
+        self.__screen._restacked()
+
+    def mvwin(self, y, x):
+        self.__y, self.__x = y, x
+        self.__touched = True
+        self.__screen._restacked()
+
+    def touchwin(self):
+        self.__touched = True
+
+    def is_wintouched(self):
+        return self.__touched
+
+    def _overlaps(self, area):
+        '''True if we cover any of area, (top, left, bottom, right)'''
+        h, w = self.getmaxyx()
+        top, left, bottom, right = area
+        return (self.__y < bottom and top < self.__y + h and
+                self.__x < right and left < self.__x + w)
+
+    def _area(self):
+        h, w = self.getmaxyx()
+        return (self.__y, self.__x, self.__y + h, self.__x + w)
+
+    def keypad(self, flag):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def scrollok(self, flag):
+        self.__scroll = flag
+
+    def setscrreg(self, top, bottom):
+        self.__region = (top, bottom)
+
+    def bkgd(self, ch, attr=0):
+        self.__background = (self.__char(ch), attr)
+        self.__touched = True
+
+    def attrset(self, attr):
+        self.__attr = attr
+
+    def attron(self, attr):
+        self.__attr |= attr
+
+    def attroff(self, attr):
+        self.__attr &= ~attr
+
+    def erase(self):
+        h, w = self.getmaxyx()
+        self.__cells = self.__blank(h, w)
+        self.__touched = True
+
+    def clear(self):
+        '''erase, and like curses repaint the whole terminal on the next
+           refresh'''
+        self.erase()
+        self.__clear = True
+
+    def addstr(self, *args):
+        '''addstr(y, x, text[, attr])'''
+
+        y, x, text = args[:3]
+        attr = args[3] if len(args) > 3 else self.__attr
+        h, w = self.getmaxyx()
+
+        # like curses, long strings wrap onto the next line
+        for ch in text:
+            if x >= w:
+                y, x = y + 1, 0
+            self.__put(y, x, ch, attr)
+            x += 1
+
+    def addch(self, y, x, ch, attr=None):
+        self.__put(y, x, self.__char(ch),
+                   self.__attr if attr is None else attr)
+
+    def hline(self, y, x, ch, n):
+        h, w = self.getmaxyx()
+        for i in range(x, min(x + n, w)):
+            self.__put(y, i, self.__char(ch), self.__attr)
+
+    def vline(self, y, x, ch, n):
+        h, w = self.getmaxyx()
+        for i in range(y, min(y + n, h)):
+            self.__put(i, x, self.__char(ch), self.__attr)
+
+    def box(self):
+        screen = self.__screen
+        h, w = self.getmaxyx()
+        self.hline(0, 1, screen.ACS_HLINE, w - 2)
+        self.hline(h - 1, 1, screen.ACS_HLINE, w - 2)
+        self.vline(1, 0, screen.ACS_VLINE, h - 2)
+        self.vline(1, w - 1, screen.ACS_VLINE, h - 2)
+        self.addch(0, 0, screen.ACS_ULCORNER)
+        self.addch(0, w - 1, screen.ACS_URCORNER)
+        self.addch(h - 1, 0, screen.ACS_LLCORNER)
+        self.addch(h - 1, w - 1, screen.ACS_LRCORNER)
+
+    def scroll(self, lines=1):
+        '''move the contents (of the scrolling region) up, or down for
+           negative lines'''
+        h, w = self.getmaxyx()
+        top, bottom = self.__region or (0, h - 1)
+        cells = self.__cells[top:bottom + 1]
+        n = len(cells)
+        if lines > 0:
+            cells = cells[lines:] + self.__blank(min(lines, n), w)
+        elif lines < 0:
+            cells = self.__blank(min(-lines, n), w) + cells[:lines]
+        self.__cells[top:bottom + 1] = cells[:n]
+        self.__touched = True
+
+    def noutrefresh(self):
+        if self.__touched:
+            self.__screen._copy(self.__y, self.__x, self.__cells,
+                                self.__clear)
+        self.__clear = False
+        self.__touched = False
+
+    def refresh(self):
+        self.noutrefresh()
+        self.__screen.doupdate()
+
+    def getch(self):
+        return self.__screen.getch()
+
+    def text(self):
+        '''the characters in this window, one string per line'''
+        return [''.join(ch for ch, attr in row) for row in self.__cells]
+
+
+class VirtualPanel:
+
+    def __init__(self, screen, win):
+        self.__screen = screen
+        self.__window = win
+        self.__hidden = False
+
+    def window(self):
+        return self.__window
+
+    def replace(self, win):
+        self.__window = win
+        self.__screen._restacked()
+
+    def top(self):
+        self.__screen._restack(self, top=True)
+
+    def bottom(self):
+        self.__screen._restack(self, top=False)
+
+    def hide(self):
+        if not self.__hidden:
+            self.__hidden = True
+            self.__screen._restacked()
+
+    def show(self):
+        if self.__hidden:
+            self.__hidden = False
+            self.__screen._restacked()
+
+    def hidden(self):
+        return self.__hidden
+
+    def move(self, y, x):
+        self.__window.mvwin(y, x)
+
+
+class VirtualScreen:
+    '''a headless terminal, windows noutrefresh into a pending frame, and
+       doupdate compares it with what is on the "terminal"
+
+       like after initscr there is a stdscr under the panels, blank and
+       touched, that update_panels paints first until someone refreshes
+       it'''
+
+    interactive = False
+    owns_reactor = True
+
+    ACS_HLINE = '-'
+    ACS_VLINE = '|'
+    ACS_ULCORNER = '+'
+    ACS_URCORNER = '+'
+    ACS_LLCORNER = '+'
+    ACS_LRCORNER = '+'
+    ACS_TTEE = '+'
+    ACS_BTEE = '+'
+    ACS_LTEE = '+'
+    ACS_RTEE = '+'
+    ACS_PLUS = '+'
+
+    def __init__(self, rows=24, cols=80):
+        self.rows, self.cols = rows, cols
+        self.__panels = []  # bottom to top
+        self.__restack = True  # panels moved, repaint them all
+        self.stdscr = VirtualWindow(self, rows, cols, 0, 0)
+        self.__keys = deque()
+        self.__pairs = {}
+        self.styles = StyleRegistry(self)
+        self.__frame = self.__blank()
+        self.__terminal = self.__blank()
+        self.__clear = False
+        self.reset_counters()
+
+    def __blank(self):
+        return [[(' ', 0)] * self.cols for row in range(self.rows)]
+
+    def reset_counters(self):
+        self.cells_written = 0  # cells drawn into windows
+        self.cells_flushed = 0  # cells that changed on the terminal
+        self.refreshes = 0  # windows copied into the frame
+        self.flushes = 0  # doupdate calls
+        self.beeps = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def size(self):
+        return self.rows, self.cols
+
+    def resize(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        self.__frame = self.__blank()
+        self.__terminal = self.__blank()
+        self.__clear = True
+        # like resizeterm, stdscr grows with the terminal
+        self.stdscr.resize(rows, cols)
+
+    def feed(self, keys):
+        '''queue keys for getch, either key codes or a string'''
+        for key in keys:
+            self.__keys.append(ord(key) if not isinstance(key, int) else key)
+
+    def getch(self):
+        return self.__keys.popleft() if self.__keys else -1
+
+    def newwin(self, h, w, y, x):
+        return VirtualWindow(self, h, w, y, x)
+
+    def new_panel(self, win):
+        p = VirtualPanel(self, win)
+        self.__panels.append(p)
+        return p
+
+    def _restack(self, p, top):
+        self.__panels.remove(p)
+        if top:
+            self.__panels.append(p)
+        else:
+            self.__panels.insert(0, p)
+        self.__restack = True
+
+    def _restacked(self):
+        self.__restack = True
+
+    def update_panels(self):
+        '''noutrefresh stdscr and the panels bottom to top, like the panel
+           library a panel is repainted if it was touched or something
+           under it was'''
+
+        windows = [self.stdscr] + [p.window() for p in self.__panels
+                                   if not p.hidden()]
+        if self.__restack:
+            # what was under a moved or hidden panel shows through
+            for win in windows:
+                win.touchwin()
+            self.__restack = False
+
+        painted = []
+        for win in windows:
+            if not win.is_wintouched():
+                for area in painted:
+                    if win._overlaps(area):
+                        win.touchwin()
+                        break
+            if win.is_wintouched():
+                painted.append(win._area())
+                win.noutrefresh()
+
+    def _copy(self, y, x, cells, clear):
+        self.refreshes += 1
+        self.__clear = self.__clear or clear
+
+        for row_no, row in enumerate(cells):
+            if 0 <= y + row_no < self.rows:
+                line = self.__frame[y + row_no]
+                for col_no, cell in enumerate(row):
+                    if 0 <= x + col_no < self.cols:
+                        line[x + col_no] = cell
+
+    def doupdate(self):
+        '''"send" the pending frame to the terminal'''
+
+        self.flushes += 1
+        clear = self.__clear
+        self._begin_update(clear)
+
+        for y in range(self.rows):
+            pending, shown = self.__frame[y], self.__terminal[y]
+            if not clear and pending == shown:
+                continue
+
+            # runs of changed cells
+            start = None
+            for x in range(self.cols):
+                if clear or pending[x] != shown[x]:
+                    self.cells_flushed += 1
+                    if start is None:
+                        start = x
+                elif start is not None:
+                    self._write_cells(y, start, pending[start:x])
+                    start = None
+            if start is not None:
+                self._write_cells(y, start, pending[start:])
+
+            self.__terminal[y] = pending[:]
+
+        self.__clear = False
+        self._end_update()
+
+    # for subclasses that put the frame on a real terminal, see server.py
+
+    def _begin_update(self, clear):
+        '''a doupdate starts, clear if the whole terminal is repainted'''
+        pass
+
+    def _write_cells(self, y, x, cells):
+        '''cells, a list of (character, attribute), changed at y, x'''
+        pass
+
+    def _end_update(self):
+        pass
+
+    def init_pair(self, number, fg, bg):
+        self.__pairs[number] = (fg, bg)
+
+    def pair_content(self, number):
+        '''(fg, bg) of a colour pair, like curses.pair_content'''
+        return self.__pairs.get(number, (-1, -1))
+
+    def color_pair(self, number):
+        # same packing as ncurses
+        return number << 8
+
+    def max_pairs(self):
+        return 256
+
+    def beep(self):
+        self.beeps += 1
+
+    def snapshot(self):
+        '''what the terminal shows, one string per line'''
+        return [''.join(ch for ch, attr in row) for row in self.__terminal]
+
+    def attr(self, y, x):
+        '''the attribute of a cell on the terminal'''
+        return self.__terminal[y][x][1]
+
+
+# screen used by widgets that are made without one
+_default = None
+
+
+def default_screen():
+    global _default
+    if _default is None:
+        _default = CursesScreen()
+    return _default
+
+
+def set_default_screen(screen):
+    global _default
+    _default = screen
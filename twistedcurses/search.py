@@ -0,0 +1,446 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Search over the rows of a data source, ignoring case.
+
+    SearchIndex keeps the lowered text of every row, and for type-ahead
+    the same texts in order in a SortedIndex (see sorted_view.py): the
+    rows starting with a prefix are a range of it found by bisecting.
+    Each row there has a label instead of its row number, labels grow
+    with the row numbers and are handed out with gaps between them, so a
+    row coming, going or moving doesn't renumber the others. Once asked
+    for, the labels of the rows starting with a prefix up to GRAM long
+    are kept in order too, the next row from a given one starting with a
+    short prefix is a bisect, for longer ones we look among the rows
+    their range has.
+
+    For filtering it also keeps, made the first time one asks, for every
+    substring of up to GRAM characters the (ascending) numbers of the
+    rows that contain it. Queries up to GRAM long are a single lookup,
+    longer ones intersect the postings of their GRAM long pieces and only
+    check the text of the rows that survive. Rows inserted, removed or
+    moved in the middle shift the row numbers after them, a posting
+    catches up with the shifts when it is next used.
+
+    Changes are applied as they come in, an updated row only swaps its
+    own entries.
+'''
+
+from array import array
+from bisect import bisect_left, insort
+
+from data_source import DataSource
+from sorted_view import SPACING, SortedIndex, room, spaced
+
+GRAM = 3
+
+# rows fetched from the source at a time while indexing
+CHUNK = 10000
+
+# shifts the postings may lag behind, past that they are made again
+SHIFTS = 1000
+
+# matches of a long prefix put in order to find the next one, more and we
+# walk the rows starting like it for a while first
+WALK = 2048
+
+
+def _grams(text):
+    '''every substring of text up to GRAM long'''
+    return set(text[i:i + n] for n in range(1, GRAM + 1)
+               for i in range(len(text) - n + 1))
+
+
+class SearchIndex:
+
+    def __init__(self, source):
+        self.__source = source
+        self.__build(self.__fetch(0, len(source)))
+        source.subscribe(self)
+
+    def close(self):
+        self.__source.unsubscribe(self)
+
+    def __fetch(self, start, stop):
+        '''the lowered texts of rows start to stop'''
+
+        texts = []
+        for chunk in range(start, stop, CHUNK):
+            rows = self.__source.fetch(chunk, min(chunk + CHUNK, stop))
+            texts.extend(row.lower() for row in rows)
+        return texts
+
+    def __build(self, texts):
+        self.__texts = texts
+        self.__labels = spaced(len(texts))
+        self.__sorted = SortedIndex(zip(texts, self.__labels))
+        self.__starts = {}  # short prefix -> labels, ascending
+
+        self.__postings = None  # substring -> rows containing it
+        self.__shifts = []  # (index, count) rows moved by since made
+        self.__seen = {}  # substring -> shifts its posting has had
+
+    def __relabel(self):
+        '''labels SPACING apart again, in the same order'''
+
+        old = self.__labels
+        self.__labels = spaced(len(old))
+        labels = dict(zip(old, self.__labels))
+        self.__sorted = SortedIndex([(text, labels[label]) for text, label
+                                     in self.__sorted.slice(0, len(old))])
+        for prefix, posting in self.__starts.items():
+            self.__starts[prefix] = array('d', [labels[label]
+                                                for label in posting])
+
+    def __add(self, text, label):
+        self.__sorted.add((text, label))
+        for n in range(1, min(len(text), GRAM) + 1):
+            labels = self.__starts.get(text[:n])
+            if labels is not None:
+                insort(labels, label)
+
+    def __remove(self, text, label):
+        self.__sorted.remove((text, label))
+        for n in range(1, min(len(text), GRAM) + 1):
+            labels = self.__starts.get(text[:n])
+            if labels is not None:
+                del labels[bisect_left(labels, label)]
+
+    # the substring postings
+
+    def __grams(self):
+        '''the postings, made from the texts if we have none'''
+
+        if self.__postings is None:
+            postings = self.__postings = {}
+            for row_no, text in enumerate(self.__texts):
+                for gram in _grams(text):
+                    posting = postings.get(gram)
+                    if posting is None:
+                        posting = postings[gram] = array('i')
+                    posting.append(row_no)
+        return self.__postings
+
+    def __posting(self, gram, create=False):
+        '''the rows containing gram, caught up with the shifts'''
+
+        postings = self.__grams()
+        posting = postings.get(gram)
+        if posting is None:
+            if not create:
+                return ()
+            posting = postings[gram] = array('i')
+            self.__seen[gram] = len(self.__shifts)
+            return posting
+
+        seen = self.__seen.get(gram, 0)
+        for index, count in self.__shifts[seen:]:
+            # rows from index on moved by count, removed ones are gone
+            i = bisect_left(posting, index)
+            j = bisect_left(posting, index - count) if count < 0 else i
+            posting[i:] = array('i', [row_no + count
+                                      for row_no in posting[j:]])
+        self.__seen[gram] = len(self.__shifts)
+        return posting
+
+    def __shift(self, index, count):
+        if self.__postings is None:
+            return
+        self.__shifts.append((index, count))
+        if len(self.__shifts) > SHIFTS:
+            self.__postings = None
+            self.__shifts, self.__seen = [], {}
+
+    def __post(self, row_no, text, add=True):
+        if self.__postings is None:
+            return
+        for gram in _grams(text):
+            posting = self.__posting(gram, create=add)
+            if add:
+                insort(posting, row_no)
+            else:
+                del posting[bisect_left(posting, row_no)]
+
+    # data source listener
+
+    def rows_inserted(self, index, count):
+        texts = self.__fetch(index, index + count)
+        if count > len(self.__texts) or count >= SPACING:
+            # many rows, sorting them all beats adding them one by one
+            old = self.__texts
+            self.__build(old[:index] + texts + old[index:])
+            return
+
+        labels = room(self.__labels, index, count)
+        if labels is None:
+            self.__relabel()
+            labels = room(self.__labels, index, count)
+
+        self.__texts[index:index] = texts
+        self.__labels[index:index] = array('d', labels)
+        for text, label in zip(texts, labels):
+            self.__add(text, label)
+
+        if index + count < len(self.__texts):
+            self.__shift(index, count)
+        for row_no, text in enumerate(texts, index):
+            self.__post(row_no, text)
+
+    def rows_removed(self, index, count):
+        if count * 2 > len(self.__texts):
+            old = self.__texts
+            self.__build(old[:index] + old[index + count:])
+            return
+
+        stop = index + count
+        for text, label in zip(self.__texts[index:stop],
+                               self.__labels[index:stop]):
+            self.__remove(text, label)
+        del self.__texts[index:stop]
+        del self.__labels[index:stop]
+        self.__shift(index, -count)
+
+    def rows_updated(self, index, count):
+        texts = self.__fetch(index, index + count)
+        for row_no, text in enumerate(texts, index):
+            old = self.__texts[row_no]
+            if text == old:
+                continue  # e.g. only its style changed
+
+            label = self.__labels[row_no]
+            self.__remove(old, label)
+            self.__add(text, label)
+            self.__texts[row_no] = text
+
+            if self.__postings is not None:
+                old_grams, new_grams = _grams(old), _grams(text)
+                for gram in old_grams - new_grams:
+                    posting = self.__posting(gram)
+                    del posting[bisect_left(posting, row_no)]
+                for gram in new_grams - old_grams:
+                    insort(self.__posting(gram, create=True), row_no)
+
+    def rows_moved(self, index, to):
+        text = self.__texts.pop(index)
+        label = self.__labels.pop(index)
+        self.__remove(text, label)
+        self.__shift(index, -1)
+
+        new = room(self.__labels, to, 1)
+        if new is None:
+            self.__relabel()
+            new = room(self.__labels, to, 1)
+        self.__texts.insert(to, text)
+        self.__labels.insert(to, new[0])
+        self.__add(text, new[0])
+
+        self.__shift(to, 1)
+        self.__post(to, text)
+
+    def __verify(self, query, rows, prefix):
+        '''the rows whose text really contains (or starts with) query'''
+
+        texts = self.__texts
+        if prefix:
+            return [row_no for row_no in rows
+                    if texts[row_no].startswith(query)]
+        return [row_no for row_no in rows if query in texts[row_no]]
+
+    def matches(self, query, start=0, prefix=False, within=None):
+        '''ascending row numbers, from start on, whose text contains query
+           (or starts with it), ignoring case.
+
+           within -> the matches of a shorter query that this one extends,
+                     e.g. while typing, only those need a look'''
+
+        query = query.lower()
+        if not query:
+            return range(start, len(self.__texts))
+
+        if within is not None:
+            rows = within[bisect_left(within, start):]
+            return self.__verify(query, rows, prefix)
+
+        if len(query) <= GRAM:
+            posting = self.__posting(query)
+            rows = posting[bisect_left(posting, start):]
+
+            # short queries are exact, the posting is the answer
+            return self.__verify(query, rows, prefix) if prefix else rows
+
+        pieces = set(query[i:i + GRAM]
+                     for i in range(len(query) - GRAM + 1))
+        postings = sorted((self.__posting(piece) for piece in pieces),
+                          key=len)
+
+        # rows with all the pieces, then check the pieces are in order
+        shortest = postings[0]
+        found = set(shortest[bisect_left(shortest, start):])
+        for posting in postings[1:]:
+            if not found:
+                break
+            found.intersection_update(posting)
+
+        return self.__verify(query, sorted(found), prefix)
+
+    def __starting(self, prefix):
+        '''(start, stop) of the items of texts starting with prefix'''
+
+        items = self.__sorted
+        start = items.bisect((prefix,))
+
+        # they follow each other from start on
+        low, high = start, len(items)
+        while low < high:
+            middle = (low + high) // 2
+            if items[middle][0].startswith(prefix):
+                low = middle + 1
+            else:
+                high = middle
+        return start, low
+
+    def __started(self, prefix):
+        '''labels of the rows starting with prefix, up to GRAM long, in
+           order'''
+
+        labels = self.__starts.get(prefix)
+        if labels is None:
+            begin, end = self.__starting(prefix)
+            labels = self.__starts[prefix] = array('d', sorted(
+                label for text, label in self.__sorted.slice(begin, end)))
+        return labels
+
+    def __walk(self, query, after):
+        '''the label of the first row from label after on (wrapping)
+           starting with query, looked for among the rows starting like
+           it, None if it isn't near'''
+
+        posting = self.__started(query[:GRAM])
+        i = bisect_left(posting, after) if after is not None else 0
+        texts, labels = self.__texts, self.__labels
+        for n in range(i, i + WALK):
+            label = posting[n % len(posting)]
+            if texts[bisect_left(labels, label)].startswith(query):
+                return label
+        return None
+
+    def first(self, query, start=0, prefix=False):
+        '''the first match from start on, wrapping around, or None'''
+
+        query = query.lower()
+        if not prefix:
+            found = self.matches(query, start) or self.matches(query)
+            return found[0] if len(found) else None
+
+        after = self.__labels[start] if start < len(self.__labels) else None
+        label = None
+
+        if len(query) <= GRAM:
+            labels = self.__started(query)
+        else:
+            begin, end = self.__starting(query)
+            if end - begin > WALK:
+                label = self.__walk(query, after)
+            labels = None if label is not None else sorted(
+                label for text, label in self.__sorted.slice(begin, end))
+
+        if labels is not None:
+            if not labels:
+                return None
+            i = bisect_left(labels, after) if after is not None else 0
+            label = labels[i] if i < len(labels) else labels[0]
+        return bisect_left(self.__labels, label)
+
+
+class FilteredSource(DataSource):
+    '''the rows of another source that contain a query'''
+
+    def __init__(self, source, index, query):
+        DataSource.__init__(self)
+        self.__source = source
+        self.__index = index
+        self.__query = query
+        self.__rows = array('i', index.matches(query))
+
+        # subscribed after the index, so it has seen changes before we ask
+        source.subscribe(self)
+
+    def close(self):
+        self.__source.unsubscribe(self)
+
+    def query(self):
+        return self.__query
+
+    def set_query(self, query):
+        '''typing more letters only has to look at what already matched'''
+
+        within = self.__rows if query.lower().startswith(
+            self.__query.lower()) else None
+        self.__query = query
+        self.__replace(self.__index.matches(query, within=within))
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def fetch(self, start, stop):
+        return self.__source.fetch_rows(self.__rows[start:stop])
+
+    def fetch_rows(self, row_numbers):
+        rows = self.__rows
+        return self.__source.fetch_rows([rows[i] for i in row_numbers])
+
+    def fetch_styles(self, start, stop):
+        return self.__source.fetch_styles_rows(self.__rows[start:stop])
+
+    def fetch_styles_rows(self, row_numbers):
+        rows = self.__rows
+        return self.__source.fetch_styles_rows([rows[i] for i in row_numbers])
+
+    def source_row(self, index):
+        '''the row number in the underlying source'''
+        return self.__rows[index]
+
+    def row_of(self, source_row):
+        '''where a row of the underlying source is shown, or the next
+           one that is'''
+        return min(bisect_left(self.__rows, source_row),
+                   max(len(self.__rows) - 1, 0))
+
+    def __replace(self, rows):
+        old = len(self.__rows)
+        self.__rows = array('i', rows)
+        self._notify('removed', 0, old)
+        self._notify('inserted', 0, len(self.__rows))
+
+    # listener of the underlying source
+
+    def rows_inserted(self, index, count):
+        if self.__rows and index <= self.__rows[-1]:
+            self.__replace(self.__index.matches(self.__query))
+            return
+
+        # appended, only look at the new rows
+        found = [row_no for row_no in self.__index.matches(self.__query, index)
+                 if row_no < index + count]
+        if found:
+            self.__rows.extend(found)
+            self._notify('inserted', len(self.__rows) - len(found), len(found))
+
+    def rows_removed(self, index, count):
+        self.__replace(self.__index.matches(self.__query))
+
+    def rows_updated(self, index, count):
+        self.__replace(self.__index.matches(self.__query))
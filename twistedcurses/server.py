@@ -0,0 +1,378 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Serving an app to many terminals at once, over telnet.
+
+    Every connection gets an App of its own, made by a function we are
+    given, so every session has its own screen, widgets, focus and
+    selection. What the sessions share is whatever that function hands
+    them, typically one data source all their list boxes show:
+
+        prices = ListSource(rows)
+
+        def make_app(reactor, screen):
+            app = App(reactor, 'Prices', menu, screen=screen)
+            app.add_widget('list', ListBox(..., source=prices, screen=screen))
+            return app
+
+        reactor.listenTCP(2323, TelnetServerFactory(make_app))
+
+    A session draws on a TerminalScreen, a VirtualScreen that sends the
+    cells that changed in a frame as one write of escape sequences, so an
+    idle session costs nothing and a busy one only what changed. The
+    terminal size comes from the client (NAWS) and a new size relayouts
+    that session only.
+
+    App.quit in a session closes its connection, not the server.
+'''
+
+import curses
+import struct
+
+from twisted.conch.telnet import (ECHO, NAWS, SGA, TelnetProtocol,
+                                  TelnetTransport)
+from twisted.internet.protocol import ServerFactory
+
+from logger import logger
+from screen import VirtualScreen
+
+# escape sequences from the terminal -> key codes, what follows the ESC
+ESCAPES = {
+    '[A': curses.KEY_UP, 'OA': curses.KEY_UP,
+    '[B': curses.KEY_DOWN, 'OB': curses.KEY_DOWN,
+    '[C': curses.KEY_RIGHT, 'OC': curses.KEY_RIGHT,
+    '[D': curses.KEY_LEFT, 'OD': curses.KEY_LEFT,
+    '[H': curses.KEY_HOME, 'OH': curses.KEY_HOME,
+    '[1~': curses.KEY_HOME, '[7~': curses.KEY_HOME,
+    '[F': curses.KEY_END, 'OF': curses.KEY_END,
+    '[4~': curses.KEY_END, '[8~': curses.KEY_END,
+    '[2~': curses.KEY_IC,
+    '[3~': curses.KEY_DC,
+    '[5~': curses.KEY_PPAGE,
+    '[6~': curses.KEY_NPAGE,
+    'OP': curses.KEY_F0 + 1, 'OQ': curses.KEY_F0 + 2,
+    'OR': curses.KEY_F0 + 3, 'OS': curses.KEY_F0 + 4,
+    '[15~': curses.KEY_F0 + 5, '[17~': curses.KEY_F0 + 6,
+    '[18~': curses.KEY_F0 + 7, '[19~': curses.KEY_F0 + 8,
+    '[20~': curses.KEY_F0 + 9, '[21~': curses.KEY_F0 + 10,
+    '[23~': curses.KEY_F0 + 11, '[24~': curses.KEY_F0 + 12,
+}
+
+_LONGEST = max(len(sequence) for sequence in ESCAPES)
+
+# what can follow an ESC that isn't a whole sequence yet
+_STARTS = set(sequence[:n] for sequence in ESCAPES
+              for n in range(len(sequence)))
+
+_ESC = 27
+_CR = 13
+
+# how long the start of an escape sequence waits for the rest, after that
+# it is taken as typed (a lone ESC), like curses' ESCDELAY
+ESC_DELAY = 0.05
+
+
+def _decode(data, final=True, after_cr=False):
+    '''bytes from the terminal -> (key codes, bytes left over, True if
+       they ended in a CR)
+
+       final -> False if more can come, then an escape sequence the bytes
+                end part way into is left over for the next ones
+
+       after_cr -> the bytes before these ended in a CR'''
+
+    data = bytearray(data)
+    keys = []
+    i = 0
+
+    # telnet sends enter as CR LF or CR NUL
+    if after_cr and data[:1] in (b'\0', b'\n'):
+        i = 1
+
+    while i < len(data):
+        byte = data[i]
+        i += 1
+
+        if byte == _ESC:
+            for length in range(_LONGEST, 1, -1):
+                sequence = bytes(data[i:i + length]).decode('latin-1')
+                if sequence in ESCAPES:
+                    keys.append(ESCAPES[sequence])
+                    i += length
+                    break
+            else:
+                rest = bytes(data[i:]).decode('latin-1')
+                if not final and rest in _STARTS:
+                    return keys, bytes(data[i - 1:]), False
+
+                # a lone ESC, or ESC then a key (M-x)
+                keys.append(_ESC)
+
+        elif byte == _CR:
+            keys.append(10)
+            if i < len(data) and data[i] in (0, 10):
+                i += 1
+
+        else:
+            keys.append(byte)
+
+    return keys, b'', bool(data) and data[-1] == _CR
+
+
+def decode_keys(data):
+    '''bytes from the terminal -> list of key codes'''
+    return _decode(data)[0]
+
+
+class KeyDecoder:
+    '''decode_keys for a stream of packets, an escape sequence (or CR LF)
+       split between two is put together again'''
+
+    def __init__(self):
+        self.__rest = b''
+        self.__after_cr = False
+
+    def decode(self, data):
+        '''bytes that came in -> key codes'''
+        keys, self.__rest, self.__after_cr = _decode(
+            self.__rest + bytes(data), final=False, after_cr=self.__after_cr)
+        return keys
+
+    def pending(self):
+        '''True if we hold the start of an escape sequence'''
+        return bool(self.__rest)
+
+    def flush(self):
+        '''no more is coming for now, the start of a sequence we hold is
+           what was typed'''
+        keys, self.__rest, self.__after_cr = _decode(self.__rest)
+        return keys
+
+
+def _text(ch):
+    if isinstance(ch, type(u'')):
+        return ch
+    return ch.decode('utf-8', 'replace')
+
+
+class TerminalScreen(VirtualScreen):
+    '''a VirtualScreen whose doupdate goes out to a remote terminal
+
+       write -> function(bytes), the connection's write
+       close -> function(), hangs up, called when the app stops'''
+
+    owns_reactor = False
+
+    # lines drawn with the unicode box characters
+    ACS_HLINE = u'\u2500'
+    ACS_VLINE = u'\u2502'
+    ACS_ULCORNER = u'\u250c'
+    ACS_URCORNER = u'\u2510'
+    ACS_LLCORNER = u'\u2514'
+    ACS_LRCORNER = u'\u2518'
+    ACS_TTEE = u'\u252c'
+    ACS_BTEE = u'\u2534'
+    ACS_LTEE = u'\u251c'
+    ACS_RTEE = u'\u2524'
+    ACS_PLUS = u'\u253c'
+
+    def __init__(self, write, close=None, rows=24, cols=80):
+        VirtualScreen.__init__(self, rows, cols)
+        self.__write = write
+        self.__close = close
+        self.__out = []
+        self.__attr = None
+        self.__reported = (rows, cols)
+        self.__stopped = False
+
+        # bytes sent to the terminal
+        self.bytes_sent = 0
+
+    def size(self):
+        '''what the client told us, the app resizes to it'''
+        return self.__reported
+
+    def set_size(self, rows, cols):
+        '''the client's window changed, App.resized() takes it from here'''
+        self.__reported = (max(rows, 1), max(cols, 1))
+
+    def start(self):
+        # hide the cursor
+        self.__send(u'\x1b[?25l\x1b[0m\x1b[2J')
+
+    def stop(self):
+        '''put the terminal back and hang up'''
+        if self.__stopped:
+            return
+        self.__send(u'\x1b[0m\x1b[2J\x1b[H\x1b[?25h')
+        self.__stopped = True
+        if self.__close is not None:
+            self.__close()
+
+    def __send(self, text):
+        if self.__stopped:
+            return
+        data = text.encode('utf-8')
+        self.bytes_sent += len(data)
+        self.__write(data)
+
+    def __sgr(self, attr):
+        '''escape sequence for an attribute'''
+
+        codes = ['0']
+        if attr & curses.A_BOLD:
+            codes.append('1')
+        if attr & curses.A_UNDERLINE:
+            codes.append('4')
+        if attr & (curses.A_REVERSE | curses.A_STANDOUT):
+            codes.append('7')
+
+        fg, bg = self.pair_content((attr & curses.A_COLOR) >> 8)
+        if 0 <= fg < 8:
+            codes.append('%d' % (30 + fg))
+        if 0 <= bg < 8:
+            codes.append('%d' % (40 + bg))
+
+        return u'\x1b[%sm' % ';'.join(codes)
+
+    def _begin_update(self, clear):
+        self.__out = []
+        if clear:
+            self.__attr = None
+            self.__out.append(u'\x1b[0m\x1b[2J')
+
+    def _write_cells(self, y, x, cells):
+        out = self.__out
+        out.append(u'\x1b[%d;%dH' % (y + 1, x + 1))
+        for ch, attr in cells:
+            if attr != self.__attr:
+                self.__attr = attr
+                out.append(self.__sgr(attr))
+            out.append(_text(ch))
+
+    def _end_update(self):
+        out, self.__out = self.__out, []
+        if out:
+            self.__send(u''.join(out))
+
+
+class TerminalSession(TelnetProtocol):
+    '''one connected terminal, running its own App'''
+
+    def __init__(self, make_app, reactor):
+        self.make_app = make_app
+        self.reactor = reactor
+        self.screen = None
+        self.app = None
+        self.__keys = KeyDecoder()
+        self.__flush_call = None  # gives up waiting for an escape sequence
+
+    def connectionMade(self):
+        transport = self.transport
+        transport.negotiationMap[NAWS] = self.telnet_NAWS
+
+        # we echo (or rather draw) and want every key as it is typed
+        for option in (ECHO, SGA):
+            transport.will(option).addErrback(self.__refused, option)
+        for option in (SGA, NAWS):
+            transport.do(option).addErrback(self.__refused, option)
+
+        # App.quit stops the screen, which hangs up
+        self.screen = TerminalScreen(transport.write, transport.loseConnection)
+        self.app = self.make_app(self.reactor, self.screen)
+
+        factory = getattr(self, 'factory', None)
+        if factory is not None:
+            factory.sessions.append(self)
+
+    def __refused(self, failure, option):
+        logger.debug("session: option %r refused, %s", option,
+                     failure.getErrorMessage())
+
+    def enableLocal(self, option):
+        return option in (ECHO, SGA)
+
+    def enableRemote(self, option):
+        return option in (NAWS, SGA)
+
+    def disableLocal(self, option):
+        pass
+
+    def disableRemote(self, option):
+        pass
+
+    def telnet_NAWS(self, data):
+        if len(data) != 4:
+            logger.warning("session: bad NAWS %r", data)
+            return
+        cols, rows = struct.unpack('!HH', b''.join(data))
+        if not (rows and cols) or (rows, cols) == self.screen.size():
+            return
+        self.screen.set_size(rows, cols)
+        self.app.resized()
+
+    def dataReceived(self, data):
+        if self.app is None:
+            return
+
+        if self.__flush_call is not None and self.__flush_call.active():
+            self.__flush_call.cancel()
+        self.__flush_call = None
+
+        self.screen.feed(self.__keys.decode(data))
+        if self.__keys.pending():
+            self.__flush_call = self.reactor.callLater(ESC_DELAY,
+                                                       self.__flush_keys)
+        self.app.doRead()
+
+    def __flush_keys(self):
+        self.__flush_call = None
+        if self.app is not None:
+            self.screen.feed(self.__keys.flush())
+            self.app.doRead()
+
+    def connectionLost(self, reason):
+        if self.__flush_call is not None and self.__flush_call.active():
+            self.__flush_call.cancel()
+
+        factory = getattr(self, 'factory', None)
+        if factory is not None and self in factory.sessions:
+            factory.sessions.remove(self)
+
+        if self.app is not None:
+            self.app.close()
+            self.app = None
+
+
+class TelnetServerFactory(ServerFactory):
+    '''for listenTCP, every connection gets an App from
+       make_app(reactor, screen), which must pass the screen on to the App
+       (widgets made after the App use it by default)'''
+
+    def __init__(self, make_app, reactor=None):
+        if reactor is None:
+            from twisted.internet import reactor
+        self.make_app = make_app
+        self.reactor = reactor
+
+        # sessions currently connected
+        self.sessions = []
+
+    def buildProtocol(self, addr):
+        transport = TelnetTransport(TerminalSession, self.make_app,
+                                    self.reactor)
+        transport.factory = self
+        return transport
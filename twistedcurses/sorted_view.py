@@ -0,0 +1,365 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Sorted views that stay sorted as rows change.
+
+    SortedIndex keeps (key, row) items in order, in blocks of about LOAD
+    items, with a Fenwick tree over the block sizes. Finding where an item
+    is (or which item is at a position) is a bisect over the blocks, a
+    walk down the tree and a bisect in the block, so when one value
+    changes we move one item instead of sorting everything again.
+
+    SortedSource is a ListBox data source showing another source in order,
+    Table sorts its rows with a SortedIndex directly. SortedSource keeps a
+    label for every row instead of its row number, labels grow with the
+    row numbers and are handed out with gaps between them (see room), so
+    rows coming or going only add or take out their own items.
+'''
+
+from array import array
+from bisect import bisect_left, insort
+
+from data_source import DataSource
+
+# items per block, a block twice that size is split
+LOAD = 512
+
+# labels are handed out this far apart
+SPACING = 1 << 20
+
+
+class SortedIndex:
+
+    def __init__(self, items=()):
+        items = sorted(items)
+        self.__blocks = [items[i:i + LOAD] for i in range(0, len(items), LOAD)]
+        self.__len = len(items)
+        self.__reindex()
+
+    def __reindex(self):
+        '''the block maxima and the tree, after blocks came or went'''
+
+        self.__maxes = [block[-1] for block in self.__blocks]
+
+        n = len(self.__blocks)
+        tree = [0] * (n + 1)
+        for i, block in enumerate(self.__blocks, 1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.__tree = tree
+
+    def __grow(self, block_no, delta):
+        tree = self.__tree
+        i = block_no + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def __before(self, block_no):
+        '''items in the blocks before block_no'''
+        tree = self.__tree
+        total = 0
+        i = block_no
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def __find(self, position):
+        '''(block number, index in the block) of the item at position'''
+
+        tree = self.__tree
+        block_no, bit = 0, 1
+        while bit * 2 < len(tree):
+            bit *= 2
+
+        while bit:
+            if block_no + bit < len(tree) and tree[block_no + bit] <= position:
+                block_no += bit
+                position -= tree[block_no]
+            bit //= 2
+        return block_no, position
+
+    def __len__(self):
+        return self.__len
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.__len:
+            raise IndexError(position)
+        block_no, i = self.__find(position)
+        return self.__blocks[block_no][i]
+
+    def index(self, item):
+        '''position of item, ValueError if it isn't there'''
+
+        block_no = bisect_left(self.__maxes, item)
+        if block_no < len(self.__blocks):
+            block = self.__blocks[block_no]
+            i = bisect_left(block, item)
+            if i < len(block) and block[i] == item:
+                return self.__before(block_no) + i
+        raise ValueError(item)
+
+    def bisect(self, item):
+        '''position item would be added at, before any equal ones'''
+
+        block_no = bisect_left(self.__maxes, item)
+        if block_no == len(self.__blocks):
+            return self.__len
+        return (self.__before(block_no) +
+                bisect_left(self.__blocks[block_no], item))
+
+    def add(self, item):
+        '''insert item, returns its position'''
+
+        if not self.__blocks:
+            self.__blocks.append([item])
+            self.__len = 1
+            self.__reindex()
+            return 0
+
+        block_no = min(bisect_left(self.__maxes, item), len(self.__blocks) - 1)
+        block = self.__blocks[block_no]
+        insort(block, item)
+        self.__len += 1
+        position = self.__before(block_no) + bisect_left(block, item)
+
+        if len(block) > 2 * LOAD:
+            self.__blocks[block_no:block_no + 1] = [block[:LOAD],
+                                                    block[LOAD:]]
+            self.__reindex()
+        else:
+            self.__maxes[block_no] = block[-1]
+            self.__grow(block_no, 1)
+
+        return position
+
+    def remove(self, item):
+        '''take item out, returns the position it had'''
+
+        position = self.index(item)
+        block_no = bisect_left(self.__maxes, item)
+        block = self.__blocks[block_no]
+        del block[bisect_left(block, item)]
+        self.__len -= 1
+
+        if not block:
+            del self.__blocks[block_no]
+            self.__reindex()
+        else:
+            self.__maxes[block_no] = block[-1]
+            self.__grow(block_no, -1)
+
+        return position
+
+    def move(self, item, new_item):
+        '''replace item by new_item, (old position, new position)'''
+        return self.remove(item), self.add(new_item)
+
+    def slice(self, start, stop):
+        '''the items at positions [start, stop)'''
+
+        start, stop = max(start, 0), min(stop, self.__len)
+        if start >= stop:
+            return []
+
+        block_no, i = self.__find(start)
+        items = []
+        while len(items) < stop - start:
+            items.extend(self.__blocks[block_no][i:i + stop - start -
+                                                 len(items)])
+            block_no, i = block_no + 1, 0
+        return items
+
+
+def moved(position, index, to):
+    '''where position ends up after the row at index moved to `to`'''
+
+    if position == index:
+        return to
+    if index < position <= to:
+        return position - 1
+    if to <= position < index:
+        return position + 1
+    return position
+
+
+def spaced(count):
+    '''count labels SPACING apart'''
+    return array('d', range(0, count * SPACING, SPACING))
+
+
+def room(labels, index, count):
+    '''labels for count rows going in at index, between the labels of their
+       neighbours, None if they don't fit'''
+
+    before = labels[index - 1] if index else None
+    after = labels[index] if index < len(labels) else None
+
+    if after is None:
+        start = before if before is not None else -SPACING
+        return [start + SPACING * (i + 1) for i in range(count)]
+    if before is None:
+        return [after - SPACING * (count - i) for i in range(count)]
+
+    step = (after - before) // (count + 1)
+    if step < 1:
+        return None
+    return [before + step * (i + 1) for i in range(count)]
+
+
+def _identity(row):
+    return row
+
+
+class SortedSource(DataSource):
+    '''the rows of another source, in order of key(row). Rows that change
+       move to their new place, listeners see that as rows_moved'''
+
+    def __init__(self, source, key=None, reverse=False):
+        DataSource.__init__(self)
+        self.__source = source
+        self.__key = key or _identity
+        self.__reverse = reverse
+        self.__rebuild()
+        source.subscribe(self)
+
+    def close(self):
+        self.__source.unsubscribe(self)
+
+    def __rebuild(self):
+        rows = self.__source.fetch(0, len(self.__source))
+        self.__keys = [self.__key(row) for row in rows]
+        self.__labels = spaced(len(rows))
+        self.__index = SortedIndex(zip(self.__keys, self.__labels))
+
+    def __relabel(self):
+        '''labels SPACING apart again, in the same order'''
+
+        old = self.__labels
+        self.__labels = spaced(len(old))
+        labels = dict(zip(old, self.__labels))
+        self.__index = SortedIndex([(key, labels[label]) for key, label
+                                    in self.__index.slice(0, len(old))])
+
+    def __row_no(self, label):
+        return bisect_left(self.__labels, label)
+
+    def __position(self, position):
+        '''sorted position <-> shown position, the same both ways'''
+        if self.__reverse:
+            return len(self.__index) - 1 - position
+        return position
+
+    def __len__(self):
+        return len(self.__index)
+
+    def fetch(self, start, stop):
+        stop = min(stop, len(self))
+        if self.__reverse:
+            items = self.__index.slice(self.__position(stop - 1),
+                                       self.__position(start) + 1)
+            items.reverse()
+        else:
+            items = self.__index.slice(start, stop)
+        return self.__source.fetch_rows([self.__row_no(label)
+                                         for key, label in items])
+
+    def fetch_rows(self, row_numbers):
+        return self.__source.fetch_rows([self.source_row(i)
+                                         for i in row_numbers])
+
+    def fetch_styles(self, start, stop):
+        return self.fetch_styles_rows(range(start, min(stop, len(self))))
+
+    def fetch_styles_rows(self, row_numbers):
+        return self.__source.fetch_styles_rows([self.source_row(i)
+                                                for i in row_numbers])
+
+    def source_row(self, index):
+        '''the row number in the underlying source'''
+        return self.__row_no(self.__index[self.__position(index)][1])
+
+    def row_of(self, source_row):
+        '''where a row of the underlying source is shown'''
+        return self.__position(self.__index.index(
+            (self.__keys[source_row], self.__labels[source_row])))
+
+    def __replace(self):
+        old = len(self.__index)
+        self.__rebuild()
+        self._notify('removed', 0, old)
+        self._notify('inserted', 0, len(self.__index))
+
+    # listener of the underlying source
+
+    def rows_inserted(self, index, count):
+        if count > len(self.__keys) or count >= SPACING:
+            # many rows, sorting them all beats adding them one by one
+            self.__replace()
+            return
+
+        labels = room(self.__labels, index, count)
+        if labels is None:
+            self.__relabel()
+            labels = room(self.__labels, index, count)
+
+        keys = [self.__key(row) for row in
+                self.__source.fetch(index, index + count)]
+        self.__keys[index:index] = keys
+        self.__labels[index:index] = array('d', labels)
+
+        # one at a time, so what listeners fetch is where they were told
+        for key, label in zip(keys, labels):
+            position = self.__index.add((key, label))
+            self._notify('inserted', self.__position(position), 1)
+
+    def rows_removed(self, index, count):
+        if count * 2 > len(self.__keys):
+            self.__replace()
+            return
+
+        stop = index + count
+        items = list(zip(self.__keys[index:stop], self.__labels[index:stop]))
+        del self.__keys[index:stop]
+        del self.__labels[index:stop]
+
+        for item in items:
+            position = self.__index.remove(item)
+            if self.__reverse:
+                # where it was shown, one more row than now
+                position = len(self.__index) - position
+            self._notify('removed', position, 1)
+
+    def rows_updated(self, index, count):
+
+        rows = self.__source.fetch(index, index + count)
+        for row_no, row in enumerate(rows, index):
+            key = self.__key(row)
+            old_key, self.__keys[row_no] = self.__keys[row_no], key
+
+            if key == old_key:
+                self._notify('updated', self.row_of(row_no), 1)
+                continue
+
+            label = self.__labels[row_no]
+            old, new = self.__index.move((old_key, label), (key, label))
+            old, new = self.__position(old), self.__position(new)
+            if old != new:
+                self._notify_moved(old, new)
+            self._notify('updated', new, 1)
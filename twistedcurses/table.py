@@ -14,15 +14,71 @@
 
 '''
 
-from twisted.python import log
-
 import curses
 
-from util import get_real_termial_size
+from logger import logger
+from sorted_view import SortedIndex, moved
+from table_model import TableModel
+from theme import SELECTED, ACTIVE, HEADER, FOCUSED
+from widget import Widget, styled
+
+# narrowest a column gets when they don't all fit (excluding the '|')
+MIN_COLUMN_WIDTH = 8
+
+PAGE_UP = (curses.KEY_PPAGE,)
+PAGE_DOWN = (curses.KEY_NPAGE,)
+HOME = (curses.KEY_HOME,)
+END = (curses.KEY_END, curses.KEY_LL)
+
+
+def _slot(index, frozen, first, visible):
+    '''where row (or column) index is shown, counting from the top (or
+       left), or None. The first `frozen` are always shown, the rest
+       scroll, starting with `first`'''
+
+    frozen = min(frozen, visible)
+    if index < frozen:
+        return index
+    slot = frozen + index - first
+    if frozen <= slot < visible:
+        return slot
+    return None
+
+
+def _scrolled(first, selected, frozen, visible, count):
+    '''the first scrolled row (or column), moved as little as possible so
+       that selected is shown'''
+
+    frozen = min(frozen, visible)
+    scrolling = max(visible - frozen, 1)
+    first = max(first, frozen)
+
+    if frozen <= selected < first:
+        first = selected
+    elif selected >= first + scrolling:
+        first = selected - scrolling + 1
+
+    return max(min(first, count - scrolling), frozen)
+
+
+class Table(Widget):
+    '''a grid of cells, only the cells in view are ever visited, so a huge
+       table costs the same per frame as a small one'''
+
+    style_kind = 'table'
+
+    def __init__(self, position, size, callback, dim=None, screen=None,
+                 columns=None, frozen=(0, 0), model=None):
+        '''columns -> a list of table_store.Column, one per column, to
+                      keep typed values or format them, see table_store.py
 
-class Table():
+           frozen -> (rows, cols) at the top and left that don't scroll,
+                     e.g. headers
 
-    def __init__(self, position, size, callback, dim):
+           model -> a TableModel to show, shared with other tables, see
+                    table_model.py. dim and columns come from it then'''
+
+        Widget.__init__(self, screen)
 
         self.__editable = True
 
@@ -30,193 +86,446 @@ class Table():
         self.x, self.y = position
         self.y += 2
 
+        # the cells, held a column at a time, maybe shared
+        if model is None:
+            model = TableModel(dim, columns)
+        self.model = model
+        self.__cells = model.store
+
         # number of rows and columns (in that order)
-        self.dim = dim
+        self.dim = model.dim
+        self.frozen = tuple(frozen)
+
+        # first scrolled row and column in view
+        self.__top = self.frozen[0]
+        self.__left = self.frozen[1]
 
         self.__last_size = None
         self.__has_focus = False
-        h, w = self.__size__()
-
-        win = curses.newwin(h,
-                            w,
-                            self.y,
-                            self.x)
-
-        win.bkgd(' ', curses.color_pair(2))
-        self.__panel__ = curses.panel.new_panel(win)
-
-        # 2D grid
-
-        self.__cells__ = [['' for c in range(dim[1])] for r in range(dim[0])]
-        self.__changed = True
-
-        # which row is selected
+        # our window is made when we are first painted, see Widget._panel
+        self.__size__()
+
+        # damage since the last draw, the box and grid lines (chrome), the
+        # (row, col) of cells whose value changed, and the selection
+        self.__dirty_chrome = True
+        self.__dirty_cells = set()
+        self.__dirty_selection = False
+
+        # what the last draw put on screen, so a partial draw can repaint
+        # the cells the selection moved away from
+        self.__drawn_selected = None
+        self.__drawn_active = None
+        self.__drawn_offsets = None
+
+        # sorting, the (value, row) of the rows below the frozen ones in
+        # order of the sort column, see sorted_view.py
+        self.__sort_col = None
+        self.__sort_reverse = False
+        self.__order = None
+
+        # which row is selected, selected and active are where the cell is
+        # shown, which is another row of the data once sorted
         self.selected = [0, 0]
         self.active = [0, 0]
 
         self.callback = callback
+        model.subscribe(self)
         #self.draw()
 
+    def close(self):
+        self.model.unsubscribe(self)
+
     def __size__(self):
+
+        if not self._layout_stale():
+            return self.__layout
+
         # look for springs (-1 means fix to screen dim)
 
         # use -1 , fill width,
         # -2, half of the width ??
-        y, x = get_real_termial_size()
+        y, x = self._terminal_size()
         w = x - self.x if self.w < 0 else self.w
         h = y - self.y if self.h < 0 else self.h
 
-        if (w, h) != self.__last_size:
-            self.__changed = True
-            self.__last_size = (w, h)
-
-        self.__column_width = self.w / self.dim[0] - 1  # (excluding the '|')
-        self.__row_height = self.h / self.dim[1] - 1  # (excluding the '-')
-
-        self.__max_number_of_displayed_rows__ = h - 2
-        self.__max_number_of_displayed_cols__ = w / 4 - 2
+        if (w, h, self.x, self.y) != self.__last_size:
+            self.__dirty_chrome = True
+            self.__last_size = (w, h, self.x, self.y)
+
+        # share the space out if everything fits, otherwise scroll
+        rows, cols = self.dim
+        self.__column_width = max((w - 1) // cols - 1,  # (excluding the '|')
+                                  MIN_COLUMN_WIDTH)
+        self.__row_height = max((h - 1) // rows - 1, 1)  # (excluding the '-')
+
+        self.__max_number_of_displayed_rows__ = max(
+            (h - 1) // (self.__row_height + 1), 1)
+        self.__max_number_of_displayed_cols__ = max(
+            (w - 1) // (self.__column_width + 1), 1)
+        self.__layout = (h, w)
         return h, w
 
     def set_editable(self, editable):
 
         if self.__editable != editable:
             self.__editable = editable
+            self.__dirty_chrome = True
             if not editable and self.__has_focus:
-                self.__changed = True
                 self.__has_focus = False
 
     def set_focus(self, state):
         if state != self.__has_focus:
-            self.__changed = True
+            self.__dirty_chrome = True
             self.__has_focus = state
 
+    def set_frozen(self, rows, cols):
+        self.frozen = (rows, cols)
+        self.__dirty_chrome = True
+        if self.__order is not None:
+            self.sort_by(self.__sort_col, self.__sort_reverse)
+
+    def sort_by(self, col, reverse=False):
+        '''show the rows (below the frozen ones) in order of column col, and
+           keep them in order as cells change. None shows them in their own
+           order again. The same rows stay selected.'''
+
+        selected = self.__data_row(self.selected[0])
+        active = self.__data_row(self.active[0])
+
+        self.__sort_col = col
+        self.__sort_reverse = reverse
+        self.__order = None
+        if col is not None:
+            self.__order = SortedIndex((self.__cells.get(r, col), r) for r in
+                                       range(self.frozen[0], self.dim[0]))
+
+        self.selected[0] = self.__display_row(selected)
+        self.active[0] = self.__display_row(active)
+        self.__dirty_chrome = True
+
+    def __data_row(self, row_no):
+        '''the row of the data shown as row_no'''
+
+        frozen = self.frozen[0]
+        if self.__order is None or row_no < frozen:
+            return row_no
+
+        position = row_no - frozen
+        if self.__sort_reverse:
+            position = len(self.__order) - 1 - position
+        return self.__order[position][1]
+
+    def __display_row(self, data_row, value=None):
+        '''where a row of the data is shown, value -> what is in its sort
+           column, if we know already'''
+
+        frozen = self.frozen[0]
+        if self.__order is None or data_row < frozen:
+            return data_row
+
+        if value is None:
+            value = self.__cells.get(data_row, self.__sort_col)
+        return self.__sorted_row(self.__order.index((value, data_row)))
+
+    def __sorted_row(self, position):
+        if self.__sort_reverse:
+            position = len(self.__order) - 1 - position
+        return position + self.frozen[0]
+
     def set_cells(self, cells):
-        for c, r, value in cells:
-            if self.__cells__[r][c] != value:
-                self.__cells__[r][c] = value
-                self.__changed = True
+        '''cells -> [(col, row, value)], goes to the model, so every table
+           showing it follows'''
+        self.model.set_cells(cells)
+
+    def cells_changed(self, model, changes):
+        '''listener of the model, repaint what changed as far as it is in
+           view'''
+
+        for r, c, old in changes:
+            value = self.__cells.get(r, c)
+
+            if (self.__order is not None and c == self.__sort_col and
+                r >= self.frozen[0]):
+                old_row, new_row = self.__order.move((old, r), (value, r))
+                self.__row_moved(self.__sorted_row(old_row),
+                                 self.__sorted_row(new_row))
+
+            row_no = self.__display_row(r, value if c == self.__sort_col
+                                        else None)
+            if self.__shown(row_no, c):
+                self.__dirty_cells.add((row_no, c))
+
+        self.__redraw()
+
+    def set_styles(self, cells):
+        '''cells -> [(col, row, attr)], colour cells, e.g. an alert, attr
+           0 draws them plain again. Goes to the model like set_cells'''
+        self.model.set_styles(cells)
+
+    def styles_changed(self, model, cells):
+        '''listener of the model'''
+
+        for r, c in cells:
+            row_no = self.__display_row(r)
+            if self.__shown(row_no, c):
+                self.__dirty_cells.add((row_no, c))
+
+        self.__redraw()
+
+    def __redraw(self):
+        # only once attached, otherwise nobody would flush it
+        if self._app is not None and self.__changed():
+            self.draw()
+
+    def __row_moved(self, index, to):
+        '''a row was sorted into another place, the rows in between shift by
+           one, repaint the ones in view'''
+
+        if index == to:
+            return
+
+        self.selected[0] = moved(self.selected[0], index, to)
+        self.active[0] = moved(self.active[0], index, to)
+        self.__dirty_selection = True
+
+        if self.__dirty_chrome or self.__drawn_offsets is None:
+            return
+
+        offsets = self.__drawn_offsets
+        rows = self.__visible(self.frozen[0], offsets[0],
+                              self.__max_number_of_displayed_rows__,
+                              self.dim[0])
+        cols = self.__visible(self.frozen[1], offsets[1],
+                              self.__max_number_of_displayed_cols__,
+                              self.dim[1])
+        low, high = min(index, to), max(index, to)
+        for row_no in rows:
+            if low <= row_no <= high:
+                for col_no in cols:
+                    self.__dirty_cells.add((row_no, col_no))
+
+    def cell(self, row, col):
+        return self.model.get(row, col)
 
     def remove_row(self, index):
         '''TODO'''
-        self.__changed = True
+        self.__dirty_chrome = True
+
+    def __changed(self):
+        return (self.__dirty_chrome or
+                self.__dirty_selection or
+                bool(self.__dirty_cells))
+
+    def __shown(self, row_no, col_no):
+        '''is the cell on screen (as of the last draw), changes anywhere
+           else need no repaint'''
+
+        if (self.__dirty_chrome or self.__drawn_offsets is None or
+                not self.visible):
+            return False
+        return self.__position(row_no, col_no,
+                               self.__drawn_offsets) is not None
+
+    def __select_row(self, row_no):
+        row_no = max(min(row_no, self.dim[0] - 1), 0)
+        if row_no != self.selected[0]:
+            self.selected[0] = row_no
+            self.__dirty_selection = True
+
+    def command(self, key, count=1):
+        '''process commands, count is how many times the key was repeated'''
 
-    def command(self, key):
-        '''process commands'''
+        # a page is the rows that scroll
+        page = max(self.__max_number_of_displayed_rows__ -
+                   min(self.frozen[0], self.__max_number_of_displayed_rows__),
+                   1)
 
-        if key == curses.KEY_UP and self.selected[0]:
-            self.selected[0] -= 1
-            self.__changed = True
+        if key == curses.KEY_UP:
+            self.__select_row(self.selected[0] - count)
 
-        elif key == curses.KEY_DOWN and self.selected[0] + 1 < self.dim[0]:
-            self.selected[0] += 1
-            self.__changed = True
+        elif key == curses.KEY_DOWN:
+            self.__select_row(self.selected[0] + count)
+
+        elif key in PAGE_UP:
+            self.__select_row(self.selected[0] - page * count)
+
+        elif key in PAGE_DOWN:
+            self.__select_row(self.selected[0] + page * count)
+
+        elif key in HOME:
+            self.__select_row(0)
+
+        elif key in END:
+            self.__select_row(self.dim[0] - 1)
 
         elif key == curses.KEY_LEFT and self.selected[1]:
-            self.selected[1] -= 1
-            self.__changed = True
+            self.selected[1] = max(self.selected[1] - count, 0)
+            self.__dirty_selection = True
 
         elif key == curses.KEY_RIGHT and self.selected[1] + 1 < self.dim[1]:
-            self.selected[1] += 1
-            self.__changed = True
+            self.selected[1] = min(self.selected[1] + count, self.dim[1] - 1)
+            self.__dirty_selection = True
 
         elif key in (10,):
 
-            curses.beep()
+            self._screen.beep()
             if self.active != self.selected:
                 self.active = self.selected[:]
-                self.__changed = True
+                self.__dirty_selection = True
 
                 if self.callback is not None:
                     r, c = self.active
-                    self.callback({'active': self.__cells__[r][c]})
+                    self.callback({'active':
+                                   self.__cells.get(self.__data_row(r), c)})
+
+        return self.__changed()
+
+    def __offsets(self):
+        '''sometimes there are more items than will fit in the in the table,
+           so move the scrolled rows and columns along as needed'''
+
+        self.__top = _scrolled(self.__top, self.selected[0], self.frozen[0],
+                               self.__max_number_of_displayed_rows__,
+                               self.dim[0])
+        self.__left = _scrolled(self.__left, self.selected[1], self.frozen[1],
+                                self.__max_number_of_displayed_cols__,
+                                self.dim[1])
+        return self.__top, self.__left
+
+    def __position(self, row_no, col_no, offsets):
+        '''(y, x) of a cell in the window, None if it isn't in view'''
+
+        row_slot = _slot(row_no, self.frozen[0], offsets[0],
+                         min(self.__max_number_of_displayed_rows__,
+                             self.dim[0]))
+        col_slot = _slot(col_no, self.frozen[1], offsets[1],
+                         min(self.__max_number_of_displayed_cols__,
+                             self.dim[1]))
+        if row_slot is None or col_slot is None:
+            return None
+
+        return ((self.__row_height + 1) * row_slot + 1,
+                (self.__column_width + 1) * col_slot + 1)
+
+    def __visible(self, frozen, first, visible, count):
+        '''the rows (or columns) in view, in screen order'''
+        frozen = min(frozen, visible, count)
+        return list(range(frozen)) +\
+            list(range(first, min(first + visible - frozen, count)))
+
+    def __draw_grid(self, win, size, rows, cols):
+        '''clear the window, then draw the outline and internal grid,
+           rows and cols -> the ones in view'''
+
+        # outline of table
+        attr = self._style('box+focused' if self.__has_focus else 'box')
+
+        h, w = size
+        self._fit(win, h, w)
+        win.erase()
+        win.bkgd(' ', self._style('background'))
+        win.attrset(attr)
+        win.box()
+
+        # draw the internal grid, between the cells in view, and after the
+        # last one only if more follow off screen
+        lines = [len(shown) - (shown[-1] == count - 1 if shown else 0)
+                 for shown, count in ((rows, self.dim[0]),
+                                      (cols, self.dim[1]))]
+        xs = [(c + 1) * (self.__column_width + 1) for c in range(lines[1])]
+        xs = [x for x in xs if x < w - 2]
+        ys = [(r + 1) * (self.__row_height + 1) for r in range(lines[0])]
+        ys = [y for y in ys if y < h - 2]
+
+        for x in xs:
+            win.vline(0, x, self._screen.ACS_TTEE, 1)
+            win.vline(1, x, self._screen.ACS_VLINE, h - 2)
+            win.vline(h - 1, x, self._screen.ACS_BTEE, 1)
+
+        for y in ys:
+            win.hline(y, 0, self._screen.ACS_LTEE, 1)
+            win.hline(y, 1, self._screen.ACS_HLINE, w - 2)
+            win.hline(y, w - 1, self._screen.ACS_RTEE, 1)
+
+            # and draw the intersections or the grid lines
+            for x in xs:
+                win.hline(y, x, self._screen.ACS_PLUS, 1)
+
+    def __draw_cell(self, win, row_no, col_no, offsets, styles):
+        '''styles -> attribute words by state, see theme.py'''
+
+        position = self.__position(row_no, col_no, offsets)
+
+        # don't draw what isn't in view
+        if position is None:
+            return
+
+        data_row = self.__data_row(row_no)
+        text = self.__cells.text(data_row, col_no, self.__column_width - 1)
+        pos = [row_no, col_no]
+
+        state = FOCUSED if self.__has_focus else 0
+        if self.__editable:
+            if self.selected == pos:
+                state |= SELECTED
+            if self.active == pos:
+                state |= ACTIVE
+        if row_no < self.frozen[0] or col_no < self.frozen[1]:
+            state |= HEADER
+
+        attr = styles[state]
+        style = self.__cells.style(data_row, col_no)
+        if style:
+            attr = styled(attr, style)
+
+        y, x = position
+        win.addstr(y, x, text, attr)
+
+    def render(self, force=False):
+        '''repaint what changed since the last draw, only a resize, a focus
+           change, or force clears the window and redraws the grid'''
 
-        return self.__changed
+        new_size = self.__size__()
 
-    def draw(self, force=False):
+        logger.debug("Table Draw called, new_size %s", new_size)
 
-        new_size = self.__size__()
+        if not (force or self.__changed()):
+            return
+
+        win = self._panel(*new_size).window()
+        offsets = self.__offsets()
+        styles = self._cell_styles()
+
+        # scrolling moves every cell, so treat it like a resize
+        if force or self.__dirty_chrome or offsets != self.__drawn_offsets:
+
+            rows = self.__visible(self.frozen[0], offsets[0],
+                                  self.__max_number_of_displayed_rows__,
+                                  self.dim[0])
+            cols = self.__visible(self.frozen[1], offsets[1],
+                                  self.__max_number_of_displayed_cols__,
+                                  self.dim[1])
+            self.__draw_grid(win, new_size, rows, cols)
+
+            for row_no in rows:
+                for col_no in cols:
+                    self.__draw_cell(win, row_no, col_no, offsets, styles)
+
+        else:
+            cells = self.__dirty_cells
+
+            if self.__dirty_selection:
+                for pos in (self.__drawn_selected, self.__drawn_active,
+                            self.selected, self.active):
+                    cells.add(tuple(pos))
+
+            for row_no, col_no in cells:
+                self.__draw_cell(win, row_no, col_no, offsets, styles)
+
+        self.__dirty_chrome = False
+        self.__dirty_cells = set()
+        self.__dirty_selection = False
 
-        log.msg("Table Draw called, new_size", new_size)
-
-        win = self.__panel__.window()
-
-        if self.__changed or force:
-
-            # outline of table
-            attr = curses.color_pair(2) if self.__has_focus else\
-                curses.color_pair(1)
-
-            win.resize(*new_size)
-            win.clear()
-            win.attrset(attr)
-            win.box()
-
-            # draw the internal gird
-            h, w = self.__size__()
-            for c in range(self.dim[1] - 1):
-                x = (c + 1) * (self.__column_width + 1)
-                win.vline(0, x, curses.ACS_TTEE, 1)
-                win.vline(1, x, curses.ACS_VLINE, h - 2)
-                win.vline(h - 1, x, curses.ACS_BTEE, 1)
-
-            for r in range(self.dim[0] - 1):
-                y = (r + 1) * (self.__row_height + 1)
-                win.hline(y, 0, curses.ACS_LTEE, 1)
-                win.hline(y, 1, curses.ACS_HLINE, w - 2)
-                win.hline(y, w - 1, curses.ACS_RTEE, 1)
-
-                # and draw the intersections or the grid lines
-                for c in range(self.dim[1] - 1):
-                    x = (c + 1) * (self.__column_width + 1)
-                    win.hline(y, x, curses.ACS_PLUS, 1)
-
-            # sometimes there are more items than will fit in the in the table,
-            # so move a display window along as needed
-
-            w = self.__column_width + 1
-            h = self.__row_height + 1
-
-            col_offset = 0
-            if self.dim[1] > self.__max_number_of_displayed_cols__:
-                a = self.dim[1] - self.__max_number_of_displayed_cols__
-                b = max(self.selected[1] -\
-                        self.__max_number_of_displayed_cols__ + 2, 0)
-                col_offset = min(a, b)
-
-            row_offset = 0
-            if self.dim[0] > self.__max_number_of_displayed_rows__:
-                a = self.dim[0] - self.__max_number_of_displayed_rows__
-                b = max(self.selected[0] -\
-                        self.__max_number_of_displayed_rows__ + 2, 0)
-                row_offset = min(a, b)
-
-            for row_no, row in enumerate(self.__cells__):
-                for col_no, cell in enumerate(row):
-
-                    # don't draw below the bottom
-                    if (row_no >= row_offset and
-                        row_no - row_offset < \
-                            self.__max_number_of_displayed_rows__):
-
-                        text = ("%s" % cell).rjust(self.__column_width - 1)
-                        pos = [row_no, col_no]
-
-                        if self.__editable:
-                            attr = curses.color_pair(1) if self.active == pos\
-                                else curses.color_pair(1)
-
-                            if self.selected == pos:
-                                attr |= curses.A_STANDOUT
-                            if self.active == pos:
-                                attr |= curses.A_UNDERLINE
-                        else:
-                            attr = curses.color_pair(1)
-
-                        win.addstr(h * row_no + 1 + row_offset,
-                                   w * col_no + 1 + col_offset,
-                                   text,
-                                   attr)
-
-            win.refresh()
-
-            self.__changed = False
+        self.__drawn_selected = self.selected[:]
+        self.__drawn_active = self.active[:]
+        self.__drawn_offsets = offsets
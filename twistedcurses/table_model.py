@@ -0,0 +1,105 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Cells shared by any number of tables.
+
+    A TableModel holds the cells (in a TableStore) and the tables showing
+    them subscribe to it. A set_cells on the model works out which cells
+    really changed and hands that change set to every table once, each
+    table repaints the ones it has in view (in the next frame) and ignores
+    the rest:
+
+        prices = TableModel((1000, 5), columns)
+        left = Table((0, 0), (40, -1), None, model=prices)
+        right = Table((40, 0), (-1, -1), None, model=prices)
+        prices.set_cells([(1, 10, 12.5)])     # both tables follow
+
+    A change set is a list of (row, col, old value), a cell at most once,
+    the new values are in the model. Cells can be coloured the same way,
+    set_styles takes attribute words (0 for none) and hands out the
+    (row, col) of the cells whose style changed. Listeners implement
+
+        listener.cells_changed(model, changes)
+        listener.styles_changed(model, cells)
+
+    Tables in different sessions (see server.py) can share a model too.
+    ListBox has the same thing already, a ListSource shared by list boxes,
+    see data_source.py.
+'''
+
+from table_store import TableStore
+
+
+class TableModel:
+
+    def __init__(self, dim, columns=None):
+        '''dim -> (rows, cols)
+
+           columns -> a list of table_store.Column, one per column'''
+
+        self.dim = tuple(dim)
+        self.store = TableStore(dim[0], columns or dim[1])
+        self.__listeners = []
+
+    def subscribe(self, listener):
+        if listener not in self.__listeners:
+            self.__listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def get(self, row, col):
+        return self.store.get(row, col)
+
+    def style(self, row, col):
+        return self.store.style(row, col)
+
+    def set_cells(self, cells):
+        '''cells -> [(col, row, value)], like Table.set_cells
+
+           returns the change set the listeners got, empty if no value
+           changed (and then nobody hears about it). A value its column
+           can't hold raises, after the listeners heard about the cells
+           set before it'''
+
+        store = self.store
+        changed = {}  # (row, col) -> value before the first change
+        try:
+            for c, r, value in cells:
+                old = store.get(r, c)
+                if store.set(r, c, value):
+                    changed.setdefault((r, c), old)
+        finally:
+            changes = [(r, c, old) for (r, c), old in changed.items()]
+            if changes:
+                for listener in self.__listeners[:]:
+                    listener.cells_changed(self, changes)
+        return changes
+
+    def set_styles(self, cells):
+        '''cells -> [(col, row, attr)], returns the (row, col) of the cells
+           whose style changed'''
+
+        store = self.store
+        changed = set((r, c) for c, r, attr in cells
+                      if store.set_style(r, c, attr))
+
+        changed = list(changed)
+        if changed:
+            for listener in self.__listeners[:]:
+                listener.styles_changed(self, changed)
+        return changed
@@ -0,0 +1,154 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Where a Table keeps its cells.
+
+    The values are held a column at a time. A column made with an array
+    typecode ('d' for floats, 'l' for ints, ...) keeps its values unboxed
+    in an array.array, a few bytes a cell instead of a python object, any
+    other column holds python objects in a list:
+
+        Column()                              # anything, shown with "%s"
+        Column('d', lambda v: '%.2f' % v)     # floats, two decimals
+
+    Columns are stored in blocks of BLOCK rows, a block only gets its
+    storage the first time one of its cells is set, so a huge table that is
+    mostly blank (say a header row over a million rows) costs little.
+
+    Cells can have a style too, a curses attribute word the table draws
+    them with, kept the same way in blocks of an array('I'), 4 bytes a cell
+    and only for the blocks that have one.
+
+    The text shown for a cell is formatted once per column width and kept
+    until its value changes, so redrawing a table that didn't change much
+    formats next to nothing, even with several tables of other widths
+    showing the same store (see table_model.py).
+'''
+
+from array import array
+
+# rows per block of a column, a power of 2
+BLOCK = 4096
+
+# formatted cells kept per column, more than a screen's worth as one scrolls
+TEXT_CACHE_SIZE = 4096
+
+
+def _format(value):
+    return "%s" % value
+
+
+class Column:
+
+    def __init__(self, typecode=None, formatter=None, blank=''):
+        '''typecode  -> array.array typecode, None for python objects
+           formatter -> function(value) -> text, "%s" % value by default
+           blank     -> value of cells nobody has set (0 for typed
+                        columns)'''
+
+        self.typecode = typecode
+        self.formatter = formatter or _format
+        self.blank = 0 if typecode is not None else blank
+
+    def new_block(self):
+        if self.typecode is None:
+            return [self.blank] * BLOCK
+        return array(self.typecode, [self.blank]) * BLOCK
+
+
+class TableStore:
+    '''rows x columns of values plus their formatted text'''
+
+    def __init__(self, rows, columns):
+        '''columns -> a list of Column, or the number of (untyped) columns'''
+
+        if isinstance(columns, int):
+            columns = [Column() for c in range(columns)]
+
+        self.rows = rows
+        self.columns = list(columns)
+
+        # {block number: values} per column
+        self.__values = [{} for column in self.columns]
+
+        # {block number: array('I') of attribute words} per column
+        self.__styles = [{} for column in self.columns]
+
+        # formatted text of the cells that were shown, per column
+        # {width: {row: text}}
+        self.__texts = [{} for column in self.columns]
+
+    def get(self, row, col):
+        block = self.__values[col].get(row // BLOCK)
+        if block is None:
+            return self.columns[col].blank
+        return block[row % BLOCK]
+
+    def set(self, row, col, value):
+        '''True if the value changed'''
+
+        blocks = self.__values[col]
+        block = blocks.get(row // BLOCK)
+        if block is None:
+            if value == self.columns[col].blank:
+                return False
+            block = blocks[row // BLOCK] = self.columns[col].new_block()
+
+        if block[row % BLOCK] == value:
+            return False
+
+        block[row % BLOCK] = value
+        for texts in self.__texts[col].values():
+            texts.pop(row, None)
+        return True
+
+    def style(self, row, col):
+        block = self.__styles[col].get(row // BLOCK)
+        if block is None:
+            return 0
+        return block[row % BLOCK]
+
+    def set_style(self, row, col, attr):
+        '''True if the style changed, 0 is no style'''
+
+        blocks = self.__styles[col]
+        block = blocks.get(row // BLOCK)
+        if block is None:
+            if not attr:
+                return False
+            block = blocks[row // BLOCK] = array('I', [0]) * BLOCK
+
+        if block[row % BLOCK] == attr:
+            return False
+        block[row % BLOCK] = attr
+        return True
+
+    def text(self, row, col, width):
+        '''the cell formatted and right justified to width, cut if it
+           doesn't fit'''
+
+        texts = self.__texts[col].get(width)
+        if texts is None or len(texts) > TEXT_CACHE_SIZE:
+            # widths nobody shows any more go too, when a column was resized
+            if len(self.__texts[col]) > 4:
+                self.__texts[col].clear()
+            texts = self.__texts[col][width] = {}
+
+        text = texts.get(row)
+        if text is None:
+            text = texts[row] = self.columns[col].formatter(
+                self.get(row, col)).rjust(width)[:width]
+        return text
@@ -0,0 +1,241 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+''' Colours and attributes by name.
+
+    A Theme maps style names to (foreground, background, attributes), a
+    colour of None takes the one of what the style goes on top of:
+
+        theme = DEFAULT.derive({'selected': (curses.COLOR_BLACK,
+                                             curses.COLOR_CYAN, 0),
+                                'table.header': (None, None, curses.A_BOLD)})
+        app = App(reactor, 'My App', menu, theme=theme)
+        app.set_theme(DEFAULT)     # at any time, repaints who looks different
+
+    Rows and cells are drawn with 'normal', plus a style for each state they
+    are in (STATES), plus any combination of states the theme names, in the
+    order of STATES, e.g. 'selected+focused'. Other styles combine the same
+    way, 'box+focused' goes on top of 'box'. A name prefixed by a widget's
+    style_kind ('table.active') is used by that kind of widget before the
+    plain one.
+
+    Every screen has a StyleRegistry (screen.styles) that gives out colour
+    pairs as they are needed, one per (foreground, background), and works
+    the attribute words out once per theme. A widget's draw gets a list of
+    the words for every state of its rows or cells and picks one by index:
+
+        cells = self._cell_styles()
+        attr = cells[SELECTED | FOCUSED]
+
+    Style your own rows with the words too, e.g. an alert:
+
+        list_box.set_row_style(index, app.styles.attr('alert'))
+'''
+
+import curses
+
+from logger import logger
+
+# states of a row or cell, bits of the index into StyleRegistry.cells
+SELECTED = 1
+ACTIVE = 2
+HEADER = 4  # a frozen row or column of a table
+FOCUSED = 8  # the widget has the focus
+
+STATES = ('selected', 'active', 'header', 'focused')
+
+# what a colour pair can be packed into an attribute word with
+MAX_PAIRS = 256
+
+
+def _name(name):
+    '''the name a style is kept under, its states in the order of STATES'''
+
+    kind, dot, rest = name.rpartition('.')
+    parts = rest.split('+')
+    role = [part for part in parts if part not in STATES][:1]
+    states = sorted(set(parts) & set(STATES), key=STATES.index)
+    return kind + dot + '+'.join(role + states)
+
+
+def _overlay(spec, over):
+    fg, bg, attrs = spec
+    over_fg, over_bg, over_attrs = over
+    return (fg if over_fg is None else over_fg,
+            bg if over_bg is None else over_bg,
+            attrs | over_attrs)
+
+
+class Theme:
+
+    def __init__(self, styles=None, base=None):
+        '''styles -> {name: (fg, bg, attributes)}
+
+           base -> a Theme for the styles we don't have'''
+
+        self.__styles = dict((_name(name), tuple(spec)) for name, spec in
+                             (styles or {}).items())
+        self.__base = base
+
+    def get(self, name, kind=None):
+        '''(fg, bg, attributes) of a style, kind's own first, None if
+           nobody has it'''
+
+        if kind is not None:
+            spec = self.get(kind + '.' + name)
+            if spec is not None:
+                return spec
+
+        spec = self.__styles.get(name)
+        if spec is None and self.__base is not None:
+            spec = self.__base.get(name)
+        return spec
+
+    def derive(self, styles):
+        '''a theme with some styles changed, the rest are ours'''
+        return Theme(styles, base=self)
+
+
+DEFAULT = Theme({
+    # rows and cells, and what their states add
+    'normal': (curses.COLOR_WHITE, curses.COLOR_BLACK, 0),
+    'selected': (None, None, curses.A_STANDOUT),
+    'active': (curses.COLOR_YELLOW, curses.COLOR_BLACK, curses.A_UNDERLINE),
+    'header': (None, None, curses.A_BOLD),
+    'table.active': (None, None, curses.A_UNDERLINE),
+
+    # around and behind widgets
+    'background': (curses.COLOR_YELLOW, curses.COLOR_BLACK, 0),
+    'box': (curses.COLOR_YELLOW, curses.COLOR_BLACK, 0),
+    'box+focused': (curses.COLOR_YELLOW, curses.COLOR_BLACK, 0),
+    'table.box': (curses.COLOR_WHITE, curses.COLOR_BLACK, 0),
+
+    # the app's frame and menu, the profiler's numbers
+    'app.box': (curses.COLOR_WHITE, curses.COLOR_BLACK, 0),
+    'menu': (None, None, 0),
+    'menu_key': (None, None, curses.A_UNDERLINE | curses.A_BOLD),
+    'overlay': (curses.COLOR_YELLOW, curses.COLOR_BLACK, 0),
+
+    # for set_row_style and Table.set_styles
+    'alert': (curses.COLOR_RED, curses.COLOR_BLACK, curses.A_BOLD),
+    'highlight': (curses.COLOR_BLACK, curses.COLOR_YELLOW, 0),
+})
+
+
+class StyleRegistry:
+    '''the colour pairs and attribute words of a screen'''
+
+    def __init__(self, screen, theme=None):
+        self.__screen = screen
+        self.__theme = theme or DEFAULT
+
+        # pairs are never given back, so a word stays valid (e.g. in a
+        # ListSource's styles) when the theme changes
+        self.__pairs = {}  # (fg, bg) -> pair number
+        self.__full = False
+
+        self.__words = {}  # (kind, name) -> attribute word
+        self.__cells = {}  # kind -> attribute word per state
+
+    def theme(self):
+        return self.__theme
+
+    def set_theme(self, theme):
+        '''returns the style kinds that look different now, None in there
+           for styles used without a kind'''
+
+        old_words, old_cells = self.__words, self.__cells
+        self.__theme = theme
+        self.__words, self.__cells = {}, {}
+
+        changed = set()
+        for (kind, name), word in old_words.items():
+            if self.attr(name, kind) != word:
+                changed.add(kind)
+        for kind, cells in old_cells.items():
+            if self.cells(kind) != cells:
+                changed.add(kind)
+        return changed
+
+    def pair(self, fg, bg):
+        '''attribute word of the colour pair fg on bg, made if it is new'''
+
+        number = self.__pairs.get((fg, bg))
+        if number is None:
+            number = len(self.__pairs) + 1
+            if number >= min(self.__screen.max_pairs(), MAX_PAIRS):
+                if not self.__full:
+                    logger.warning("styles: out of colour pairs, %d used",
+                                   len(self.__pairs))
+                    self.__full = True
+                return 0
+            self.__screen.init_pair(number, fg, bg)
+            self.__pairs[fg, bg] = number
+        return self.__screen.color_pair(number)
+
+    def attr(self, name, kind=None):
+        '''attribute word of a style, e.g. 'box+focused' '''
+
+        word = self.__words.get((kind, name))
+        if word is None:
+            word = self.__words[kind, name] = self.__word(_name(name), kind)
+        return word
+
+    def cells(self, kind=None):
+        '''attribute words of rows or cells, indexed by their state bits'''
+
+        cells = self.__cells.get(kind)
+        if cells is None:
+            cells = self.__cells[kind] = [
+                self.__word('+'.join(s for i, s in enumerate(STATES)
+                                     if state & (1 << i)) or 'normal', kind)
+                for state in range(1 << len(STATES))]
+        return cells
+
+    def __word(self, name, kind):
+        '''a style with everything named for its states on top'''
+
+        parts = name.split('+')
+        role = parts[0] if parts[0] not in STATES else 'normal'
+        states = [STATES.index(s) for s in parts if s in STATES]
+        theme = self.__theme
+
+        spec = theme.get(role, kind) or (None, None, 0)
+
+        # every combination of the states, fewest first
+        bits = sum(1 << i for i in states)
+        for subset in sorted((s for s in range(1, bits + 1)
+                              if s & bits == s),
+                             key=lambda s: (bin(s).count('1'), s)):
+            combined = [STATES[i] for i in range(len(STATES))
+                        if subset & (1 << i)]
+            if role != 'normal':
+                combined.insert(0, role)
+            over = theme.get('+'.join(combined), kind)
+            if over is not None:
+                spec = _overlay(spec, over)
+
+        fg, bg, attrs = spec
+        if fg is None and bg is None:
+            return attrs
+
+        # half a colour, the other half from normal
+        normal = theme.get('normal', kind) or (None, None, 0)
+        if fg is None:
+            fg = normal[0] if normal[0] is not None else curses.COLOR_WHITE
+        if bg is None:
+            bg = normal[1] if normal[1] is not None else curses.COLOR_BLACK
+        return self.pair(fg, bg) | attrs
@@ -16,4 +16,28 @@ def get_real_termial_size():
         h = curses.tigetnum('lines')
         return (h, w)
 
+
+class TerminalGeometry:
+    '''caches the terminal size, so we only ask the tty after a resize'''
+
+    def __init__(self, source=get_real_termial_size):
+        # where the size comes from, usually the tty
+        self.__source = source
+
+        # bumped on every resize, widgets compare it against the value
+        # they last laid themselves out with
+        self.generation = 0
+        self.__size = None
+
+    def size(self):
+        '''(rows, cols)'''
+        if self.__size is None:
+            self.__size = self.__source()
+        return self.__size
+
+    def invalidate(self):
+        '''the terminal changed size (SIGWINCH)'''
+        self.__size = None
+        self.generation += 1
+
 #
@@ -0,0 +1,164 @@
+'''
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You have not received a copy of the GNU Lesser General Public License
+    along with this program.  Please see <http://www.gnu.org/licenses/>.
+
+'''
+
+import curses
+
+from keymap import Keymap
+from screen import default_screen
+
+
+def styled(attr, style):
+    '''attr with a row's or cell's style on top, a style with a colour
+       pair replaces the pair of attr'''
+    if style & curses.A_COLOR:
+        attr &= ~curses.A_COLOR
+    return attr | style
+
+
+class Widget:
+    '''base class for everything that can be added to an App'''
+
+    # theme styles named 'kind.name' are ours before 'name', see theme.py
+    style_kind = None
+
+    def __init__(self, screen=None):
+        '''screen -> backend to draw on, defaults to the one of the last
+                     App made (or the real terminal)'''
+        self._screen = screen if screen is not None else default_screen()
+        self._app = None
+        self.__layout_generation = None
+
+        # made the first time we are painted, see _panel
+        self.__panel = None
+
+        # hidden widgets (say on another tab) aren't painted, see
+        # App.set_visible
+        self.visible = True
+
+        # bindings while we have focus, under the app's, see keymap.py
+        self.keymap = Keymap()
+
+    def attach(self, app):
+        '''called by App.add_widget, from then on the app decides when to
+           paint us'''
+        self._app = app
+        self.invalidate_layout()
+
+    def close(self):
+        '''let go of shared data (unsubscribe from sources and models),
+           App.close calls this'''
+        pass
+
+    def invalidate_layout(self):
+        '''recompute our size on the next draw, e.g. after changing w or h'''
+        self.__layout_generation = None
+
+    def place(self, y, x, h, w):
+        '''put us at (y, x), h rows by w columns, the app's layout calls
+           this, see layout.py'''
+
+        # room for a box and a line in it, however little space is left
+        h, w = max(h, 3), max(w, 3)
+
+        if (self.y, self.x, self.h, self.w) != (y, x, h, w):
+            self.y, self.x, self.h, self.w = y, x, h, w
+            self.invalidate_layout()
+
+    def set_visible(self, visible):
+        '''App.set_visible calls this'''
+        self.visible = visible
+        if self.__panel is not None:
+            if visible:
+                self.__panel.show()
+            else:
+                self.__panel.hide()
+
+    def _panel(self, h, w):
+        '''our panel, its window is only made the first time we are painted,
+           so a widget that is never shown never costs one'''
+
+        if self.__panel is None:
+            win = self._screen.newwin(h, w, self.y, self.x)
+            win.bkgd(' ', self._style('background'))
+            self.__panel = self._screen.new_panel(win)
+            if not self.visible:
+                self.__panel.hide()
+        return self.__panel
+
+    def _fit(self, win, h, w):
+        '''resize win to h x w, and move it to where we were placed'''
+
+        if win.getbegyx() != (self.y, self.x):
+            # shrink it first, curses won't move or grow a window past the
+            # edge of the screen
+            win.resize(1, 1)
+            win.mvwin(self.y, self.x)
+        win.resize(h, w)
+
+    def _terminal_size(self):
+        '''(rows, cols) of the terminal, cached by the app once attached'''
+        if self._app is None:
+            return self._screen.size()
+        return self._app.geometry.size()
+
+    def _layout_stale(self):
+        '''True the first time it is asked after the terminal was resized,
+           widgets recompute their geometry then and reuse it otherwise'''
+
+        if self._app is None:
+            return True
+
+        generation = self._app.geometry.generation
+        if generation == self.__layout_generation:
+            return False
+
+        self.__layout_generation = generation
+        return True
+
+    def _style(self, name):
+        '''attribute word of a theme style, e.g. 'box+focused' '''
+        return self._screen.styles.attr(name, self.style_kind)
+
+    def _cell_styles(self):
+        '''attribute words of our rows or cells, by state, see theme.py'''
+        return self._screen.styles.cells(self.style_kind)
+
+    def draw(self, force=False):
+        '''ask for a repaint,
+
+           once attached this only marks the widget dirty, the app paints
+           all dirty widgets and flushes the terminal once per frame'''
+
+        if self._app is not None:
+            self._app.schedule_draw(self, force)
+        else:
+            self.render(force)
+            self._screen.update_panels()
+            self._screen.doupdate()
+
+    def wants_key(self, key):
+        '''True for keys we need to see before the app's own handlers,
+           e.g. while the user is typing into us'''
+        return False
+
+    def types_key(self, key):
+        '''True for keys we take before the app's global bindings, though
+           after our own, e.g. letters for type-ahead'''
+        return False
+
+    def render(self, force=False):
+        '''paint into the window, without flushing to the terminal'''
+        raise NotImplementedError